@@ -0,0 +1,380 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the benchmarks for the checks in validate_this_functions.py
+
+Synthetic data files are generated from a csv Spec (e.g. countries.json, mytestcsv.json) and each stage of the
+validation is timed in a fresh process so its peak memory can be measured: sniff, count, header, unique, domain
+and data as the individual functions, single_pass as the fused pass and validate as the whole of Validator.validate.
+The fused pass is also timed reading on the checking thread (single_pass_direct) and with the records parsed on a
+thread as well (single_pass_pipelined), to compare with the default read ahead, see Pipeline in validate_this_input.py.
+single_pass_scalar checks every value one by one, to compare with the batch screens of validate_this_batch.py.
+Results are written as json so runs can be compared.
+
+## Sample Usage
+```
+python3 benchmark_this.py --config=countries.json --config=mytestcsv.json --rows=10000,100000 --output=bench.json
+python3 benchmark_this.py --config=countries.json --rows=1000000 --width=40 --error-rate=0.001 --duplicate-rate=0.0001 --quoted-newline-rate=0.01
+```
+"""
+import argparse
+import ast
+import copy
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+THIS_SCRIPTS_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.abspath(THIS_SCRIPTS_PATH))
+
+STAGES = ["sniff", "count", "header", "unique", "domain", "data", "single_pass", "single_pass_direct", "single_pass_pipelined", "single_pass_scalar", "validate"]
+PIPELINED_BATCH_ROWS = 1000
+DEFAULT_ROWS = [10000]
+DEFAULT_ENCODING = "utf-8"
+GENERATE_BATCH_ROWS = 10000
+RECENT_KEYS = 1000
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _base36(n):
+    digits = ""
+    while True:
+        n, r = divmod(n, 36)
+        digits = _BASE36[r] + digits
+        if n == 0:
+            return digits
+
+
+def _lineterminator(dialect):
+    """
+      The csvspec lineterminator is written as a quoted python literal, e.g. "'\\r\\n'"
+    """
+    try:
+        value = ast.literal_eval(str(dialect.get("lineterminator")))
+        if isinstance(value, str) and len(value) > 0:
+            return value
+    except (ValueError, SyntaxError):
+        pass
+    return "\r\n"
+
+
+def benchmark_spec(config_data, width=None):
+    """
+      Copy of the csv Spec used for a benchmark run
+      width adds copies of the spec's columns (not part of the uniqueness key) until there are width columns
+      A missing encoding defaults to utf-8
+    """
+    config_data = copy.deepcopy(config_data)
+    csvspec = config_data["csvspec"]
+    csvspec["dialect"].setdefault("encoding", DEFAULT_ENCODING)
+    columns = csvspec["columns"]
+    keynames = csvspec["uniqueness"] or []
+    template = [col for col in columns if col["name"] not in keynames] or columns
+    i = 0
+    while width is not None and len(columns) < width:
+        col = copy.deepcopy(template[i % len(template)])
+        col["name"] = col["name"] + "_" + str(len(columns))
+        col["colorder"] = str(len(columns))
+        columns.append(col)
+        i = i + 1
+    return config_data
+
+
+class Generator:
+    """
+    Generate rows for a csv Spec
+
+    error_rate       : fraction of rows with one value that fails a check
+    duplicate_rate   : fraction of rows repeating the uniqueness key of a recent row
+    quoted_newline_rate : fraction of rows with a newline inside a (quoted) string value
+    """
+
+    def __init__(self, csvspec, error_rate=0.0, duplicate_rate=0.0, quoted_newline_rate=0.0, seed=0):
+        self.csvspec = csvspec
+        self.error_rate = error_rate
+        self.duplicate_rate = duplicate_rate
+        self.quoted_newline_rate = quoted_newline_rate
+        self.random = random.Random(seed)
+        self.columns = sorted(csvspec["columns"], key=lambda col: int(col["colorder"]))
+        keynames = csvspec["uniqueness"] or []
+        self.keypositions = [i for i, col in enumerate(self.columns) if col["name"] in keynames]
+        # the key columns that can carry the row number to make the key unique
+        self.rowkeys = set(i for i in self.keypositions if "domain" not in self.columns[i] and self.columns[i]["type"] in ("string", "integer", "float"))
+        self.corruptible = [i for i, col in enumerate(self.columns) if self._corrupt(col) is not None]
+        self.freetext = [i for i, col in enumerate(self.columns)
+                         if col["type"] == "string" and "domain" not in col and i not in self.rowkeys and (col.get("max_len") is None or col["max_len"] >= 3)]
+        self.recent_keys = []
+
+    def _value(self, col, rownumber, unique):
+        r = self.random
+        if "domain" in col:
+            return r.choice(col["domain"])
+        coltype = col["type"]
+        if coltype == "integer":
+            if unique:
+                return str(rownumber)
+            high = col.get("max_value")
+            return str(r.randint(0, int(high) if isinstance(high, (int, float)) else 1000000))
+        if coltype == "float":
+            if unique:
+                return str(rownumber) + ".5"
+            return "%.3f" % (r.random() * 1000)
+        if coltype in ("date", "time", "timestamp"):
+            value = datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=r.randint(0, 25 * 365 * 86400))
+            return value.strftime(col["format"])
+        max_len = col.get("max_len")
+        if unique:
+            return _base36(rownumber)
+        length = r.randint(3, 12)
+        if max_len is not None:
+            length = min(length, int(max_len))
+        return "".join(r.choice(_ALPHABET) for _ in range(length))
+
+    def _corrupt(self, col):
+        """
+          A value that fails the column's checks, None if the column accepts any value
+        """
+        if "domain" in col:
+            return "not-in-domain"
+        if col["type"] in ("integer", "float", "date", "time", "timestamp"):
+            return "x" + col["type"]
+        if col.get("max_len") is not None:
+            return "y" * (int(col["max_len"]) + 1)
+        if col.get("allow_blank", True) != True:
+            return ""
+        return None
+
+    def row(self, rownumber):
+        r = self.random
+        row = [self._value(col, rownumber, i in self.rowkeys) for i, col in enumerate(self.columns)]
+        if len(self.keypositions) > 0:
+            if len(self.recent_keys) > 0 and r.random() < self.duplicate_rate:
+                for i, value in zip(self.keypositions, r.choice(self.recent_keys)):
+                    row[i] = value
+            elif len(self.recent_keys) < RECENT_KEYS:
+                self.recent_keys.append([row[i] for i in self.keypositions])
+            else:
+                self.recent_keys[r.randrange(RECENT_KEYS)] = [row[i] for i in self.keypositions]
+        if len(self.freetext) > 0 and r.random() < self.quoted_newline_rate:
+            i = r.choice(self.freetext)
+            value = row[i] if len(row[i]) >= 2 else "ab"
+            row[i] = value[:1] + "\n" + value[2:]
+        if len(self.corruptible) > 0 and r.random() < self.error_rate:
+            i = r.choice(self.corruptible)
+            row[i] = self._corrupt(self.columns[i])
+        return row
+
+    def write(self, filename, rows):
+        """
+          Write a data file of rows data records (plus the header if the spec has one)
+        """
+        dialect = self.csvspec["dialect"]
+        writer_dialect = {"delimiter": dialect["delimeter"], "quotechar": dialect["quotechar"], "escapechar": dialect["escapechar"],
+                          "doublequote": dialect["doublequote"] == True, "quoting": int(dialect["quoting"]), "lineterminator": _lineterminator(dialect)}
+        with open(filename, "w", encoding=dialect["encoding"], newline='') as f:
+            writer = csv.writer(f, **writer_dialect)
+            if dialect["has_header"] == True:
+                writer.writerow([col["name"] for col in self.columns])
+            rownumber = 1
+            while rownumber <= rows:
+                batch = min(GENERATE_BATCH_ROWS, rows - rownumber + 1)
+                writer.writerows([self.row(n) for n in range(rownumber, rownumber + batch)])
+                rownumber = rownumber + batch
+
+
+def run_stage(stage, config_file, input_file):
+    """
+      Perform one stage of the validation, returns the measurements
+      Run in its own process (see --stage) so ru_maxrss is the peak of this stage alone
+    """
+    from validate_this_functions import column_test
+    from validate_this_functions import compare_headers
+    from validate_this_functions import count_records
+    from validate_this_functions import domain_test
+    from validate_this_functions import read_header
+    from validate_this_functions import register_dialect
+    from validate_this_functions import single_pass_test
+    from validate_this_functions import unique_test
+    from validate_this_functions import uniqueness_defined
+    from validate_this_functions import VALID_DATATYPES
+    from validate_this_input import DEFAULT_PIPELINE
+    from validate_this_sniff import detect_encoding
+    from validate_this_sniff import read_sample
+    from validate_this_sniff import sniff_dialect
+    from validateThis import Validator
+
+    with open(config_file, "r") as cf:
+        config_data = json.load(cf)
+    csvspec = config_data["csvspec"]
+    register_dialect(csvspec)
+
+    start = time.perf_counter()
+    cpu = time.process_time()
+    rc = 0
+    if stage == "sniff":
+        segments = read_sample(input_file)
+        detect_encoding(segments)
+        sniff_dialect([segment.decode(csvspec["dialect"]["encoding"]) for segment in segments])
+    elif stage == "count":
+        count_records(csvspec, input_file)
+    elif stage == "header":
+        rc, report = compare_headers(csvspec, read_header(csvspec, input_file))
+    elif stage == "unique":
+        if uniqueness_defined(csvspec):
+            rc, report = unique_test(csvspec, input_file)
+    elif stage == "domain":
+        rc, report = domain_test(csvspec, input_file)
+    elif stage == "data":
+        # every column is checked, data_test stops at the first column that fails
+        for col in csvspec["columns"]:
+            if col["type"] in VALID_DATATYPES:
+                rc = max(rc, column_test(csvspec, input_file, col)[0])
+    elif stage == "single_pass":
+        results = single_pass_test(csvspec, input_file)
+        rc = max(results["unique"][0], results["domain"][0], results["data"][0])
+    elif stage == "single_pass_direct":
+        results = single_pass_test(csvspec, input_file, pipeline=DEFAULT_PIPELINE._replace(read_ahead_blocks=0))
+        rc = max(results["unique"][0], results["domain"][0], results["data"][0])
+    elif stage == "single_pass_pipelined":
+        results = single_pass_test(csvspec, input_file, pipeline=DEFAULT_PIPELINE._replace(parse_batch_rows=PIPELINED_BATCH_ROWS))
+        rc = max(results["unique"][0], results["domain"][0], results["data"][0])
+    elif stage == "single_pass_scalar":
+        results = single_pass_test(csvspec, input_file, check_batch_rows=0)
+        rc = max(results["unique"][0], results["domain"][0], results["data"][0])
+    elif stage == "validate":
+        rc = Validator(config_data, log=False).validate(input_file)["returncode"]
+    else:
+        raise ValueError("Unknown stage: " + stage)
+    seconds = time.perf_counter() - start
+
+    return {"seconds": seconds
+           ,"cpu_seconds": time.process_time() - cpu
+           ,"returncode": rc
+           ,"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+           }
+
+
+def measure_stage(stage, config_file, input_file, rows, size):
+    """
+      Run a stage in a fresh interpreter and add the throughput
+    """
+    output = subprocess.run([sys.executable, os.path.realpath(__file__), "--stage", stage, "--config", config_file, "--input", input_file],
+                            check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    measurement = json.loads(output)
+    seconds = max(measurement["seconds"], 1e-9)
+    measurement["rows_per_second"] = rows / seconds
+    measurement["mb_per_second"] = size / seconds / 1024 / 1024
+    return measurement
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=THIS_SCRIPTS_PATH, check=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    PARSER = argparse.ArgumentParser(description='Benchmark the validation stages on synthetic data files generated from csv specifications')
+    PARSER.add_argument('--config', action="append", dest="config_files", required=True, help='Config file (csv spec) the data files are generated from, may be repeated')
+    PARSER.add_argument('--rows', action="store", dest="rows", default=",".join(str(r) for r in DEFAULT_ROWS), help='Comma separated numbers of data rows to generate, e.g. 10000,1000000')
+    PARSER.add_argument('--width', action="store", dest="width", type=int, default=None, help='Number of columns, the spec columns are repeated to reach it')
+    PARSER.add_argument('--error-rate', action="store", dest="error_rate", type=float, default=0.0, help='Fraction of rows with a value failing a check')
+    PARSER.add_argument('--duplicate-rate', action="store", dest="duplicate_rate", type=float, default=0.0, help='Fraction of rows repeating a recent uniqueness key')
+    PARSER.add_argument('--quoted-newline-rate', action="store", dest="quoted_newline_rate", type=float, default=0.0, help='Fraction of rows with a newline in a quoted value')
+    PARSER.add_argument('--stages', action="store", dest="stages", default=",".join(STAGES), help='Comma separated stages to time: ' + ",".join(STAGES))
+    PARSER.add_argument('--repeat', action="store", dest="repeat", type=int, default=1, help='Times each stage is run, the fastest run is kept')
+    PARSER.add_argument('--seed', action="store", dest="seed", type=int, default=0, help='Random seed of the generator')
+    PARSER.add_argument('--workdir', action="store", dest="workdir", default=None, help='Directory for the generated files, a temporary directory by default')
+    PARSER.add_argument('--keep', action="store_true", dest="keep", help='Keep the generated files')
+    PARSER.add_argument('--output', action="store", dest="output", default="benchmark_results.json", help='Results file (json)')
+    PARSER.add_argument('--stage', action="store", dest="stage", default=None, help=argparse.SUPPRESS)
+    PARSER.add_argument('--input', action="store", dest="input_file", default=None, help=argparse.SUPPRESS)
+    OPTIONS = PARSER.parse_args()
+
+    # child process, one stage #####################################################################################################
+    if OPTIONS.stage is not None:
+        print(json.dumps(run_stage(OPTIONS.stage, OPTIONS.config_files[0], OPTIONS.input_file)))
+        return 0
+
+    stages = [s for s in OPTIONS.stages.split(",") if s != ""]
+    for stage in stages:
+        if stage not in STAGES:
+            print("Unknown stage: %s" % stage)
+            return 8
+    rows_list = [int(r) for r in OPTIONS.rows.split(",") if r != ""]
+
+    workdir = OPTIONS.workdir
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="csvvalidator_benchmark_")
+    else:
+        os.makedirs(workdir, exist_ok=True)
+
+    results = {"started": datetime.datetime.now().isoformat()
+              ,"python": sys.version.split()[0]
+              ,"platform": platform.platform()
+              ,"cpu_count": os.cpu_count()
+              ,"commit": _git_commit()
+              ,"runs": []
+              }
+    try:
+        for config_file in OPTIONS.config_files:
+            with open(config_file, "r") as cf:
+                config_data = benchmark_spec(json.load(cf), OPTIONS.width)
+            name = os.path.splitext(os.path.basename(config_file))[0]
+            spec_file = os.path.join(workdir, name + "_spec.json")
+            with open(spec_file, "w") as f:
+                json.dump(config_data, f, indent=1)
+
+            for rows in rows_list:
+                data_file = os.path.join(workdir, "%s_%d.csv" % (name, rows))
+                generator = Generator(config_data["csvspec"], OPTIONS.error_rate, OPTIONS.duplicate_rate, OPTIONS.quoted_newline_rate, OPTIONS.seed)
+                start = time.perf_counter()
+                generator.write(data_file, rows)
+                generate_seconds = time.perf_counter() - start
+                size = os.stat(data_file).st_size
+
+                run = {"config": config_file
+                      ,"rows": rows
+                      ,"columns": len(config_data["csvspec"]["columns"])
+                      ,"bytes": size
+                      ,"error_rate": OPTIONS.error_rate
+                      ,"duplicate_rate": OPTIONS.duplicate_rate
+                      ,"quoted_newline_rate": OPTIONS.quoted_newline_rate
+                      ,"seed": OPTIONS.seed
+                      ,"generate_seconds": generate_seconds
+                      ,"stages": {}
+                      }
+                print("%s rows: %d bytes: %d" % (config_file, rows, size))
+                for stage in stages:
+                    measurements = [measure_stage(stage, spec_file, data_file, rows, size) for _ in range(max(1, OPTIONS.repeat))]
+                    run["stages"][stage] = min(measurements, key=lambda m: m["seconds"])
+                    print("  %-12s %10.3fs %12.0f rows/s %8.1f MB/s %8d KB max rss" % (stage, run["stages"][stage]["seconds"], run["stages"][stage]["rows_per_second"],
+                                                                                    run["stages"][stage]["mb_per_second"], run["stages"][stage]["max_rss_kb"]))
+                results["runs"].append(run)
+                if not OPTIONS.keep:
+                    os.remove(data_file)
+    finally:
+        if OPTIONS.workdir is None and not OPTIONS.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(OPTIONS.output, "w") as f:
+        json.dump(results, f, indent=1)
+    print("Results written to %s" % OPTIONS.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the daemon mode: a long running process that validates the data files arriving in landing directories
+
+Each landing directory (--watch) is paired with a csv Spec (--config, one for all or one per directory). The specs
+are loaded once by each worker process of a pool, so a data file costs neither interpreter start up nor loading
+its spec. The landing directories are polled, a file is taken once its size and modification time have not changed
+for --settle seconds. It is moved to <watch>/processing while it is validated, then to <watch>/accepted or
+<watch>/rejected with <file>.result.json next to it (the report, record count, return code and metrics), and with
+--column-profile <file>.profile.json (see validate_this_profile.py).
+Files left in processing by a stopped daemon are validated again on start up. Names starting with . or ending
+with .tmp or .part are ignored.
+
+With --port a small http endpoint is served on localhost:
+    GET  /status       counts of queued, running, accepted and rejected files and the most recent results
+    POST /submit       body {"path": "...", "config": "..."} validate a file in place (config defaults to the first),
+                       returns {"id": ...}; the file is not moved and no result file is written
+    GET  /jobs/<id>    the state of a submitted file, with its result once validated
+
+## Sample Usage
+```
+python3 daemon_this.py --watch=/data/landing/countries --config=countries.json --workers=4 --port=8750
+python3 daemon_this.py --watch=/data/in/a --config=a.json --watch=/data/in/b --config=b.json --poll-seconds=5
+curl -s localhost:8750/status
+curl -s -d '{"path": "/data/adhoc/countries.csv"}' localhost:8750/submit
+```
+"""
+import argparse
+import collections
+import datetime
+import http.server
+import itertools
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+
+THIS_SCRIPTS_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.abspath(THIS_SCRIPTS_PATH))
+
+from validateThis import DEFAULT_OPTIONS
+from validateThis import MyFormatter
+from validateThis import Validator
+from validateThis import load_config
+from validate_this_domains import load_domains
+
+LOGGER = logging.getLogger('')
+
+DEFAULT_POLL_SECONDS = 2.0
+DEFAULT_SETTLE_SECONDS = 1.0
+RECENT_RESULTS = 100
+IGNORED_SUFFIXES = (".tmp", ".part", ".result.json", ".profile.json")
+PROCESSING = "processing"
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+
+
+# Worker processes, each loads every csv Spec once ##################################################################################
+_VALIDATORS = {}
+
+def _init_worker(configs, options):
+    for config_file, config_data in configs.items():
+        _VALIDATORS[config_file] = Validator(config_data, options, config_file, log=False)
+        # warm the cache the first data file would otherwise pay for: domains read from files
+        load_domains(config_data["csvspec"])
+
+def _validate_job(config_file, input_file):
+    return _VALIDATORS[config_file].validate(input_file)
+
+
+def _write_atomic(filename, text):
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, filename)
+
+
+def _free_name(directory, name):
+    """
+      A name in directory not yet taken, a timestamp is added to name if it is
+    """
+    if not os.path.exists(os.path.join(directory, name)):
+        return name
+    stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    root, ext = os.path.splitext(name)
+    return root + "." + stamp + ext
+
+
+class Daemon:
+    """
+    Poll the landing directories and validate the data files arriving in them with a pool of worker processes
+    watches is a list of (directory, config file), configs maps each config file to its loaded csv Spec
+    """
+
+    def __init__(self, watches, configs, options=None, workers=1, poll_seconds=DEFAULT_POLL_SECONDS, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        self.watches = watches
+        self.configs = configs
+        self.options = dict(DEFAULT_OPTIONS)
+        if options is not None:
+            self.options.update(options)
+        # a worker validates one data file at a time
+        self.options["workers"] = 1
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.submitted = queue.Queue()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.running = {}
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.counts = {"accepted": 0, "rejected": 0, "failed": 0}
+        self.recent = collections.deque(maxlen=RECENT_RESULTS)
+
+    def _directories(self, watch):
+        return {name: os.path.join(watch, name) for name in (PROCESSING, ACCEPTED, REJECTED)}
+
+    def submit(self, path, config_file=None):
+        """
+          Queue a data file to validate in place, returns the job id
+        """
+        if config_file is None:
+            config_file = self.watches[0][1]
+        if config_file not in self.configs:
+            raise ValueError("config not loaded by the daemon: " + str(config_file))
+        with self.lock:
+            job_id = str(next(self.job_ids))
+            self.jobs[job_id] = {"id": job_id, "path": path, "config": config_file, "state": "queued", "result": None}
+        self.submitted.put(job_id)
+        return job_id
+
+    def status(self):
+        with self.lock:
+            return {"watch": [{"directory": watch, "config": config_file} for watch, config_file in self.watches]
+                   ,"workers": self.workers
+                   ,"queued": self.submitted.qsize()
+                   ,"running": len(self.running)
+                   ,"counts": dict(self.counts)
+                   ,"recent": list(self.recent)
+                   }
+
+    def job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def _arrived(self, watch):
+        """
+          The data files in the landing directory that have not changed for settle_seconds
+        """
+        now = time.time()
+        ready = []
+        seen = {}
+        try:
+            names = sorted(os.listdir(watch))
+        except OSError as e:
+            LOGGER.error("Landing directory not readable: %s: %s", watch, e)
+            return ready
+        for name in names:
+            path = os.path.join(watch, name)
+            if name.startswith(".") or name.endswith(IGNORED_SUFFIXES) or not os.path.isfile(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            if self.seen.get(watch, {}).get(path) == state and now - st.st_mtime >= self.settle_seconds:
+                ready.append(name)
+            seen[path] = state
+        self.seen[watch] = seen
+        return ready
+
+    def _start(self, pool, config_file, path, job=None, watch=None):
+        future = pool.submit(_validate_job, config_file, path)
+        with self.lock:
+            self.running[future] = (config_file, path, job, watch, time.time())
+            if job is not None:
+                self.jobs[job]["state"] = "running"
+
+    def _claim(self, pool, watch, config_file, name):
+        """
+          Move an arrived data file to processing and start its validation
+        """
+        directories = self._directories(watch)
+        target = os.path.join(directories[PROCESSING], _free_name(directories[PROCESSING], name))
+        try:
+            os.replace(os.path.join(watch, name), target)
+        except OSError as e:
+            LOGGER.error("Data file could not be moved to %s: %s", directories[PROCESSING], e)
+            return
+        LOGGER.info("Received %s", target)
+        self._start(pool, config_file, target, watch=watch)
+
+    def _finish(self, future):
+        with self.lock:
+            config_file, path, job, watch, started = self.running.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            LOGGER.error("Validation failed with an exception: %s: %s", path, e)
+            result = {"input": path, "returncode": 8, "recordcount": None, "compression": None, "report": [("ERROR", str(e))], "metrics": None}
+            outcome = "failed"
+        else:
+            outcome = "accepted" if result["returncode"] == 0 else "rejected"
+        result["config"] = config_file
+        result["started"] = started
+        result["finished"] = time.time()
+
+        if watch is not None:
+            # landing directory file, moved with its result file next to it
+            directory = self._directories(watch)[ACCEPTED if outcome == "accepted" else REJECTED]
+            name = _free_name(directory, os.path.basename(path))
+            target = os.path.join(directory, name)
+            try:
+                os.replace(path, target)
+                result["input"] = target
+                if result.get("profile") is not None:
+                    profile = result.pop("profile")
+                    _write_atomic(target + ".profile.json", json.dumps(dict(profile, input=target), indent=1, default=str) + "\n")
+                _write_atomic(target + ".result.json", json.dumps(result, indent=1) + "\n")
+            except OSError as e:
+                LOGGER.error("Data file could not be moved to %s: %s", directory, e)
+        LOGGER.info("%s %s, exit status %d, %.3fs", outcome.capitalize(), result["input"], result["returncode"], result["finished"] - started)
+
+        with self.lock:
+            self.counts[outcome] = self.counts[outcome] + 1
+            self.recent.append({"input": result["input"], "config": config_file, "returncode": result["returncode"]
+                               ,"recordcount": result["recordcount"], "outcome": outcome, "finished": result["finished"]})
+            if job is not None:
+                self.jobs[job]["state"] = "done"
+                self.jobs[job]["result"] = result
+
+    def run(self):
+        """
+          Poll and validate until stop() is called, the files being validated are finished first
+        """
+        for watch, config_file in self.watches:
+            for directory in self._directories(watch).values():
+                os.makedirs(directory, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.configs, self.options)) as pool:
+            # files left in processing by a daemon that was stopped
+            for watch, config_file in self.watches:
+                processing = self._directories(watch)[PROCESSING]
+                for name in sorted(os.listdir(processing)):
+                    LOGGER.info("Resuming %s", os.path.join(processing, name))
+                    self._start(pool, config_file, os.path.join(processing, name), watch=watch)
+
+            next_poll = 0.0
+            while not self.stopping.is_set():
+                if time.time() >= next_poll:
+                    next_poll = time.time() + self.poll_seconds
+                    # at most a few files per worker are queued in the pool, the rest wait in the landing directory
+                    for watch, config_file in self.watches:
+                        for name in self._arrived(watch):
+                            if len(self.running) >= 2 * self.workers:
+                                break
+                            self._claim(pool, watch, config_file, name)
+                while len(self.running) < 2 * self.workers:
+                    try:
+                        job = self.submitted.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._start(pool, self.jobs[job]["config"], self.jobs[job]["path"], job=job)
+
+                timeout = max(0.05, min(next_poll - time.time(), 0.5))
+                if len(self.running) == 0:
+                    self.stopping.wait(timeout)
+                    continue
+                done, not_done = wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(future)
+
+            for future in list(self.running):
+                future.result()
+                self._finish(future)
+
+    def stop(self):
+        self.stopping.set()
+
+
+class StatusHandler(http.server.BaseHTTPRequestHandler):
+    """
+    The http endpoint of the daemon, see the module description
+    """
+    daemon = None
+
+    def _send(self, code, body):
+        data = (json.dumps(body, indent=1) + "\n").encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._send(200, self.daemon.status())
+        elif self.path.startswith("/jobs/"):
+            job = self.daemon.job(self.path[len("/jobs/"):])
+            if job is None:
+                self._send(404, {"error": "job not found"})
+            else:
+                self._send(200, job)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/submit":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+            path = os.path.abspath(body["path"])
+            if not os.path.isfile(path):
+                raise ValueError("file not found: " + path)
+            job_id = self.daemon.submit(path, body.get("config"))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, {"id": job_id, "path": path})
+
+    def log_message(self, format, *args):
+        LOGGER.debug("http: " + format, *args)
+
+
+def main():
+    PARSER = argparse.ArgumentParser(description='Validate the data files arriving in landing directories, moving them to accepted or rejected')
+    PARSER.add_argument('--watch', action="append", dest="watch_dirs", required=True, help='Landing directory, may be repeated')
+    PARSER.add_argument('--config', action="append", dest="config_files", required=True, help='Config file (csv spec) for the landing directories, one for all or one per --watch in the same order')
+    PARSER.add_argument('--workers', action="store", dest="workers", type=int, default=os.cpu_count() or 1, help='Number of worker processes validating data files concurrently')
+    PARSER.add_argument('--poll-seconds', action="store", dest="poll_seconds", type=float, default=DEFAULT_POLL_SECONDS, help='Interval between scans of the landing directories')
+    PARSER.add_argument('--settle-seconds', action="store", dest="settle_seconds", type=float, default=DEFAULT_SETTLE_SECONDS, help='A data file is taken once it has not changed for this long')
+    PARSER.add_argument('--port', action="store", dest="port", type=int, default=None, help='Serve the status and submit endpoint on this localhost port')
+    PARSER.add_argument('--trust-spec', action="store_true", dest="trust_spec", help='Skip sniffing, only check the data file decodes with the csvspec encoding (a full scan of the data file)')
+    PARSER.add_argument('--max-errors', action="store", dest="max_errors", type=int, default=None, help='Fail fast: stop validating a data file after this many errors')
+    PARSER.add_argument('--sample', action="store", dest="sample_rows", type=int, default=None, help='Check a sample of N records before the full pass, see validateThis.py')
+    PARSER.add_argument('--unique-memory-mb', action="store", dest="unique_memory_mb", type=float, default=None, help='Memory budget (MB) for uniqueness keys per worker')
+    PARSER.add_argument('--column-profile', action="store_true", dest="column_profile", help='Profile the columns of each data file, written to <file>.profile.json next to the result file')
+    PARSER.add_argument('--key-index', action="store", dest="key_index", default=None, help='SQLite key index shared by the workers, see validateThis.py')
+    OPTIONS = PARSER.parse_args()
+
+    if len(OPTIONS.config_files) != 1 and len(OPTIONS.config_files) != len(OPTIONS.watch_dirs):
+        print("Give one --config, or one per --watch")
+        return 8
+    config_files = OPTIONS.config_files
+    if len(config_files) == 1:
+        config_files = config_files * len(OPTIONS.watch_dirs)
+    configs = {}
+    for config_file in config_files:
+        if not os.path.exists(config_file):
+            print("Config file specified not found: %s" % config_file)
+            return 8
+        configs[config_file] = load_config(config_file)
+
+    LOGGER.setLevel(configs[config_files[0]]["loglevel"])
+    ch = logging.StreamHandler()
+    ch.setFormatter(MyFormatter(fmt='%(asctime)s %(levelname)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S.%f'))
+    LOGGER.addHandler(ch)
+
+    options = {"trust_spec": OPTIONS.trust_spec, "max_errors": OPTIONS.max_errors, "sample_rows": OPTIONS.sample_rows, "unique_memory_mb": OPTIONS.unique_memory_mb, "key_index": OPTIONS.key_index, "column_profile": OPTIONS.column_profile}
+    daemon = Daemon(list(zip(OPTIONS.watch_dirs, config_files)), configs, options, OPTIONS.workers, OPTIONS.poll_seconds, OPTIONS.settle_seconds)
+
+    server = None
+    if OPTIONS.port is not None:
+        StatusHandler.daemon = daemon
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", OPTIONS.port), StatusHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        LOGGER.info("Serving status on http://127.0.0.1:%d/status", server.server_address[1])
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    for watch, config_file in daemon.watches:
+        LOGGER.info("Watching %s with %s", watch, config_file)
+    daemon.run()
+    if server is not None:
+        server.shutdown()
+    LOGGER.info("Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Shared fixtures of the tests, the modules of the tool are imported from the repository root
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ["id", "name", "day"]
+
+
+def _column(colorder, name, datatype, **extra):
+    col = {"colorder": str(colorder), "name": name, "type": datatype, "allow_blank": False, "allow_null": False,
+           "null_value": None, "max_value": None, "max_len": None}
+    col.update(extra)
+    return col
+
+
+@pytest.fixture
+def make_config():
+    """
+      A config (csv Spec) with the columns id (integer), name (string, max len 10) and day (date %d-%m-%Y)
+      Keyword arguments are set on the csvspec, e.g. uniqueness=["id"]
+    """
+    def make(**csvspec):
+        spec = {"allow_empty": False,
+                "uniqueness": None,
+                "dialect": {"delimeter": ",", "doublequote": True, "escapechar": None, "lineterminator": "'\\r\\n'",
+                            "quotechar": "\"", "quoting": 0, "skipinitialspace": False, "strict": None,
+                            "has_header": True, "encoding": "utf-8"},
+                "columns": [_column(0, "id", "integer"), _column(1, "name", "string", max_len=10),
+                            _column(2, "day", "date", format="%d-%m-%Y")]}
+        spec.update(csvspec)
+        return {"loglevel": "ERROR", "csvspec": spec}
+    return make
+
+
+@pytest.fixture
+def write_csv():
+    """
+      Write the header and rows to a data file, append=True adds the rows to the end of it
+    """
+    def write(path, rows, append=False):
+        with open(path, "a" if append else "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\r\n")
+            if not append:
+                writer.writerow(HEADER)
+            writer.writerows(rows)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def good_rows():
+    """
+      Valid rows with the ids first to last
+    """
+    def rows(first, last):
+        return [[str(i), "name%d" % (i % 100), "%02d-01-2020" % (i % 28 + 1)] for i in range(first, last + 1)]
+    return rows
+
+
+@pytest.fixture
+def validate():
+    """
+      Validate a data file without logging, keyword arguments are the Validator options
+    """
+    from validateThis import Validator
+
+    def run(config, input_file, **options):
+        options.setdefault("trust_spec", True)
+        return Validator(config, options, log=False).validate(input_file)
+    return run
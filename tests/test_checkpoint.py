@@ -0,0 +1,55 @@
+import json
+
+
+def _report(result):
+    return "\n".join(line for level, line in result["report"])
+
+
+def test_resume_reads_only_the_appended_records(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config(uniqueness=["id"])
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 100))
+    checkpoint_file = str(tmp_path / "data.checkpoint")
+
+    first = validate(config, data_file, checkpoint_file=checkpoint_file)
+    assert first["returncode"] == 0
+    with open(checkpoint_file) as f:
+        assert json.load(f)["recordcount"] == 101
+
+    write_csv(data_file, good_rows(101, 120), append=True)
+    second = validate(config, data_file, checkpoint_file=checkpoint_file, sample_rows=10)
+    assert second["returncode"] == 0
+    assert second["recordcount"] == 121
+    report = _report(second)
+    assert "Resuming from checkpoint" in report
+    assert "Sample test not used, resuming from a checkpoint" in report
+    with open(checkpoint_file) as f:
+        assert json.load(f)["recordcount"] == 121
+
+
+def test_resume_finds_duplicates_of_keys_before_the_checkpoint(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config(uniqueness=["id"])
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 100))
+    checkpoint_file = str(tmp_path / "data.checkpoint")
+    assert validate(config, data_file, checkpoint_file=checkpoint_file)["returncode"] == 0
+
+    write_csv(data_file, good_rows(101, 105) + good_rows(7, 7), append=True)
+    # a memory budget of a few keys spills the seeded keys to disk
+    result = validate(config, data_file, checkpoint_file=checkpoint_file, unique_memory_mb=0.0001)
+    assert result["returncode"] == 8
+    assert "Duplicate found at row: 107: 7" in _report(result)
+    # a failed run leaves the checkpoint where it was
+    with open(checkpoint_file) as f:
+        assert json.load(f)["recordcount"] == 101
+
+
+def test_changed_prefix_ignores_the_checkpoint(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 50))
+    checkpoint_file = str(tmp_path / "data.checkpoint")
+    assert validate(config, data_file, checkpoint_file=checkpoint_file)["returncode"] == 0
+
+    write_csv(data_file, good_rows(1, 20) + [["x", "name", "01-01-2020"]] + good_rows(22, 60))
+    result = validate(config, data_file, checkpoint_file=checkpoint_file)
+    assert "Checkpoint ignored" in _report(result)
+    assert result["returncode"] == 8
+    assert "Non-Integer value found at row: 22: x" in _report(result)
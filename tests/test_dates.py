@@ -0,0 +1,13 @@
+from validate_this_dates import check_corpus
+from validate_this_dates import datetime_parser
+
+
+def test_compiled_parsers_match_strptime():
+    assert check_corpus() == []
+
+
+def test_cached_parser_matches_uncached():
+    values = ["31-12-2000", "29-02-2000", "29-02-2001", "1-1-2000", "", "31-12-2000"] * 3
+    cached = datetime_parser("%d-%m-%Y")
+    uncached = datetime_parser("%d-%m-%Y", cache_size=0)
+    assert [cached(value) for value in values] == [uncached(value) for value in values]
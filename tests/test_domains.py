@@ -0,0 +1,69 @@
+import collections
+import os
+
+import pytest
+
+import validate_this_domains
+from validate_this_domains import DiskDomain
+from validate_this_domains import compile_domain
+from validate_this_domains import load_domains
+
+
+@pytest.fixture(autouse=True)
+def domain_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(validate_this_domains.CACHE_ENV, str(tmp_path / "cache"))
+    monkeypatch.setattr(validate_this_domains, "_LOADED", collections.OrderedDict())
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_domain_file_and_disk_lookup(tmp_path):
+    values = _write(tmp_path / "values.txt", "fred\nwilma\n\nbarney\n")
+    in_memory = compile_domain({"name": "name", "domain_file": values})
+    assert in_memory == frozenset(["fred", "wilma", "barney"])
+
+    disk = compile_domain({"name": "name", "domain_file": values, "domain_lookup": "disk"})
+    assert isinstance(disk, DiskDomain)
+    assert len(disk) == 3
+    assert [value in disk for value in ["fred", "barney", "betty", "", None]] == [True, True, False, False, False]
+
+
+def test_domain_csv_column(tmp_path):
+    source = _write(tmp_path / "codes.csv", "code,label\nAU,Australia\nNZ,New Zealand\n")
+    col = {"name": "country", "domain_csv": {"file": source, "column": "code"}}
+    assert compile_domain(col) == frozenset(["AU", "NZ"])
+
+    csvspec = {"columns": [col, {"name": "other", "domain_csv": {"file": source, "column": "missing"}}]}
+    rc, report = load_domains(csvspec)
+    assert rc == 8
+    assert report[0] == "Domain for column country loaded (domain_csv: " + source + " column: code): 2 values, in memory"
+    assert report[1].startswith("ERROR Domain for column other could not be loaded")
+
+
+def test_changed_source_replaces_the_loaded_domain(tmp_path):
+    values = _write(tmp_path / "values.txt", "a\nb\n")
+    col = {"name": "letter", "domain_file": values}
+    assert compile_domain(col) == frozenset(["a", "b"])
+
+    _write(values, "a\nb\nc\n")
+    # the cache is keyed by the size and modification time of the source, make sure the latter changes too
+    stat = os.stat(values)
+    os.utime(values, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert compile_domain(col) == frozenset(["a", "b", "c"])
+    assert len(validate_this_domains._LOADED) == 1
+
+
+def test_loaded_domains_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(validate_this_domains, "LOADED_DOMAINS", 2)
+    cols = [{"name": "letter", "domain_file": _write(tmp_path / ("values%d.txt" % i), "v%d\n" % i)} for i in range(4)]
+    for col in cols:
+        compile_domain(col)
+    # the domains used last are kept
+    compile_domain(cols[2])
+    compile_domain(cols[0])
+    loaded = [source for (source, jsonspec), disk in validate_this_domains._LOADED]
+    assert loaded == [os.path.abspath(cols[2]["domain_file"]), os.path.abspath(cols[0]["domain_file"])]
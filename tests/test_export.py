@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+
+def test_accepted_data_file_is_exported_as_typed_columns(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 3))
+    export_file = str(tmp_path / "data.npz")
+
+    assert validate(config, data_file, export_file=export_file)["returncode"] == 0
+    with numpy.load(export_file) as npz:
+        assert npz["id"].dtype == numpy.int64
+        assert list(npz["id"]) == [1, 2, 3]
+        assert list(npz["name"]) == ["name1", "name2", "name3"]
+        assert list(npz["day"]) == list(numpy.array(["2020-01-02", "2020-01-03", "2020-01-04"], dtype="datetime64[D]"))
+        assert npz["day.valid"].all()
+
+
+def test_export_holds_the_accepted_rows_of_a_quarantine(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 19) + [["x", "name", "01-01-2020"]])
+    export_file = str(tmp_path / "data.npz")
+
+    result = validate(config, data_file, export_file=export_file, accepted_file=str(tmp_path / "accepted.csv"),
+                      rejected_file=str(tmp_path / "rejected.csv"), max_reject_rate=0.1)
+    assert result["returncode"] == 0
+    with numpy.load(export_file) as npz:
+        assert list(npz["id"]) == list(range(1, 20))
+
+
+def test_rejected_data_file_is_not_exported(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 5) + [["6", "name6", "31-02-2020"]])
+    export_file = str(tmp_path / "data.npz")
+
+    assert validate(config, data_file, export_file=export_file)["returncode"] == 8
+    assert not os.path.exists(export_file)
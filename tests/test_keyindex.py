@@ -0,0 +1,35 @@
+def _report(result):
+    return "\n".join(line for level, line in result["report"])
+
+
+def test_unique_across_history(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config(name="orders", uniqueness=["id"], unique_across_history=True)
+    key_index = str(tmp_path / "keys.sqlite")
+
+    first = write_csv(tmp_path / "first.csv", good_rows(1, 10))
+    assert validate(config, first, key_index=key_index)["returncode"] == 0
+
+    # a data file repeating a key of an accepted data file is rejected, and its keys are not added
+    second = write_csv(tmp_path / "second.csv", good_rows(11, 20) + good_rows(4, 4))
+    result = validate(config, second, key_index=key_index)
+    assert result["returncode"] == 8
+    assert "Key found in an earlier data file at row: 12: 4" in _report(result)
+
+    third = write_csv(tmp_path / "third.csv", good_rows(11, 20))
+    assert validate(config, third, key_index=key_index)["returncode"] == 0
+    again = write_csv(tmp_path / "again.csv", good_rows(20, 20))
+    assert validate(config, again, key_index=key_index)["returncode"] == 8
+
+
+def test_foreign_key(tmp_path, make_config, write_csv, good_rows, validate):
+    key_index = str(tmp_path / "keys.sqlite")
+    parents = make_config(name="parents", uniqueness=["id"], indexed_columns=["id"])
+    assert validate(parents, write_csv(tmp_path / "parents.csv", good_rows(1, 10)), key_index=key_index)["returncode"] == 0
+
+    children = make_config(name="children")
+    children["csvspec"]["columns"][0]["foreign_key"] = "parents/id"
+    assert validate(children, write_csv(tmp_path / "children.csv", good_rows(2, 8)), key_index=key_index)["returncode"] == 0
+    result = validate(children, write_csv(tmp_path / "orphans.csv", good_rows(9, 12)), key_index=key_index)
+    assert result["returncode"] == 8
+    assert "Value not found in foreign key parents/id at row: 4: 11" in _report(result)
+    assert "at row: 5: 12" in _report(result)
@@ -0,0 +1,81 @@
+import csv
+import io
+
+from validate_this_functions import register_dialect
+from validate_this_functions import single_pass_test
+from validate_this_parallel import parallel_pass_test
+from validate_this_parallel import split_file
+from validate_this_records import record_offset
+from validate_this_records import split_ranges
+from validate_this_report import ErrorLimit
+from validate_this_report import ReportCollector
+from validate_this_report import Reporter
+
+
+def _quoted_rows(count):
+    """
+      Rows with quoted delimiters, quotes and newlines, so a newline is not always a record boundary
+    """
+    names = ["plain", "a, b", "a \"q\"", "two\r\nlines", "x"]
+    return [[str(i), names[i % len(names)], "%02d-01-2020" % (i % 28 + 1)] for i in range(1, count + 1)]
+
+
+def _records(data, start, end):
+    return list(csv.reader(io.StringIO(data[start:end].decode("utf-8"), newline="")))
+
+
+def test_ranges_start_on_record_boundaries(tmp_path, make_config, write_csv):
+    csvspec = make_config()["csvspec"]
+    data_file = write_csv(tmp_path / "data.csv", _quoted_rows(500))
+    with open(data_file, "rb") as f:
+        data = f.read()
+
+    ranges = split_ranges(data_file, csvspec["dialect"], 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    records = []
+    for start, end, records_before in ranges:
+        assert records_before == len(records)
+        records.extend(_records(data, start, end))
+    assert records == _records(data, 0, len(data))
+
+
+def test_record_offset(tmp_path, make_config, write_csv):
+    csvspec = make_config()["csvspec"]
+    data_file = write_csv(tmp_path / "data.csv", _quoted_rows(50))
+    with open(data_file, "rb") as f:
+        data = f.read()
+    for records in (1, 4, 17, 50):
+        offset = record_offset(data_file, csvspec["dialect"], records, block_size=64)
+        assert _records(data, offset, len(data)) == _records(data, 0, len(data))[records:]
+    assert record_offset(data_file, csvspec["dialect"], 52) is None
+
+
+def test_parallel_pass_matches_single_pass(tmp_path, make_config, write_csv):
+    csvspec = make_config(uniqueness=["id"])["csvspec"]
+    register_dialect(csvspec)
+    rows = _quoted_rows(2000)
+    rows[100][2] = "31-02-2020"
+    rows[1500][0] = "7"
+    data_file = write_csv(tmp_path / "data.csv", rows)
+    assert len(split_file(csvspec, data_file, 3)) == 3
+
+    single = single_pass_test(csvspec, data_file)
+    parallel = parallel_pass_test(csvspec, data_file, 3)
+    for result in ("recordcount", "unique", "domain", "data", "stopped"):
+        assert parallel[result] == single[result]
+    assert "ERROR Duplicate found at row: 1502: 7" in parallel["unique"][1]
+
+
+def test_parallel_pass_stops_at_the_first_range_stopped(tmp_path, make_config, write_csv):
+    csvspec = make_config()["csvspec"]
+    register_dialect(csvspec)
+    rows = _quoted_rows(3000)
+    for i in (10, 11, 2900, 2901):
+        rows[i][0] = "x"
+    data_file = write_csv(tmp_path / "data.csv", rows)
+
+    results = parallel_pass_test(csvspec, data_file, 3, reporter=Reporter([ReportCollector(), ErrorLimit(2)]))
+    assert results["stopped"] is not None
+    # the record of the second error of the first range, the later ranges do not move it
+    assert results["recordcount"] == 13
@@ -0,0 +1,49 @@
+import csv
+
+
+def _read(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_rows_are_split_into_accepted_and_rejected(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config(uniqueness=["id"])
+    rows = good_rows(1, 10) + [["11", "a name too long", "01-01-2020"], ["3", "name3", "04-01-2020"], ["13", "name13", "30-02-2020"]]
+    data_file = write_csv(tmp_path / "data.csv", rows)
+    accepted_file = str(tmp_path / "accepted.csv")
+    rejected_file = str(tmp_path / "rejected.csv")
+
+    result = validate(config, data_file, accepted_file=accepted_file, rejected_file=rejected_file)
+    assert result["returncode"] == 8
+
+    accepted = _read(accepted_file)
+    assert accepted == [["id", "name", "day"]] + good_rows(1, 10)
+    rejected = _read(rejected_file)
+    assert rejected[0] == ["id", "name", "day", "row_number", "failed_checks"]
+    assert [row[3] for row in rejected[1:]] == ["12", "13", "14"]
+    assert rejected[1][4] == "data:max_len:name"
+    assert rejected[2][4] == "unique:unique:id"
+    assert rejected[3][4] == "data:date:day"
+
+
+def test_max_reject_rate_accepts_the_data_file(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 19) + [["x", "name", "01-01-2020"]])
+    options = {"accepted_file": str(tmp_path / "accepted.csv"), "rejected_file": str(tmp_path / "rejected.csv")}
+
+    assert validate(config, data_file, max_reject_rate=0.01, **options)["returncode"] == 8
+    assert validate(config, data_file, max_reject_rate=0.05, **options)["returncode"] == 0
+    assert len(_read(options["accepted_file"])) == 20
+
+
+def test_spilled_duplicates_are_moved_to_the_rejected_file(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config(uniqueness=["id"])
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 50) + good_rows(5, 5))
+    accepted_file = str(tmp_path / "accepted.csv")
+    rejected_file = str(tmp_path / "rejected.csv")
+
+    result = validate(config, data_file, accepted_file=accepted_file, rejected_file=rejected_file, unique_memory_mb=0.0001)
+    assert result["returncode"] == 8
+    assert len(_read(accepted_file)) == 51
+    rejected = _read(rejected_file)
+    assert [row[3:] for row in rejected[1:]] == [["52", "unique:unique:id"]]
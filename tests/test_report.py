@@ -0,0 +1,48 @@
+import json
+
+from validateThis import Validator
+from validate_this_report import LogSink
+from validate_this_report import ReportCollector
+from validate_this_report import Reporter
+
+
+def test_findings_and_messages_use_the_record_number(tmp_path, make_config, write_csv, good_rows, validate):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 4) + [["x", "name", "01-01-2020"]])
+    findings_file = str(tmp_path / "findings.jsonl")
+
+    result = validate(config, data_file, findings_file=findings_file)
+    assert result["returncode"] == 8
+    with open(findings_file) as f:
+        findings = [json.loads(line) for line in f]
+    assert [(finding["row"], finding["check"], finding["column"]) for finding in findings] == [(6, "integer", "id")]
+    assert findings[0]["message"] == "ERROR Non-Integer value found at row: 6: x"
+    assert ("ERROR", findings[0]["message"]) in result["report"]
+
+
+def test_log_sink_keeps_the_messages_of_the_collector():
+    logged = []
+    collector = ReportCollector(max_per_column=2, max_per_check=3)
+    sink = LogSink(logged.append, max_per_column=2, max_per_check=3)
+    reporter = Reporter([collector, sink])
+    for row in range(2, 7):
+        for index, column in enumerate(["a", "b"]):
+            reporter.add("data", "blank", index, column, row, "", "ERROR Blank value found at row: %d: " % row)
+
+    kept = [message for index in (0, 1) for check, message in collector.messages[("data", index)]]
+    assert sorted(logged) == sorted(kept)
+    assert len(logged) == 3
+    report = collector.report("data", 0, "a")
+    assert [sink.logged(line) for line in report] == [True, True, False]
+
+
+def test_log_holds_each_message_once(tmp_path, make_config, write_csv, good_rows, caplog):
+    config = make_config()
+    data_file = write_csv(tmp_path / "data.csv", good_rows(1, 4) + [["x", "name", "01-01-2020"]])
+
+    with caplog.at_level("INFO"):
+        result = Validator(config, {"trust_spec": True}).validate(data_file)
+    assert result["returncode"] == 8
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages.count("ERROR Non-Integer value found at row: 6: x") == 1
+    assert messages.index("ERROR Non-Integer value found at row: 6: x") < messages.index("checking id against integer")
@@ -0,0 +1,45 @@
+import os
+
+from validate_this_unique import KEY_COST
+from validate_this_unique import UniqueKeys
+from validate_this_unique import load_digests
+
+# room for 10 keys in memory
+TEN_KEYS_MB = 10 * KEY_COST / (1024 * 1024)
+
+
+def test_duplicates_in_memory_are_reported_when_added():
+    keys = UniqueKeys()
+    found = [keys.add((value,), row) for row, value in enumerate(["a", "b", "a", "c", "b"], start=2)]
+    assert found == [False, False, True, False, True]
+    assert keys.finish() == []
+
+
+def test_spilled_duplicates_are_found_by_finish(tmp_path):
+    keys = UniqueKeys(TEN_KEYS_MB, partitions=4, tempdir=str(tmp_path))
+    expected = []
+    for row in range(2, 102):
+        key = (str(row % 40), "x")
+        if keys.add(key, row):
+            expected.append((row, key))
+    assert keys.spilled
+    duplicates = keys.finish()
+    # the rows found before the spill and the rows found by finish() are each duplicate once
+    assert sorted(expected + duplicates) == [(row, (str(row % 40), "x")) for row in range(42, 102)]
+    assert duplicates == sorted(duplicates)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_seeded_digests_make_later_keys_duplicates(tmp_path):
+    before = UniqueKeys()
+    for row, value in enumerate(["a", "b", "c"], start=2):
+        before.add((value,), row)
+    saved = str(tmp_path / "keys")
+    assert before.save(saved) == 3
+
+    keys = UniqueKeys(TEN_KEYS_MB / 5, partitions=4, tempdir=str(tmp_path))
+    keys.seed(load_digests(saved))
+    assert keys.spilled
+    for row, value in enumerate(["d", "b", "e", "a"], start=5):
+        keys.add((value,), row)
+    assert keys.finish() == [(6, ("b",)), (8, ("a",))]
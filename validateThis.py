@@ -1,251 +1,863 @@
-"""
-This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file. 
-
-The specification is agreed format of the provided file by the supplier. This is codified in a json file passed on the command line as input. (csv Spec)
-This, together with the supplied csv file are used as parameters to run the valation of said csv file. (Data File)
-
-## Sample Usage
-```
-python3 validateThis.py --config=countries.json --input=countries.csv
-```
-
-## Checks
-* Check if file is empty and it's allowed to be/not
-* Header record in file matches expected Column Names
-* csv Dialect matched expected csv Dialect
-* Check if expected column(s) contain unique values
-* Check data contained in a column is restritect to defined 'domain' values
-* Check nulls, blanks and datatypes against expected datatype(s)
-
-"""
-import logging
-import argparse
-import json
-import csv
-import os
-import sys
-import math
-import datetime as dt
-import chardet
-
-from validate_this_functions import csvdialect_to_dict
-from validate_this_functions import compare_dialect
-from validate_this_functions import compare_headers
-from validate_this_functions import unique_test
-from validate_this_functions import domain_test
-from validate_this_functions import data_test
-from validate_this_functions import count_records
-
-THIS_SCRIPTS_PATH = os.path.dirname(os.path.realpath(__file__))
-sys.path.append(os.path.abspath(THIS_SCRIPTS_PATH))
-
-class MyFormatter(logging.Formatter):
-    """
-    Custom logger format for preferred timestamp
-    """
-    converter = dt.datetime.fromtimestamp
-    def formatTime(self, record, datefmt=None):
-        ct = self.converter(record.created)
-        if datefmt:
-            s = ct.strftime(datefmt)
-        else:
-            t = ct.strftime("%Y-%m-%d %H:%M:%S")
-            s = "%s,%03d" % (t, record.msecs)
-        return s
-
-
-# start here! parse command line options ############################################################################################
-PARSER = argparse.ArgumentParser(description='Validate data file against the provided csv specification (config)')
-PARSER.add_argument('--input', action="store", dest="input_file", required=True, help='CSV Input file path and filename')
-PARSER.add_argument('--config', action="store", dest="config_file", required=True, help='Config file path and filename (csv spec)')
-OPTIONS = PARSER.parse_args()
-
-# read config  ######################################################################################################################
-# The config file is the csv Spec for the data file that will be 'validated'
-# Must exist and must not be empty
-if not os.path.exists(OPTIONS.config_file):
-    print("Config file specified not found: %s", OPTIONS.config_file)
-    sys.exit(8)
-
-if os.stat(OPTIONS.config_file).st_size == 0:
-    print("Config file specified is empty: %s", OPTIONS.config_file)
-    sys.exit(8)
-
-with open(OPTIONS.config_file, "r") as cf:
-    config_data = json.load(cf)
-
-# Finalise logger setup #############################################################################################################
-LOGGER = logging.getLogger('')
-LOGGER.setLevel(config_data["loglevel"])
-
-ch = logging.StreamHandler()
-ch.setLevel(config_data["loglevel"])
-FORMATTER = MyFormatter(fmt='%(asctime)s %(levelname)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S.%f')
-ch.setFormatter(FORMATTER)
-LOGGER.addHandler(ch)
-
-LOGGER.info("Start")
-LOGGER.info("OPTIONS.input_file : %s", OPTIONS.input_file)
-LOGGER.info("OPTIONS.config_file: %s", OPTIONS.config_file)
-
-
-# Check data file exists ############################################################################################################
-if not os.path.exists(OPTIONS.input_file):
-    print("Input file specified not found: %s", OPTIONS.input_file)
-    sys.exit(8)
-
-
-# Is the data file empty, is file allowed to be empty? ##############################################################################
-# Note a subsequent check for empty file is also performed once we know if we are expecting a Header record or not.
-if os.stat(OPTIONS.input_file).st_size == 0:
-    if config_data["csvspec"]["allow_empty"] == False:
-        LOGGER.error("Input file specified is empty: %s", OPTIONS.input_file)
-        LOGGER.error("allow_empty: %", str(config_data["csvspec"]["allow_empty"]))
-        sys.exit(8)
-    else:
-        LOGGER.info("Input file specified is empty: %s", OPTIONS.input_file)
-        LOGGER.info("allow_empty: %", str(config_data["csvspec"]["allow_empty"]))
-        sys.exit(0)
-else:
-    LOGGER.info("Input file specified is NOT empty: %s", OPTIONS.input_file)
-
-
-# sniff data file for dialect ########################################################################################################
-# read half the file or the entire file if it is small
-input_file_size = os.stat(OPTIONS.input_file).st_size
-sniff_amount = math.floor(input_file_size / 2)
-if sniff_amount < 1024:
-    sniff_amount = 1024
-LOGGER.info("Sniffing " + str(sniff_amount) + " bytes")
-
-# sniff the encoding of the data file ###############################################################################################
-with open(OPTIONS.input_file, 'rb') as rawdata:
-    result = chardet.detect(rawdata.read(sniff_amount))
-LOGGER.info(str(result))
-detected_encoding = result["encoding"]
-
-# sniff the data file to determine the csv dialect being used #######################################################################
-with open(OPTIONS.input_file, encoding=config_data["csvspec"]["dialect"]["encoding"], newline='') as csvfile:
-    try:
-        dialect = csv.Sniffer().sniff(csvfile.read(sniff_amount))
-        csvfile.seek(0)
-        sniffeddialect = csvdialect_to_dict("sniffed", dialect)
-    except Exception as e:
-        LOGGER.error("Error sniffing file for dialect: %s", OPTIONS.input_file)
-        LOGGER.error(e)
-        sys.exit(8)
-
-    try:
-        has_header = csv.Sniffer().has_header(csvfile.read(sniff_amount))
-        csvfile.seek(0)
-        sniffeddialect["dialect"]["has_header"] = has_header
-    except Exception as e:
-        LOGGER.error("Error sniffing file for dialect: %s", OPTIONS.input_file)
-        LOGGER.error(e)
-        sys.exit(8)
-sniffeddialect["dialect"]["encoding"] = detected_encoding
-
-# Compare sniffed dialect with the config file and look for unexpected mismatches ###################################################
-(returncode, report) = compare_dialect(config_data["csvspec"]["dialect"], sniffeddialect["dialect"])
-if returncode != 0:
-    for line in report:
-        LOGGER.error(line)
-    LOGGER.error("Difference detected in dialect csvspec vs sniffed")
-    sys.exit(returncode)
-else:
-    for line in report:
-        LOGGER.info(line)
-    LOGGER.info("Dialect compare OK")
-
-# If we got here proceed with using the config dialect by registering it for later use ##############################################
-class csvspec(csv.Dialect):
-    delimiter        = config_data["csvspec"]["dialect"]["delimeter"]
-    doublequote      = config_data["csvspec"]["dialect"]["doublequote"]
-    escapechar       = config_data["csvspec"]["dialect"]["escapechar"]
-    lineterminator   = config_data["csvspec"]["dialect"]["lineterminator"]
-    quotechar        = config_data["csvspec"]["dialect"]["quotechar"]
-    quoting          = config_data["csvspec"]["dialect"]["quoting"]
-    skipinitialspace = config_data["csvspec"]["dialect"]["skipinitialspace"]
-    strict           = config_data["csvspec"]["dialect"]["strict"]
-csv.register_dialect('csvspec', csvspec)
-
-# Data Checks #######################################################################################################################
-# Data Checks #######################################################################################################################
-# Data Checks #######################################################################################################################
-
-# Count records in file #############################################################################################################
-recordcount = count_records(config_data["csvspec"], OPTIONS.input_file)
-
-# File may contain a header only and no data records which may/may not be a valid scenario based on config ##########################
-if (recordcount == 1 and config_data["csvspec"]["dialect"]["has_header"] == True and config_data["csvspec"]["allow_empty"] == False):
-    LOGGER.error("An empty file has been detected where it is not allowed (Header exists)")
-    sys.exit(8)
-
-# Check headers match ################################################################################################################
-# this also has the effect of checking that all the expected columns exist/no more/no less ###########################################
-# if no headers are included in the file, then further data checks may fail if columns are not as expected ###########################
-if config_data["csvspec"]["dialect"]["has_header"] == True:
-    with open(OPTIONS.input_file, encoding=config_data["csvspec"]["dialect"]["encoding"], newline='') as csvfile:
-        csv_reader = csv.reader(csvfile, dialect='csvspec')
-        list_of_column_names = []
-        for row in csv_reader:
-            list_of_column_names = row
-            break
-
-    (returncode, report) = compare_headers(config_data["csvspec"], list_of_column_names)
-    if returncode != 0:
-        for line in report:
-            LOGGER.error(line)
-        config_data["csvspec"]["allow_empty"] == False
-        sys.exit(returncode)
-    else:
-        for line in report:
-            LOGGER.info(line)
-        LOGGER.info("Headers compare OK")
-else:
-    LOGGER.info("Skipping header check, csvspec has_headers = " + str(config_data["csvspec"]["dialect"]["has_header"]))
-
-
-# For columns with uniqueness validation, check for duplicates ######################################################################
-# Note; multie column/compund keys are not currently supported ######################################################################
-if config_data["csvspec"]["uniqueness"] is not None and str(config_data["csvspec"]["uniqueness"]) != "None" and str(config_data["csvspec"]["uniqueness"]) != "Null" and str(config_data["csvspec"]["uniqueness"]) != "":
-    returncode, report = unique_test(config_data["csvspec"], OPTIONS.input_file)
-    if returncode != 0:
-        for line in report:
-            LOGGER.error(line)
-        LOGGER.error("Failed Unique test")
-        sys.exit(returncode)
-    else:
-        for line in report:
-            LOGGER.info(line)
-        LOGGER.info("Unique test OK")
-
-# Domain checks #####################################################################################################################
-# Check specific columns contain only the allowed values ############################################################################
-returncode, report = domain_test(config_data["csvspec"], OPTIONS.input_file)
-if returncode != 0:
-    for line in report:
-        LOGGER.error(line)
-    LOGGER.error("Failed Domain test")
-    sys.exit(returncode)
-else:
-    for line in report:
-        LOGGER.info(line)
-    LOGGER.info("Domain test OK")
-
-# Data checks #######################################################################################################################
-# Check data against expected data type, blanks, nulls, max values ##################################################################
-returncode, report = data_test(config_data["csvspec"], OPTIONS.input_file)
-if returncode != 0:
-    for line in report:
-        LOGGER.error(line)
-    LOGGER.error("Failed data_test test")
-    sys.exit(returncode)
-else:
-    for line in report:
-        LOGGER.info(line)
-    LOGGER.info("data_test test OK")
-
-
-# If we got this far then we assume the file to be 'validated' against the specified config #########################################
-sys.exit(0)
\ No newline at end of file
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The specification is agreed format of the provided file by the supplier. This is codified in a json file passed on the command line as input. (csv Spec)
+This, together with the supplied csv file are used as parameters to run the valation of said csv file. (Data File)
+
+## Sample Usage
+```
+python3 validateThis.py --config=countries.json --input=countries.csv
+python3 validateThis.py --config=countries.json --input "incoming/*.csv" --batch-workers=4
+python3 validateThis.py --config countries.json countries_strict.json --input=countries.csv --findings "{spec}.jsonl"
+```
+
+From python, the csv Spec is loaded once and any number of data files validated:
+```
+validator = Validator(load_config("countries.json"))
+result = validator.validate("countries.csv")
+```
+or against several csv Specs in one read of each data file, a result per spec:
+```
+validator = MultiValidator([(load_config("countries.json"), "countries.json"), (load_config("countries_strict.json"), "countries_strict.json")])
+results = validator.validate("countries.csv")
+```
+
+## Checks
+* Check if file is empty and it's allowed to be/not
+* Header record in file matches expected Column Names
+* csv Dialect matched expected csv Dialect
+* Check if expected column(s) contain unique values
+* Check data contained in a column is restritect to defined 'domain' values
+* Check nulls, blanks and datatypes against expected datatype(s)
+
+"""
+import logging
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+
+THIS_SCRIPTS_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.abspath(THIS_SCRIPTS_PATH))
+
+from validate_this_batch import CHECK_BATCH_ROWS
+from validate_this_checkpoint import CheckpointPass
+from validate_this_checkpoint import load_checkpoint
+from validate_this_domains import load_domains
+from validate_this_export import NpzExport
+from validate_this_functions import SinglePass
+from validate_this_functions import VALID_DATATYPES
+from validate_this_functions import compare_dialect
+from validate_this_functions import compare_headers
+from validate_this_functions import scan_passes
+from validate_this_functions import uniqueness_defined
+from validate_this_functions import read_header
+from validate_this_functions import register_dialect
+from validate_this_input import DECOMPRESS_ERRORS
+from validate_this_input import PARSE_AHEAD_BATCHES
+from validate_this_input import Pipeline
+from validate_this_input import READ_AHEAD_BLOCKS
+from validate_this_input import READ_AHEAD_BLOCK_SIZE
+from validate_this_input import compression
+from validate_this_input import is_empty
+from validate_this_keyindex import KeyIndexRun
+from validate_this_keyindex import spec_name
+from validate_this_keyindex import uses_key_index
+from validate_this_metrics import Metrics
+from validate_this_metrics import profiled
+from validate_this_metrics import write_json
+from validate_this_metrics import write_prometheus
+from validate_this_parallel import parallel_pass_test
+from validate_this_parallel import split_file
+from validate_this_profile import write_profile
+from validate_this_quarantine import Quarantine
+from validate_this_report import DEFAULT_MAX_MESSAGES_PER_COLUMN
+from validate_this_report import ErrorLimit
+from validate_this_report import JsonLinesSink
+from validate_this_report import LogSink
+from validate_this_report import ReportCollector
+from validate_this_report import Reporter
+from validate_this_sample import sample_test
+from validate_this_sniff import DEFAULT_SNIFF_BYTES
+from validate_this_sniff import read_sample
+from validate_this_sniff import detect_encoding
+from validate_this_sniff import sniff_dialect
+from validate_this_sniff import verify_encoding
+from validate_this_unique import SharedKeys
+
+LOGGER = logging.getLogger('')
+
+# Options of a validation, the command line options of the same name override these
+DEFAULT_OPTIONS = {
+    "unique_memory_mb": None,
+    "sniff_bytes": DEFAULT_SNIFF_BYTES,
+    "trust_spec": False,
+    "workers": 1,
+    "findings_file": None,
+    "checkpoint_file": None,
+    "time_checks": False,
+    "profile_file": None,
+    "max_messages_per_column": DEFAULT_MAX_MESSAGES_PER_COLUMN,
+    "max_messages_per_check": None,
+    "max_errors": None,
+    "max_errors_per_check": None,
+    "sample_rows": None,
+    "read_block_kb": READ_AHEAD_BLOCK_SIZE // 1024,
+    "read_ahead_blocks": READ_AHEAD_BLOCKS,
+    "parse_batch_rows": 0,
+    "key_index": None,
+    "column_profile": False,
+    "column_profile_file": None,
+    "accepted_file": None,
+    "rejected_file": None,
+    "max_reject_rate": 0.0,
+    "export_file": None,
+    "check_batch_rows": CHECK_BATCH_ROWS,
+}
+
+class MyFormatter(logging.Formatter):
+    """
+    Custom logger format for preferred timestamp
+    """
+    converter = dt.datetime.fromtimestamp
+    def formatTime(self, record, datefmt=None):
+        ct = self.converter(record.created)
+        if datefmt:
+            s = ct.strftime(datefmt)
+        else:
+            t = ct.strftime("%Y-%m-%d %H:%M:%S")
+            s = "%s,%03d" % (t, record.msecs)
+        return s
+
+
+def load_config(config_file):
+    """
+      Read the csv Spec (config) file
+    """
+    with open(config_file, "r") as cf:
+        return json.load(cf)
+
+
+def resume(validation, error=None):
+    """
+      Run a validation (see Validator.start) until it needs the next SinglePass fed, returns the SinglePass or None
+      once the validation is done. error, an exception raised feeding the last SinglePass, is raised in the validation
+    """
+    try:
+        if error is not None:
+            return validation.throw(error)
+        return next(validation)
+    except StopIteration:
+        return None
+
+
+class Validator:
+    """
+    Validate data files against a csv Spec, the spec is loaded once and validate() is called for each data file
+
+    validate() returns a dict of:
+        input      : the data file
+        spec       : the label of the csv Spec when validated with others (see MultiValidator), else None
+        returncode : 0 if the data file is valid, 8 if not
+        recordcount: the number of records in the data file, None if it was not read
+        compression: gzip, bz2, xz or zip if the data file is compressed, else None
+        profile    : the column profile if one was asked for and the data file was read, see validate_this_profile.py
+        metrics    : the stage timings and finding counts, see Metrics.summary in validate_this_metrics.py
+        report     : list of (levelname, message), the lines logged for the data file
+    When log is True the report is also logged as it happens.
+    """
+
+    def __init__(self, config_data, options=None, config_file=None, log=True):
+        self.config_data = config_data
+        self.csvspec = config_data["csvspec"]
+        self.options = dict(DEFAULT_OPTIONS)
+        if options is not None:
+            self.options.update(options)
+        self.config_file = config_file
+        self.log = log
+        # set by a MultiValidator: the label of the spec, the date parsers shared by the specs and the results
+        # of the sniff and encoding checks shared for the data file
+        self.label = None
+        self.parsers = None
+        self.shared = None
+
+    @property
+    def configs(self):
+        return [(self.config_data, self.config_file)]
+
+    def _info(self, result, message):
+        if self.label is not None:
+            message = "[%s] %s" % (self.label, message)
+        result["report"].append(("INFO", str(message)))
+        if self.log:
+            LOGGER.info(message)
+
+    def _error(self, result, message):
+        if self.label is not None:
+            message = "[%s] %s" % (self.label, message)
+        result["report"].append(("ERROR", str(message)))
+        if self.log:
+            LOGGER.error(message)
+
+    def _lines(self, result, returncode, report, streamed=None):
+        """
+          Report lines, those logged as they happened by streamed (a LogSink) are only added to the result
+        """
+        for line in report:
+            if streamed is not None and streamed.logged(line):
+                if self.label is not None:
+                    line = "[%s] %s" % (self.label, line)
+                result["report"].append(("ERROR" if returncode != 0 else "INFO", str(line)))
+            elif returncode != 0:
+                self._error(result, line)
+            else:
+                self._info(result, line)
+
+    def _log_finding(self, message):
+        if self.label is not None:
+            message = "[%s] %s" % (self.label, message)
+        LOGGER.error(message)
+
+    def _named(self, option, input_file):
+        """
+          The file given by a file option for a data file, {name} is replaced by the data file name and {spec}
+          by the csv Spec name
+        """
+        if self.options[option] is None:
+            return None
+        filename = self.options[option].replace("{name}", os.path.basename(input_file))
+        name = self.label if self.label is not None else spec_name(self.csvspec, self.config_file)
+        if name is not None:
+            filename = filename.replace("{spec}", name)
+        return filename
+
+    def _once(self, key, func, *args):
+        """
+          func(*args), computed once per data file for the csv Specs validated together
+        """
+        if self.shared is None:
+            return func(*args)
+        if key not in self.shared:
+            self.shared[key] = func(*args)
+        return self.shared[key]
+
+    def _pipeline(self):
+        options = self.options
+        return Pipeline(options["read_block_kb"] * 1024, options["read_ahead_blocks"], options["parse_batch_rows"], PARSE_AHEAD_BATCHES)
+
+    def findings_file(self, input_file):
+        return self._named("findings_file", input_file)
+
+    def checkpoint_file(self, input_file):
+        return self._named("checkpoint_file", input_file)
+
+    def validate(self, input_file):
+        result, validation, singlepass = self.start(input_file)
+        while singlepass is not None:
+            try:
+                scan_passes([singlepass], input_file, self._pipeline())
+            except Exception as e:
+                singlepass = resume(validation, e)
+            else:
+                singlepass = resume(validation)
+        return result
+
+    def start(self, input_file):
+        """
+          Start the validation of a data file, returns the result dict, the validation and the first SinglePass it
+          needs fed with the rows of the data file (None if it is done), see resume
+        """
+        result = {"input": input_file, "spec": self.label, "returncode": 8, "recordcount": None, "compression": None, "report": []}
+        validation = self._validation(input_file, result)
+        return result, validation, resume(validation)
+
+    def _validation(self, input_file, result):
+        incremental = []
+        metrics = Metrics(input_file, self.label)
+        profile_file = self._named("profile_file", input_file)
+        try:
+            with contextlib.ExitStack() as stack:
+                if profile_file is not None:
+                    hot = stack.enter_context(profiled(profile_file))
+                try:
+                    result["returncode"] = yield from self._validate(input_file, result, incremental, metrics)
+                except DECOMPRESS_ERRORS as e:
+                    if result["compression"] is None:
+                        raise
+                    self._error(result, "Data file could not be decompressed: %s" % e)
+                    result["returncode"] = 8
+            if profile_file is not None:
+                self._info(result, "Profile written to %s, hot functions:" % profile_file)
+                for line in hot:
+                    self._info(result, line)
+
+            # the key index and the checkpoint are only moved forward by a successful run ###############################################
+            while len(incremental) > 0:
+                step = incremental.pop(0)
+                if result["returncode"] == 0:
+                    (returncode, report) = step.save()
+                    self._lines(result, returncode, report)
+                    result["returncode"] = returncode
+                else:
+                    step.discard()
+        finally:
+            # the steps left when the validation raised are discarded, their temporary files removed ##################################
+            for step in incremental:
+                step.discard()
+        metrics.returncode = result["returncode"]
+        result["metrics"] = metrics.summary()
+
+    def _validate(self, input_file, result, incremental, metrics):
+        csvspec = self.csvspec
+        options = self.options
+
+        self._info(result, "Start")
+        self._info(result, "OPTIONS.input_file : %s" % input_file)
+        if self.config_file is not None:
+            self._info(result, "OPTIONS.config_file: %s" % self.config_file)
+
+        # Check data file exists ########################################################################################################
+        if not os.path.isfile(input_file):
+            self._error(result, "Input file specified not found: %s" % input_file)
+            return 8
+
+        # Is the data file empty, is file allowed to be empty? ##########################################################################
+        # Note a subsequent check for empty file is also performed once we know if we are expecting a Header record or not.
+        with metrics.stage("empty_check"):
+            result["compression"] = compression(input_file)
+            if result["compression"] is not None:
+                self._info(result, "Data file is compressed: %s" % result["compression"])
+            if is_empty(input_file):
+                if csvspec["allow_empty"] == False:
+                    self._error(result, "Input file specified is empty: %s" % input_file)
+                    self._error(result, "allow_empty: %s" % str(csvspec["allow_empty"]))
+                    return 8
+                else:
+                    self._info(result, "Input file specified is empty: %s" % input_file)
+                    self._info(result, "allow_empty: %s" % str(csvspec["allow_empty"]))
+                    return 0
+            else:
+                self._info(result, "Input file specified is NOT empty: %s" % input_file)
+
+        # sniff data file for dialect ####################################################################################################
+        # When the csv Spec is trusted sniffing is skipped and the data file is only checked to decode with the declared encoding ######
+        with metrics.stage("sniff") as stage:
+            if options["trust_spec"]:
+                self._info(result, "Trusting csvspec dialect, sniffing skipped")
+                (returncode, report) = self._once(("verify_encoding", csvspec["dialect"]["encoding"]), verify_encoding, input_file, csvspec["dialect"]["encoding"])
+                self._lines(result, returncode, report)
+                if returncode != 0:
+                    self._error(result, "Data file does not match csvspec encoding")
+                    return returncode
+                self._info(result, "Encoding check OK")
+            else:
+                # read a bounded sample, the entire file if it is small, otherwise the head, middle and tail ############################
+                segments = self._once(("read_sample", options["sniff_bytes"]), read_sample, input_file, options["sniff_bytes"])
+                sample = b"".join(segments)
+                stage["bytes"] = len(sample)
+                self._info(result, "Sniffing " + str(len(sample)) + " bytes")
+
+                # sniff the encoding of the data file ###################################################################################
+                detected = self._once(("detect_encoding", options["sniff_bytes"]), detect_encoding, segments)
+                self._info(result, str(detected))
+
+                # sniff the data file to determine the csv dialect being used ###########################################################
+                try:
+                    sniffeddialect = self._once(("sniff_dialect", options["sniff_bytes"], csvspec["dialect"]["encoding"]), sniff_dialect, [segment.decode(csvspec["dialect"]["encoding"]) for segment in segments])
+                except Exception as e:
+                    self._error(result, "Error sniffing file for dialect: %s" % input_file)
+                    self._error(result, e)
+                    return 8
+                sniffeddialect["dialect"]["encoding"] = detected["encoding"]
+
+                # Compare sniffed dialect with the config file and look for unexpected mismatches #######################################
+                (returncode, report) = compare_dialect(csvspec["dialect"], sniffeddialect["dialect"])
+                self._lines(result, returncode, report)
+                if returncode != 0:
+                    self._error(result, "Difference detected in dialect csvspec vs sniffed")
+                    return returncode
+                self._info(result, "Dialect compare OK")
+
+        # If we got here proceed with using the config dialect by registering it for later use ##########################################
+        register_dialect(csvspec)
+
+        # Load domains read from files, from their cache when the file is unchanged #####################################################
+        with metrics.stage("domains"):
+            (returncode, report) = load_domains(csvspec)
+            self._lines(result, returncode, report)
+            if returncode != 0:
+                return returncode
+
+        # Check headers match ############################################################################################################
+        # this also has the effect of checking that all the expected columns exist/no more/no less #######################################
+        # if no headers are included in the file, then further data checks may fail if columns are not as expected #######################
+        # only the first record is read, a data file with the wrong header is rejected before it is read in full ##########################
+        with metrics.stage("headers"):
+            if csvspec["dialect"]["has_header"] == True:
+                (returncode, report) = compare_headers(csvspec, read_header(csvspec, input_file))
+                self._lines(result, returncode, report)
+                if returncode != 0:
+                    return returncode
+                self._info(result, "Headers compare OK")
+            else:
+                self._info(result, "Skipping header check, csvspec has_headers = " + str(csvspec["dialect"]["has_header"]))
+
+        # Read the data file once, all checks are performed in the same pass ############################################################
+        # The results are then evaluated in order: record count, uniqueness, domain and data ##########################################
+        # Findings are streamed to the findings file (if any) and the log as they happen, the log and report hold a capped number #####
+        # of messages. The "at row:" of the messages and the row of the findings are the record number (the header is record 1) ######
+        sinks = [ReportCollector(options["max_messages_per_column"], options["max_messages_per_check"])]
+        streamed = None
+        if self.log:
+            # the log is a consumer of the findings too, the messages the report keeps are logged as they happen ####################
+            streamed = LogSink(self._log_finding, options["max_messages_per_column"], options["max_messages_per_check"])
+            sinks.append(streamed)
+        findings_file = self.findings_file(input_file)
+        if findings_file is not None:
+            sinks.append(JsonLinesSink(findings_file))
+        # Rows may be split into accepted and rejected files as they are checked, the quarantine is told of each finding ###########
+        quarantine = None
+        accepted_file = self._named("accepted_file", input_file)
+        rejected_file = self._named("rejected_file", input_file)
+        if accepted_file is not None or rejected_file is not None:
+            if accepted_file is None or rejected_file is None:
+                self._error(result, "Quarantine needs both an accepted and a rejected file")
+                return 8
+            quarantine = Quarantine(csvspec, accepted_file, rejected_file)
+            sinks.append(quarantine)
+        if options["max_errors"] is not None or options["max_errors_per_check"] is not None:
+            # fail fast, kept last so the other sinks have the finding that reaches the limit
+            sinks.append(ErrorLimit(options["max_errors"], options["max_errors_per_check"]))
+        reporter = Reporter(sinks)
+
+        # Append only data files are resumed from their checkpoint, if it matches the data file ########################################
+        checkpoint_file = self.checkpoint_file(input_file)
+        if checkpoint_file is not None and result["compression"] is not None:
+            self._info(result, "Checkpoint not used, the data file is compressed")
+            checkpoint_file = None
+        checkpoint = None
+        if checkpoint_file is not None:
+            with metrics.stage("checkpoint") as stage:
+                (checkpoint, report) = load_checkpoint(checkpoint_file, csvspec, input_file)
+                self._lines(result, 0, report)
+                if checkpoint is not None:
+                    stage["bytes"] = checkpoint["offset"]
+
+        # Check a sample of the records first so a broken data file is rejected without reading all of it ##############################
+        if options["sample_rows"] and quarantine is not None:
+            self._info(result, "Sample test not used, the rows are quarantined")
+        elif options["sample_rows"] and checkpoint is not None:
+            # the records sampled would mostly be the records validated before the checkpoint
+            self._info(result, "Sample test not used, resuming from a checkpoint")
+        elif options["sample_rows"]:
+            with metrics.stage("sample") as stage:
+                (returncode, report) = sample_test(csvspec, input_file, options["sample_rows"], reporter)
+                self._lines(result, returncode, report, streamed)
+                if returncode != 0:
+                    reporter.close()
+                    metrics.add_findings(sinks[0], csvspec)
+                    self._error(result, "Failed sample test, the data file is not read in full")
+                    return returncode
+                self._info(result, "Sample test OK")
+        keyindex = None
+        if uses_key_index(csvspec):
+            if options["key_index"] is None:
+                self._info(result, "No key index given, unique_across_history and foreign keys are not checked")
+            else:
+                name = spec_name(csvspec, self.config_file)
+                if name is None:
+                    self._error(result, "The key index needs a csvspec name")
+                    return 8
+                try:
+                    keyindex = KeyIndexRun(options["key_index"], csvspec, name, os.path.abspath(input_file))
+                except ValueError as e:
+                    self._error(result, "Key index: %s" % e)
+                    return 8
+                # staged keys are added to the key index if the data file is accepted, before the checkpoint is saved
+                incremental.append(keyindex)
+                self._info(result, "Key index: %s, spec name: %s" % (options["key_index"], name))
+        # The typed columns are written to the export file only if the data file is accepted ##########################################
+        export = None
+        export_file = self._named("export_file", input_file)
+        if export_file is not None:
+            export = NpzExport(csvspec, export_file)
+            incremental.append(export)
+        check_timings = {} if options["time_checks"] else None
+        column_profile_file = self._named("column_profile_file", input_file)
+        profile = options["column_profile"] or column_profile_file is not None
+        pipeline = self._pipeline()
+        ranges = None
+        if checkpoint_file is None and options["workers"] > 1 and keyindex is None and quarantine is None and export is None:
+            # the range boundaries are found by a serial scan of the file before the workers start ###################################
+            with metrics.stage("split") as stage:
+                ranges = split_file(csvspec, input_file, options["workers"])
+                stage["bytes"] = os.stat(input_file).st_size
+        with metrics.stage("pass") as stage:
+            try:
+                if checkpoint_file is not None:
+                    # append only data files, only the records after the checkpoint are read ###########################################
+                    checkpointpass = CheckpointPass(csvspec, input_file, checkpoint_file, checkpoint, unique_memory_budget_mb=options["unique_memory_mb"], reporter=reporter, check_timings=check_timings, pipeline=pipeline, keyindex=keyindex, profile=profile, quarantine=quarantine, export=export, check_batch_rows=options["check_batch_rows"])
+                    incremental.append(checkpointpass)
+                    results = checkpointpass.run()
+                elif ranges is not None:
+                    results = parallel_pass_test(csvspec, input_file, options["workers"], unique_memory_budget_mb=options["unique_memory_mb"], reporter=reporter, check_timings=check_timings, pipeline=pipeline, profile=profile, check_batch_rows=options["check_batch_rows"], ranges=ranges)
+                else:
+                    # the rows are fed by the caller, see validate() and MultiValidator ###############################################
+                    singlepass = SinglePass(csvspec, options["unique_memory_mb"], reporter=reporter, check_timings=check_timings, keyindex=keyindex, profile=profile, quarantine=quarantine, export=export, check_batch_rows=options["check_batch_rows"], parsers=self.parsers)
+                    try:
+                        yield singlepass
+                        results = singlepass.results()
+                    finally:
+                        # the spilled uniqueness keys are removed if the pass did not complete
+                        singlepass.close()
+            finally:
+                reporter.close()
+            stage["rows"] = results["recordcount"]
+            stage["bytes"] = os.stat(input_file).st_size
+            metrics.add_findings(sinks[0], csvspec)
+            if check_timings is not None:
+                metrics.add_check_timings(check_timings, csvspec)
+
+        # The column profile is computed in the pass, it is written whether or not the data file is valid ############################
+        if results["profile"] is not None:
+            result["profile"] = dict(results["profile"], input=input_file, complete=results["stopped"] is None)
+            if column_profile_file is not None:
+                write_profile(column_profile_file, result["profile"])
+                self._info(result, "Column profile written to %s" % column_profile_file)
+
+        # Rows with findings are in the rejected file, within the maximum reject rate their findings do not fail the data file ######
+        tolerated = False
+        if quarantine is not None:
+            rate = quarantine.reject_rate()
+            self._info(result, "Quarantine: %d rows accepted to %s, %d rows rejected to %s, reject rate %.6f" % (quarantine.accepted_rows, accepted_file, len(quarantine.rejected_rows), rejected_file, rate))
+            if keyindex is not None:
+                keyindex.exclude(quarantine.rejected_rows)
+            if rate > options["max_reject_rate"]:
+                self._error(result, "Reject rate %.6f is above the maximum reject rate %s" % (rate, options["max_reject_rate"]))
+            else:
+                if export is not None:
+                    for row in quarantine.read_accepted():
+                        export.add(row)
+                tolerated = results["stopped"] is None and all(col["type"] in VALID_DATATYPES for col in csvspec["columns"])
+
+        def quarantined(stage):
+            return tolerated and sinks[0].count(stage) > 0
+
+        # Count records in file #########################################################################################################
+        recordcount = results["recordcount"]
+        result["recordcount"] = recordcount
+        if results["stopped"] is not None:
+            # fail fast, the results below cover the records read so far
+            self._error(result, "Validation stopped early: %s, last record read: %d" % (results["stopped"], recordcount))
+
+        # File may contain a header only and no data records which may/may not be a valid scenario based on config ######################
+        if (recordcount == 1 and csvspec["dialect"]["has_header"] == True and csvspec["allow_empty"] == False):
+            self._error(result, "An empty file has been detected where it is not allowed (Header exists)")
+            return 8
+
+        # For columns with uniqueness validation, check for duplicates ##################################################################
+        # Multi column/compound keys are compared as tuples of the key column values ###################################################
+        with metrics.stage("unique"):
+            if uniqueness_defined(csvspec):
+                returncode, report = results["unique"]
+                self._lines(result, returncode, report, streamed)
+                if returncode != 0 and not quarantined("unique"):
+                    self._error(result, "Failed Unique test")
+                    return returncode
+                self._info(result, "Unique test OK" if returncode == 0 else "Failed Unique test, the rows are quarantined")
+
+        # Domain checks #################################################################################################################
+        # Check specific columns contain only the allowed values ########################################################################
+        with metrics.stage("domain"):
+            returncode, report = results["domain"]
+            self._lines(result, returncode, report, streamed)
+            if returncode != 0 and not quarantined("domain"):
+                self._error(result, "Failed Domain test")
+                return returncode
+            self._info(result, "Domain test OK" if returncode == 0 else "Failed Domain test, the rows are quarantined")
+
+        # Data checks ###################################################################################################################
+        # Check data against expected data type, blanks, nulls, max values ##############################################################
+        with metrics.stage("data"):
+            returncode, report = results["data"]
+            self._lines(result, returncode, report, streamed)
+            if returncode != 0 and not quarantined("data"):
+                self._error(result, "Failed data_test test")
+                return returncode
+            self._info(result, "data_test test OK" if returncode == 0 else "Failed data_test test, the rows are quarantined")
+
+        if results["stopped"] is not None:
+            return 8
+
+        # If we got this far then we assume the file to be 'validated' against the specified config #####################################
+        return 0
+
+
+class MultiValidator:
+    """
+    Validate data files against several csv Specs, each data file is read once for the specs with the same dialect
+
+    configs is a list of (config_data, config_file). The specs are validated as by their Validator: the checks of each
+    spec run on the rows of the shared read, the date parsers of a format and the sniff and encoding checks are
+    shared, and so are the uniqueness keys of specs with the same key columns.
+    A data file read by a checkpoint or split over several workers is read for its spec on its own.
+    validate() returns a list of the Validator result dicts, one per spec in config order.
+    """
+
+    def __init__(self, configs, options=None, log=True):
+        self.configs = list(configs)
+        self.options = dict(DEFAULT_OPTIONS)
+        if options is not None:
+            self.options.update(options)
+        self.log = log
+        # cProfile can not be nested, the profile covers the validation of all the specs
+        spec_options = dict(self.options, profile_file=None)
+        self.validators = [Validator(config_data, spec_options, config_file, log) for config_data, config_file in self.configs]
+        self.parsers = {}
+        for i, validator in enumerate(self.validators):
+            validator.label = spec_name(validator.csvspec, validator.config_file) or "spec%d" % (i + 1)
+            validator.parsers = self.parsers
+
+    def validate(self, input_file):
+        profile_file = None
+        if self.options["profile_file"] is not None:
+            profile_file = self.options["profile_file"].replace("{name}", os.path.basename(input_file))
+        with contextlib.ExitStack() as stack:
+            if profile_file is not None:
+                hot = stack.enter_context(profiled(profile_file))
+            results = self._validate(input_file)
+        if profile_file is not None:
+            first = self.validators[0]
+            first._info(results[0], "Profile written to %s, hot functions:" % profile_file)
+            for line in hot:
+                first._info(results[0], line)
+        return results
+
+    def _validate(self, input_file):
+        shared = {}
+        results = []
+        validations = []
+        pending = []
+        try:
+            for validator in self.validators:
+                validator.shared = shared
+                result, validation, singlepass = validator.start(input_file)
+                results.append(result)
+                validations.append(validation)
+                if singlepass is not None:
+                    pending.append((validator, validation, singlepass))
+            while len(pending) > 0:
+                # the specs with the same dialect are fed from one read of the data file ########################################
+                groups = {}
+                for item in pending:
+                    groups.setdefault(json.dumps(item[0].csvspec["dialect"], sort_keys=True), []).append(item)
+                errors = {}
+                for group in groups.values():
+                    singlepasses = [singlepass for validator, validation, singlepass in group]
+                    share_keys(singlepasses)
+                    register_dialect(group[0][0].csvspec)
+                    try:
+                        scan_passes(singlepasses, input_file, group[0][0]._pipeline())
+                    except Exception as e:
+                        for validator, validation, singlepass in group:
+                            errors[validator] = e
+                following = []
+                for validator, validation, singlepass in pending:
+                    register_dialect(validator.csvspec)
+                    singlepass = resume(validation, errors.get(validator))
+                    if singlepass is not None:
+                        following.append((validator, validation, singlepass))
+                pending = following
+        finally:
+            # a validation that raised leaves the others unfinished, closing them discards their incremental steps
+            for validation in validations:
+                validation.close()
+            for validator in self.validators:
+                validator.shared = None
+        return results
+
+
+def share_keys(singlepasses):
+    """
+      The passes with the same uniqueness key columns share their keys, the keys of a row are added once
+    """
+    groups = {}
+    for singlepass in singlepasses:
+        if singlepass.check_unique:
+            groups.setdefault(tuple(singlepass.keypositions), []).append(singlepass)
+    for group in groups.values():
+        if len(group) > 1:
+            keys = SharedKeys(group[0].keys)
+            for singlepass in group:
+                singlepass.keys = keys
+
+
+# Batch mode workers, each worker process loads the csv Specs once and validates the data files it is given #########################
+_WORKER_VALIDATOR = None
+
+def _init_worker(configs, options):
+    global _WORKER_VALIDATOR
+    if len(configs) == 1:
+        config_data, config_file = configs[0]
+        _WORKER_VALIDATOR = Validator(config_data, options, config_file, log=False)
+    else:
+        _WORKER_VALIDATOR = MultiValidator(configs, options, log=False)
+
+def _validate_worker(input_file):
+    return _WORKER_VALIDATOR.validate(input_file)
+
+
+def expand_inputs(patterns):
+    """
+      The data files for the --input values, glob patterns are expanded (sorted), a pattern matching nothing is kept as is
+    """
+    inputs = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(f for f in glob.glob(pattern) if os.path.isfile(f))
+            if len(matches) > 0:
+                inputs.extend(matches)
+                continue
+        inputs.append(pattern)
+    return inputs
+
+
+def _results(result):
+    # a MultiValidator returns a result per spec
+    return result if isinstance(result, list) else [result]
+
+
+def validate_files(validator, inputs, batch_workers=1):
+    """
+      Validate each data file, yields the results in input order, one per csv Spec for a MultiValidator
+      With more than one batch worker the data files are spread over a pool of worker processes, each holding a Validator
+    """
+    if batch_workers <= 1 or len(inputs) <= 1:
+        for input_file in inputs:
+            yield from _results(validator.validate(input_file))
+        return
+    with ProcessPoolExecutor(max_workers=batch_workers, initializer=_init_worker, initargs=(validator.configs, validator.options)) as pool:
+        for results in pool.map(_validate_worker, inputs):
+            for result in _results(results):
+                for level, message in result["report"]:
+                    LOGGER.log(logging.getLevelName(level), message)
+                yield result
+
+
+def main():
+    # start here! parse command line options ########################################################################################
+    PARSER = argparse.ArgumentParser(description='Validate data file against the provided csv specification (config)')
+    PARSER.add_argument('--input', action="store", dest="input_files", nargs='+', required=True, help='CSV Input file path and filename, several files or glob patterns may be given')
+    PARSER.add_argument('--config', action="store", dest="config_files", nargs='+', required=True, help='Config file path and filename (csv spec), with several the data files are read once and validated against each')
+    PARSER.add_argument('--unique-memory-mb', action="store", dest="unique_memory_mb", type=float, default=None, help='Memory budget (MB) for uniqueness keys, beyond it keys are partitioned to temporary files')
+    PARSER.add_argument('--sniff-bytes', action="store", dest="sniff_bytes", type=int, default=DEFAULT_SNIFF_BYTES, help='Maximum bytes sampled from the data file to sniff the encoding and dialect')
+    PARSER.add_argument('--trust-spec', action="store_true", dest="trust_spec", help='Skip sniffing, only check the data file decodes with the csvspec encoding (a full scan of the data file)')
+    PARSER.add_argument('--workers', action="store", dest="workers", type=int, default=1, help='Number of worker processes, above 1 the data file is split into ranges checked in parallel')
+    PARSER.add_argument('--batch-workers', action="store", dest="batch_workers", type=int, default=1, help='Number of worker processes the data files are spread over when several are given')
+    PARSER.add_argument('--findings', action="store", dest="findings_file", default=None, help='Write every finding (row, column, check, value) to this file as json lines, {name} is replaced by the data file name')
+    PARSER.add_argument('--checkpoint', action="store", dest="checkpoint_file", default=None, help='Checkpoint file for append only data files, only records after the checkpoint are validated and a successful run moves it forward, {name} is replaced by the data file name')
+    PARSER.add_argument('--metrics-json', action="store", dest="metrics_json", default=None, help='Write the run metrics (stage timings, rows, bytes, peak memory, findings per column and check) to this file as json')
+    PARSER.add_argument('--metrics-prom', action="store", dest="metrics_prom", default=None, help='Write the run metrics to this file in the Prometheus text format, e.g. for the node exporter textfile collector')
+    PARSER.add_argument('--time-checks', action="store_true", dest="time_checks", help='Measure the time spent in each check of each column (adds overhead to every value checked)')
+    PARSER.add_argument('--profile', action="store", dest="profile_file", default=None, help='Profile the validation with cProfile, the stats are written to this file and the hot functions logged, {name} is replaced by the data file name')
+    PARSER.add_argument('--max-messages-per-column', action="store", dest="max_messages_per_column", type=int, default=DEFAULT_MAX_MESSAGES_PER_COLUMN, help='Maximum error messages logged per column, the rest are counted')
+    PARSER.add_argument('--max-messages-per-check', action="store", dest="max_messages_per_check", type=int, default=None, help='Maximum error messages logged per check, the rest are counted')
+    PARSER.add_argument('--max-errors', action="store", dest="max_errors", type=int, default=None, help='Fail fast: stop validating the data file after this many errors')
+    PARSER.add_argument('--max-errors-per-check', action="store", dest="max_errors_per_check", type=int, default=None, help='Fail fast: stop validating the data file after this many errors from one check')
+    PARSER.add_argument('--read-block-kb', action="store", dest="read_block_kb", type=int, default=READ_AHEAD_BLOCK_SIZE // 1024, help='Size (KB) of the blocks read ahead of the checks')
+    PARSER.add_argument('--read-ahead-blocks', action="store", dest="read_ahead_blocks", type=int, default=READ_AHEAD_BLOCKS, help='Number of blocks a reader thread reads ahead of the checks, 0 reads on the checking thread')
+    PARSER.add_argument('--parse-batch-rows', action="store", dest="parse_batch_rows", type=int, default=0, help='Parse the records on a thread and hand them to the checks in batches of this many rows, 0 parses on the checking thread')
+    PARSER.add_argument('--key-index', action="store", dest="key_index", default=None, help='SQLite key index of accepted data files for unique_across_history and foreign_key checks, the keys of an accepted data file are added to it')
+    PARSER.add_argument('--sample', action="store", dest="sample_rows", type=int, default=None, help='Before the full pass check the first N records and about N more from random places in the data file, the file is rejected if they fail')
+    PARSER.add_argument('--column-profile', action="store", dest="column_profile_file", default=None, help='Profile the columns in the same pass (nulls, blanks, min/max, lengths, approximate distinct count, top values) and write the profile to this json file, {name} is replaced by the data file name')
+    PARSER.add_argument('--accepted', action="store", dest="accepted_file", default=None, help='Quarantine: write the data rows without findings to this csv file, {name} is replaced by the data file name')
+    PARSER.add_argument('--rejected', action="store", dest="rejected_file", default=None, help='Quarantine: write the data rows with findings to this csv file with their row number and failed checks, {name} is replaced by the data file name')
+    PARSER.add_argument('--max-reject-rate', action="store", dest="max_reject_rate", type=float, default=0.0, help='Quarantine: the data file still passes if at most this fraction of its data rows is rejected (default 0)')
+    PARSER.add_argument('--export-npz', action="store", dest="export_file", default=None, help='Write the data rows of an accepted data file as typed columns to this NumPy .npz file, {name} is replaced by the data file name')
+    PARSER.add_argument('--check-batch-rows', action="store", dest="check_batch_rows", type=int, default=CHECK_BATCH_ROWS, help='Screen the values of the data checks in batches of this many rows with NumPy, only the rows that may fail are checked value by value, 0 checks every value (default %d, 0 without NumPy)' % CHECK_BATCH_ROWS)
+    OPTIONS = PARSER.parse_args()
+
+    # read config  ##################################################################################################################
+    # The config file is the csv Spec for the data file that will be 'validated'
+    # Must exist and must not be empty
+    configs = []
+    for config_file in OPTIONS.config_files:
+        if not os.path.exists(config_file):
+            print("Config file specified not found: %s" % config_file)
+            return 8
+
+        if os.stat(config_file).st_size == 0:
+            print("Config file specified is empty: %s" % config_file)
+            return 8
+
+        configs.append((load_config(config_file), config_file))
+
+    # Finalise logger setup, the log level is taken from the first config ###########################################################
+    loglevel = configs[0][0]["loglevel"]
+    LOGGER.setLevel(loglevel)
+
+    ch = logging.StreamHandler()
+    ch.setLevel(loglevel)
+    FORMATTER = MyFormatter(fmt='%(asctime)s %(levelname)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S.%f')
+    ch.setFormatter(FORMATTER)
+    LOGGER.addHandler(ch)
+
+    inputs = expand_inputs(OPTIONS.input_files)
+    for name in ("findings_file", "checkpoint_file", "profile_file", "column_profile_file", "accepted_file", "rejected_file", "export_file"):
+        if len(inputs) > 1 and getattr(OPTIONS, name) is not None and "{name}" not in getattr(OPTIONS, name):
+            LOGGER.error("Several data files given, the %s must contain {name}: %s", name.replace("_", " "), getattr(OPTIONS, name))
+            return 8
+    if len(configs) > 1:
+        names = [spec_name(config_data["csvspec"], config_file) for config_data, config_file in configs]
+        if len(set(names)) < len(names):
+            LOGGER.error("Several configs given, their csv Specs must have different names: %s", ", ".join(str(name) for name in names))
+            return 8
+        for name in ("findings_file", "checkpoint_file", "column_profile_file", "accepted_file", "rejected_file", "export_file"):
+            if getattr(OPTIONS, name) is not None and "{spec}" not in getattr(OPTIONS, name):
+                LOGGER.error("Several configs given, the %s must contain {spec}: %s", name.replace("_", " "), getattr(OPTIONS, name))
+                return 8
+
+    # options without a command line flag (column_profile, used by daemon_this.py) keep their default
+    options = {name: getattr(OPTIONS, name, DEFAULT_OPTIONS[name]) for name in DEFAULT_OPTIONS}
+    if OPTIONS.batch_workers > 1 and len(inputs) > 1:
+        # worker processes of the batch pool do not split their data files again
+        options["workers"] = 1
+    log = OPTIONS.batch_workers <= 1 or len(inputs) <= 1
+    if len(configs) == 1:
+        validator = Validator(configs[0][0], options, configs[0][1], log=log)
+    else:
+        validator = MultiValidator(configs, options, log=log)
+
+    # Validate each data file, in batch mode each file's exit status is reported ####################################################
+    returncode = 0
+    failed = 0
+    summaries = []
+    for result in validate_files(validator, inputs, OPTIONS.batch_workers):
+        returncode = max(returncode, result["returncode"])
+        summaries.append(result["metrics"])
+        if len(inputs) > 1 or len(configs) > 1:
+            if result["spec"] is None:
+                LOGGER.info("Exit status %d: %s", result["returncode"], result["input"])
+            else:
+                LOGGER.info("Exit status %d: %s, spec %s", result["returncode"], result["input"], result["spec"])
+            if result["returncode"] != 0:
+                failed = failed + 1
+    if len(configs) > 1:
+        LOGGER.info("Validated %d data files against %d specs, %d failed", len(inputs), len(configs), failed)
+    elif len(inputs) > 1:
+        LOGGER.info("Validated %d data files, %d failed", len(inputs), failed)
+
+    # Run metrics #####################################################################################################################
+    if OPTIONS.metrics_json is not None:
+        write_json(OPTIONS.metrics_json, summaries)
+    if OPTIONS.metrics_prom is not None:
+        write_prometheus(OPTIONS.metrics_prom, summaries)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the batch screens of the data checks, an optional backend using NumPy
+
+The data rows are checked in batches of CHECK_BATCH_ROWS. For each column the values of a batch are screened at
+once: the numbers are converted into an array and the integrality, max_value, min_value, max_len, blank and null
+checks are done as array operations. Only the rows the screen finds may fail are then run through the checks of the
+ColumnPlan, so the findings, their messages and their order are the same as checking every value. A column whose
+checks are not screened (date, time and timestamp types, max_value and min_value of strings) is checked value by
+value, as is every column when NumPy is not installed.
+
+The numbers are converted with float(), as the datatype checks do, numpy's own string conversion differs (trailing
+NUL characters are dropped).
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHECK_BATCH_ROWS = 1024 if numpy is not None else 0
+SCREENED_CHECKS = ("integer", "float", "null", "blank", "max_len", "max_value", "min_value")
+
+
+def batch_available():
+    """
+      True if the batch screens can be used, NumPy is installed
+    """
+    return numpy is not None
+
+
+def _floats(values):
+    """
+      The values as an array of floats, and a mask of the values that are not numbers (None if they all are)
+    """
+    try:
+        return numpy.fromiter(map(float, values), numpy.float64, len(values)), None
+    except ValueError:
+        pass
+    numbers = numpy.empty(len(values), dtype=numpy.float64)
+    failed = numpy.zeros(len(values), dtype=bool)
+    for j, value in enumerate(values):
+        try:
+            numbers[j] = float(value)
+        except ValueError:
+            numbers[j] = numpy.nan
+            failed[j] = True
+    return numbers, failed
+
+
+def column_screen(plan):
+    """
+      The screen of a ColumnPlan: screen(values) returns the set of the offsets of the values that may fail one of
+      the checks of the column
+      None if NumPy is not installed or the column has a check that is not screened
+    """
+    if numpy is None:
+        return None
+    names = set(check_name for check_name, check in plan.checks)
+    if len(names) == 0 or not names.issubset(SCREENED_CHECKS):
+        return None
+    numeric = plan.type in ("integer", "float")
+    if not numeric and ("max_value" in names or "min_value" in names):
+        return None
+    if isinstance(plan.max_value, str) or isinstance(plan.min_value, str):
+        # the limit is not a number, the values are compared as strings
+        return None
+    col = plan.col
+    null_value = col.get("null_value") if "null" in names else None
+    blank = "blank" in names
+    max_len = col.get("max_len") if "max_len" in names else None
+    integer = plan.type == "integer"
+    max_value = plan.max_value
+    min_value = plan.min_value
+
+    def screen(values):
+        suspect = numpy.zeros(len(values), dtype=bool)
+        if blank or null_value is not None:
+            objects = numpy.array(values, dtype=object)
+            if blank:
+                suspect |= objects == ""
+            if null_value is not None:
+                suspect |= objects == null_value
+        if max_len is not None:
+            suspect |= numpy.fromiter(map(len, values), numpy.int64, len(values)) > max_len
+        if numeric:
+            numbers, failed = _floats(values)
+            if failed is not None:
+                suspect |= failed
+            if integer:
+                suspect |= ~(numpy.isfinite(numbers) & (numbers == numpy.floor(numbers)))
+            if max_value is not None:
+                suspect |= numbers > max_value
+            if min_value is not None:
+                suspect |= numbers < min_value
+        return set(numpy.flatnonzero(suspect).tolist())
+    return screen
@@ -0,0 +1,199 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the incremental validation of data files that are only ever appended to
+
+After a successful run a checkpoint is saved: a json file holding the byte offset and record count validated,
+the header, a fingerprint of the validated prefix and the csv Spec, plus a sidecar file (checkpoint + ".keys")
+with the digests of the uniqueness keys. The next run checks the fingerprint and, if the prefix is unchanged,
+only reads the bytes after the offset, continuing the row numbers and the uniqueness keys of the prefix.
+
+The fingerprint hashes sampled blocks of the prefix (head, tail and evenly spaced blocks) so it costs the
+same whatever the size of the file. It detects truncation and rewrites, not every edit inside the prefix.
+A checkpoint is only saved when the data file ends with a line terminator, so the last record is complete.
+"""
+import hashlib
+import json
+import os
+
+from validate_this_batch import CHECK_BATCH_ROWS
+from validate_this_domains import cache_prefix
+from validate_this_domains import has_domain
+from validate_this_functions import SinglePass
+from validate_this_input import DEFAULT_PIPELINE
+from validate_this_input import MappedFile
+from validate_this_input import parsed_rows
+from validate_this_records import open_range
+from validate_this_unique import DIGEST_SIZE
+from validate_this_unique import UniqueKeys
+from validate_this_unique import load_digests
+
+CHECKPOINT_VERSION = 1
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+FINGERPRINT_SAMPLES = 16
+FINGERPRINT_SAMPLE_SIZE = 4 * 1024
+
+
+def spec_digest(csvspec):
+    """
+      Digest of the csv Spec, a checkpoint is only used with the spec it was saved with
+      Domains read from files are included by their cache prefix, which changes when the file does
+    """
+    domains = [cache_prefix(col) for col in csvspec["columns"] if has_domain(col) and "domain" not in col]
+    return hashlib.blake2b(json.dumps([csvspec, domains], sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def prefix_fingerprint(filename, length):
+    """
+      Digest of sampled blocks of the first length bytes of the data file: the first and last blocks and
+      FINGERPRINT_SAMPLES blocks evenly spaced between them
+    """
+    fingerprint = hashlib.blake2b(str(length).encode("ascii"), digest_size=16)
+    offsets = [(0, FINGERPRINT_BLOCK_SIZE), (max(0, length - FINGERPRINT_BLOCK_SIZE), FINGERPRINT_BLOCK_SIZE)]
+    for i in range(1, FINGERPRINT_SAMPLES + 1):
+        offsets.append((length * i // (FINGERPRINT_SAMPLES + 1), FINGERPRINT_SAMPLE_SIZE))
+    with MappedFile(filename) as data:
+        for offset, size in offsets:
+            fingerprint.update(data.view(offset, offset + min(size, length - offset)))
+    return fingerprint.hexdigest()
+
+
+def _ends_with_newline(filename, size):
+    if size == 0:
+        return False
+    with MappedFile(filename) as data:
+        return data.view(size - 1, size) == b"\n"
+
+
+def load_checkpoint(checkpoint_file, csvspec, filename):
+    """
+      Read the checkpoint for the data file
+      Returns (checkpoint, arrStrings), checkpoint is None when there is none or it does not match the data file
+    """
+    arrStrings = []
+    if not os.path.exists(checkpoint_file):
+        arrStrings.append("No checkpoint found: " + checkpoint_file)
+        return None, arrStrings
+    try:
+        with open(checkpoint_file, "r") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        arrStrings.append("Checkpoint not readable, ignored: " + str(e))
+        return None, arrStrings
+
+    size = os.stat(filename).st_size
+    reason = None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        reason = "version " + str(checkpoint.get("version"))
+    elif checkpoint["spec"] != spec_digest(csvspec):
+        reason = "csvspec has changed"
+    elif size < checkpoint["offset"]:
+        reason = "data file is shorter than the checkpoint offset " + str(checkpoint["offset"])
+    elif prefix_fingerprint(filename, checkpoint["offset"]) != checkpoint["fingerprint"]:
+        reason = "data file does not match the checkpoint fingerprint"
+    elif checkpoint["keys"] is not None:
+        keys_file = checkpoint_file + ".keys"
+        if (not os.path.exists(keys_file) or os.stat(keys_file).st_size != checkpoint["keys"]["size"]
+                or checkpoint["keys"]["size"] != checkpoint["keys"]["count"] * DIGEST_SIZE):
+            reason = "uniqueness keys file missing or changed: " + keys_file
+    if reason is not None:
+        arrStrings.append("Checkpoint ignored, " + reason)
+        return None, arrStrings
+    arrStrings.append("Resuming from checkpoint at offset " + str(checkpoint["offset"]) + ", records validated: " + str(checkpoint["recordcount"]))
+    return checkpoint, arrStrings
+
+
+class CheckpointPass:
+    """
+    Single pass checks over the data file, starting after the checkpoint if there is one
+    run() returns the dict of results described in SinglePass.results(), save() then records the new checkpoint
+    A profile covers the records read by run(), those after the checkpoint
+    With a quarantine the saved uniqueness keys are those of the checkpoint and of the accepted rows, the rows
+    rejected do not add their keys (as KeyIndexRun.exclude)
+    """
+
+    def __init__(self, csvspec, filename, checkpoint_file, checkpoint=None, unique_memory_budget_mb=None, reporter=None, check_timings=None, pipeline=DEFAULT_PIPELINE, keyindex=None, profile=False, quarantine=None, export=None, check_batch_rows=CHECK_BATCH_ROWS):
+        self.csvspec = csvspec
+        self.pipeline = pipeline
+        self.filename = filename
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint = checkpoint
+        self.unique_memory_budget_mb = unique_memory_budget_mb
+        self.quarantine = quarantine
+        self.size = os.stat(filename).st_size
+        self.offset = 0
+        rowcounter = 0
+        if checkpoint is not None:
+            self.offset = checkpoint["offset"]
+            rowcounter = checkpoint["recordcount"]
+        self.singlepass = SinglePass(csvspec, unique_memory_budget_mb, rowcounter=rowcounter, reporter=reporter, check_timings=check_timings, keyindex=keyindex, profile=profile, quarantine=quarantine, export=export, check_batch_rows=check_batch_rows)
+        if checkpoint is not None:
+            self.singlepass.headers = checkpoint["headers"]
+            if self.singlepass.check_unique:
+                self.singlepass.keys.seed(load_digests(checkpoint_file + ".keys"))
+        self.keys_count = None
+
+    def run(self):
+        singlepass = self.singlepass
+        with open_range(self.filename, self.offset, self.size, self.csvspec["dialect"]["encoding"], self.pipeline) as csvfile, parsed_rows(csvfile, self.pipeline) as rows:
+            singlepass.add_rows(rows)
+        if singlepass.check_unique and self.quarantine is None:
+            # the keys are written before results() completes the duplicate search, they are only kept by save()
+            self.keys_count = singlepass.keys.save(self.checkpoint_file + ".keys.tmp")
+        return singlepass.results()
+
+    def _save_accepted_keys(self, filename):
+        """
+          Write the digests of the keys of the checkpoint and of the rows in the closed accepted file, returns the
+          number of digests written
+        """
+        keys = UniqueKeys(self.unique_memory_budget_mb)
+        try:
+            if self.checkpoint is not None and self.checkpoint["keys"] is not None:
+                keys.seed(load_digests(self.checkpoint_file + ".keys"))
+            keypositions = self.singlepass.keypositions
+            for rownumber, row in enumerate(self.quarantine.read_accepted(), 1):
+                keys.add(tuple([row[k] for k in keypositions]), rownumber)
+            return keys.save(filename)
+        finally:
+            keys.close()
+
+    def save(self):
+        """
+          Record the checkpoint after a successful run, returns (rc, arrStrings)
+        """
+        arrStrings = []
+        keys_tmp = self.checkpoint_file + ".keys.tmp"
+        if not _ends_with_newline(self.filename, self.size):
+            arrStrings.append("Checkpoint not saved, the data file does not end with a line terminator")
+            self.discard()
+            return 0, arrStrings
+        keys = None
+        if self.singlepass.check_unique and self.quarantine is not None:
+            self.keys_count = self._save_accepted_keys(keys_tmp)
+        if self.keys_count is not None:
+            keys = {"count": self.keys_count, "size": os.stat(keys_tmp).st_size}
+            os.replace(keys_tmp, self.checkpoint_file + ".keys")
+        checkpoint = {"version": CHECKPOINT_VERSION
+                     ,"spec": spec_digest(self.csvspec)
+                     ,"offset": self.size
+                     ,"recordcount": self.singlepass.rowcounter
+                     ,"headers": self.singlepass.headers
+                     ,"fingerprint": prefix_fingerprint(self.filename, self.size)
+                     ,"keys": keys
+                     }
+        tmp = self.checkpoint_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, self.checkpoint_file)
+        arrStrings.append("Checkpoint saved at offset " + str(self.size) + ", records validated: " + str(self.singlepass.rowcounter))
+        return 0, arrStrings
+
+    def discard(self):
+        """
+          Remove the files of a checkpoint that is not saved (the run failed)
+        """
+        self.singlepass.close()
+        keys_tmp = self.checkpoint_file + ".keys.tmp"
+        if os.path.exists(keys_tmp):
+            os.remove(keys_tmp)
@@ -0,0 +1,174 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the date, time and timestamp parsing used by the datatype checks in validate_this_functions.py
+
+Each strptime format in the csv Spec is compiled once into a regular expression built the same way
+datetime.strptime builds its own, followed by the same range checks (the value must make a valid datetime).
+Formats using directives that depend on the locale or need more than range checks fall back to strptime.
+Results are memoized per column since date columns tend to repeat the same values.
+
+Run this module directly to check the compiled parsers against strptime over a test corpus:
+    python3 validate_this_dates.py
+"""
+import datetime
+import functools
+import re
+import sys
+
+DEFAULT_CACHE_SIZE = 4096
+
+# The same patterns datetime.strptime uses for these directives (see _strptime.TimeRE)
+_DIRECTIVES = {
+    'd': r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+    'f': r"(?P<f>[0-9]{1,6})",
+    'H': r"(?P<H>2[0-3]|[0-1]\d|\d)",
+    'm': r"(?P<m>1[0-2]|0[1-9]|[1-9])",
+    'M': r"(?P<M>[0-5]\d|\d)",
+    'S': r"(?P<S>6[0-1]|[0-5]\d|\d)",
+    'y': r"(?P<y>\d\d)",
+    'Y': r"(?P<Y>\d\d\d\d)",
+    '%': '%',
+}
+
+_REGEX_CHARS = re.compile(r"([\\.^$*+?\(\){}\[\]|])")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def format_regex(datetime_format):
+    """
+      Return the compiled regular expression for a strptime format, None if the format uses a directive
+      that is not supported here (or repeats one) and strptime must be used instead
+    """
+    processed_format = ''
+    datetime_format = _REGEX_CHARS.sub(r"\\\1", datetime_format)
+    datetime_format = _WHITESPACE.sub(r'\\s+', datetime_format)
+    while '%' in datetime_format:
+        directive_index = datetime_format.index('%') + 1
+        if directive_index >= len(datetime_format) or datetime_format[directive_index] not in _DIRECTIVES:
+            return None
+        processed_format = processed_format + datetime_format[:directive_index - 1] + _DIRECTIVES[datetime_format[directive_index]]
+        datetime_format = datetime_format[directive_index + 1:]
+    try:
+        return re.compile(processed_format + datetime_format, re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def _regex_parser(regex):
+    """
+      Return a parser using the compiled format regex, converting the groups as strptime does
+    """
+    match = regex.match
+    datetime_type = datetime.datetime
+
+    def parse(text):
+        found = match(text)
+        if found is None or found.end() != len(text):
+            return None
+        year = 1900
+        month = day = 1
+        hour = minute = second = fraction = 0
+        for directive, value in found.groupdict().items():
+            if directive == 'Y':
+                year = int(value)
+            elif directive == 'y':
+                year = int(value)
+                if year <= 68:
+                    year = year + 2000
+                else:
+                    year = year + 1900
+            elif directive == 'm':
+                month = int(value)
+            elif directive == 'd':
+                day = int(value)
+            elif directive == 'H':
+                hour = int(value)
+            elif directive == 'M':
+                minute = int(value)
+            elif directive == 'S':
+                second = int(value)
+            elif directive == 'f':
+                fraction = int(value + "0" * (6 - len(value)))
+        try:
+            return datetime_type(year, month, day, hour, minute, second, fraction)
+        except ValueError:
+            return None
+    return parse
+
+
+def _strptime_parser(datetime_format):
+    strptime = datetime.datetime.strptime
+
+    def parse(text):
+        try:
+            return strptime(text, datetime_format)
+        except ValueError:
+            return None
+    return parse
+
+
+def datetime_parser(datetime_format, cache_size=DEFAULT_CACHE_SIZE):
+    """
+      Return a function parsing a string with the strptime format, returning the datetime or None if it does not match
+      The results of the last cache_size distinct values are kept, 0 disables the cache
+    """
+    regex = format_regex(datetime_format)
+    if regex is None:
+        parse = _strptime_parser(datetime_format)
+    else:
+        parse = _regex_parser(regex)
+    if cache_size:
+        parse = functools.lru_cache(maxsize=cache_size)(parse)
+    return parse
+
+
+@functools.lru_cache(maxsize=256)
+def shared_parser(datetime_format):
+    """
+      A parser per format shared by callers that do not hold their own, e.g. is_date
+    """
+    return datetime_parser(datetime_format)
+
+
+def _corpus():
+    """
+      Formats and values checked against strptime, including the formats in the sample csv Specs
+    """
+    formats = ["%d-%m-%Y", "%H:%M:%S", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d", "%Y%m%d", "%d/%m/%y", "%m/%d/%Y",
+               "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d %H:%M:%S.%f", "%H%M%S", "%d-%m", "%y", "%Y.%m.%d",
+               "%d %m %Y", "%Y-%m-%d  %H:%M", "[%Y]", "%%%Y", "%H:%M"]
+    values = ["1-1-2000", "01-01-2000", "02-02-2000", "29-02-2000", "29-02-2001", "29-02-1900", "31-04-2000",
+              "31-12-2000", "32-12-2000", "00-12-2000", "1-13-2000", " 1-1-2000", "1-1-2000 ", "1-1-20", "1-1-20000",
+              "6:15:10", "06:15:10", "16:5:10", "16:15:0", "24:00:00", "23:59:59", "23:60:00", "23:59:60", "23:59:61",
+              "31-12-2000 16:15:10", "31-12-2000  16:15:10", "31-12-2000\t16:15:10", "31-12-200016:15:10",
+              "2000-12-31", "2000-2-3", "20001231", "2000131", "31/12/00", "31/12/68", "31/12/69", "29/02/00",
+              "12/31/2000", "2000-12-31T16:15:10.5", "2000-12-31t16:15:10.123456", "2000-12-31T16:15:10.1234567",
+              "2000-12-31 16:15:10.000001", "161510", "61510", "29-02", "28-02", "00", "99", "2000.12.31",
+              "2000x12x31", "31 12 2000", "31  12   2000", "2000-12-31  16:15", "2000-12-31 16:15", "[2000]",
+              "%2000", "2000", "", " ", "abc", "٢٠٠٠-01-01", "12:3", "1:2", "1-1-2000x"]
+    return formats, values
+
+
+def check_corpus():
+    """
+      Compare the compiled parsers with strptime over the test corpus, returns the list of mismatches
+    """
+    formats, values = _corpus()
+    mismatches = []
+    for datetime_format in formats:
+        fast = datetime_parser(datetime_format, cache_size=0)
+        slow = _strptime_parser(datetime_format)
+        for value in values:
+            if fast(value) != slow(value):
+                mismatches.append((datetime_format, value, fast(value), slow(value)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    MISMATCHES = check_corpus()
+    for mismatch in MISMATCHES:
+        print("MISMATCH format %r value %r compiled %r strptime %r" % mismatch)
+    FORMATS, VALUES = _corpus()
+    print("Checked %d formats against %d values, %d mismatches" % (len(FORMATS), len(VALUES), len(MISMATCHES)))
+    sys.exit(8 if len(MISMATCHES) > 0 else 0)
@@ -0,0 +1,275 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the domains (allowed values) of the domain checks in validate_this_functions.py
+
+A column's domain is given in the csv Spec as one of:
+    "domain"      : ["fred", "wilma", "barney"]                              the values inline
+    "domain_file" : "postcodes.txt"                                           one value per line
+    "domain_csv"  : {"file": "countries.csv", "column": "2-alpha code"}       a column of another csv file
+                    optional keys: "encoding" (default utf-8-sig), "delimiter" (default ,), "has_header" (default true),
+                    column is a column name or, without a header, a position
+
+Domains are compiled to frozensets. Domains from files are read once into a compact cache: the sorted distinct
+values (.values), their offsets (.index) and a Bloom filter (.bloom), in the directory CSVVALIDATOR_DOMAIN_CACHE
+(default: the temp directory). The cache is keyed by the source's path, size and modification time so it is
+rebuilt when the source changes. The domains compiled by this process are kept by source, at most
+LOADED_DOMAINS of them, and replaced when their source changes.
+
+Very large domains can set "domain_lookup": "disk" to stay out of memory: the Bloom filter rejects values that
+are not in the domain and other values are found by binary search of the memory mapped cache files.
+"""
+import array
+import collections
+import csv
+import functools
+import hashlib
+import json
+import math
+import mmap
+import os
+import tempfile
+
+from validate_this_input import open_text
+
+DOMAIN_KEYS = ("domain", "domain_file", "domain_csv")
+CACHE_ENV = "CSVVALIDATOR_DOMAIN_CACHE"
+CACHE_VERSION = 1
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+LOOKUP_CACHE_SIZE = 65536
+LOADED_DOMAINS = 64
+
+# domains already loaded by this process, (source, disk) -> (cache file prefix, domain), least recently used first
+_LOADED = collections.OrderedDict()
+
+
+def has_domain(col):
+    return any(key in col for key in DOMAIN_KEYS)
+
+
+def describe_domain(col):
+    """
+      The domain as shown in the report, the values for inline domains, the source otherwise
+    """
+    if "domain" in col:
+        return str(col["domain"])
+    if "domain_file" in col:
+        return "domain_file: " + str(col["domain_file"])
+    return "domain_csv: " + str(col["domain_csv"]["file"]) + " column: " + str(col["domain_csv"]["column"])
+
+
+def cache_dir():
+    return os.environ.get(CACHE_ENV) or os.path.join(tempfile.gettempdir(), "csvvalidator_domains")
+
+
+def _source_file(col):
+    if "domain_file" in col:
+        return col["domain_file"]
+    return col["domain_csv"]["file"]
+
+
+def _source_key(col):
+    """
+      The key of a column's domain source in _LOADED, the same whether or not the source file has changed
+    """
+    return (os.path.abspath(_source_file(col)), json.dumps(col.get("domain_csv"), sort_keys=True))
+
+
+def cache_prefix(col):
+    """
+      The cache file prefix for a column's domain source, changes when the source file does
+    """
+    filename = _source_file(col)
+    st = os.stat(filename)
+    source = {"version": CACHE_VERSION, "file": os.path.abspath(filename), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+              "domain_csv": col.get("domain_csv")}
+    digest = hashlib.blake2b(json.dumps(source, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(cache_dir(), "domain_" + digest)
+
+
+def _read_source(col):
+    """
+      The values of a domain_file or domain_csv source
+    """
+    if "domain_file" in col:
+        with open_text(col["domain_file"], "utf-8-sig", newline=None) as f:
+            for line in f:
+                value = line.rstrip("\n")
+                if value != "":
+                    yield value
+        return
+    source = col["domain_csv"]
+    has_header = source.get("has_header", True) == True
+    with open_text(source["file"], source.get("encoding", "utf-8-sig")) as f:
+        reader = csv.reader(f, delimiter=source.get("delimiter", ","))
+        position = source["column"]
+        if has_header:
+            header = next(reader, [])
+            if position not in header:
+                raise ValueError("domain_csv column not found in the header of " + str(source["file"]) + ": " + str(position))
+            position = header.index(position)
+        position = int(position)
+        for row in reader:
+            if position < len(row):
+                yield row[position]
+
+
+def _bloom_size(count):
+    bits = max(64, int(math.ceil(-count * math.log(BLOOM_FALSE_POSITIVE_RATE) / (math.log(2) ** 2))))
+    hashes = max(1, int(round(bits / max(count, 1) * math.log(2))))
+    return bits, hashes
+
+
+def _bloom_positions(value, bits, hashes):
+    digest = hashlib.blake2b(value, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def build_cache(col, prefix):
+    """
+      Write the cache files of a domain source: the sorted distinct values, their offsets and the Bloom filter
+    """
+    values = sorted(set(value.encode("utf-8", "surrogatepass") for value in _read_source(col)))
+    offsets = array.array("Q", [0])
+    bits, hashes = _bloom_size(len(values))
+    bloom = bytearray((bits + 7) // 8)
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+        for position in _bloom_positions(value, bits, hashes):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    # each file is written to a temporary name and renamed, the index last as it marks the cache complete
+    for suffix, data in ((".values", values), (".bloom", [json.dumps({"bits": bits, "hashes": hashes}).encode("ascii") + b"\n", bytes(bloom)]),
+                         (".index", [offsets.tobytes()])):
+        tmp = prefix + suffix + ".tmp%d" % os.getpid()
+        with open(tmp, "wb") as f:
+            for chunk in data:
+                f.write(chunk)
+        os.replace(tmp, prefix + suffix)
+    return len(values)
+
+
+def _load_index(prefix):
+    index = array.array("Q")
+    with open(prefix + ".index", "rb") as f:
+        index.frombytes(f.read())
+    return index
+
+
+def load_values(prefix):
+    """
+      The values of a cached domain
+    """
+    index = _load_index(prefix)
+    with open(prefix + ".values", "rb") as f:
+        data = f.read()
+    return [data[index[i]:index[i + 1]].decode("utf-8", "surrogatepass") for i in range(len(index) - 1)]
+
+
+class DiskDomain:
+    """
+    Membership test of a cached domain without loading it into memory
+    The Bloom filter rejects most values outside the domain, other values are found by binary search of the
+    memory mapped sorted values. The results for recent values are kept.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        with open(prefix + ".bloom", "rb") as f:
+            header = json.loads(f.readline().decode("ascii"))
+            self.bloom = f.read()
+        self.bits = header["bits"]
+        self.hashes = header["hashes"]
+        self.index = _load_index(prefix)
+        self.count = len(self.index) - 1
+        self._file = open(prefix + ".values", "rb")
+        if self.index[-1] > 0:
+            self.values = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.values = b""
+        self.lookup = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._lookup)
+
+    def _search(self, value):
+        index = self.index
+        values = self.values
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            found = values[index[middle]:index[middle + 1]]
+            if found < value:
+                low = middle + 1
+            elif found > value:
+                high = middle
+            else:
+                return True
+        return False
+
+    def _lookup(self, value):
+        encoded = value.encode("utf-8", "surrogatepass")
+        bloom = self.bloom
+        for position in _bloom_positions(encoded, self.bits, self.hashes):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return self._search(encoded)
+
+    def __contains__(self, value):
+        if not isinstance(value, str):
+            return False
+        return self.lookup(value)
+
+    def __len__(self):
+        return self.count
+
+
+def compile_domain(col):
+    """
+      The domain of a column as a container for 'in' tests, None if the column has no domain
+      Domains from files are taken from the cache, which is built if the source has changed
+    """
+    if "domain" in col:
+        return frozenset(col["domain"])
+    if not has_domain(col):
+        return None
+    prefix = cache_prefix(col)
+    key = (_source_key(col), col.get("domain_lookup") == "disk")
+    loaded = _LOADED.get(key)
+    if loaded is not None and loaded[0] == prefix:
+        _LOADED.move_to_end(key)
+        return loaded[1]
+    if not os.path.exists(prefix + ".index"):
+        build_cache(col, prefix)
+    if key[1]:
+        domain = DiskDomain(prefix)
+    else:
+        domain = frozenset(load_values(prefix))
+    # a domain of the source before it changed is replaced
+    _LOADED[key] = (prefix, domain)
+    _LOADED.move_to_end(key)
+    while len(_LOADED) > LOADED_DOMAINS:
+        _LOADED.popitem(last=False)
+    return domain
+
+
+def load_domains(csvspec):
+    """
+      Compile the domains of the csv Spec ahead of the checks, building any caches needed
+      Returns (rc, arrStrings), rc 8 if a domain source cannot be read
+    """
+    rc = 0
+    arrStrings = []
+    for col in csvspec["columns"]:
+        if not has_domain(col) or "domain" in col:
+            continue
+        try:
+            domain = compile_domain(col)
+        except (OSError, ValueError, UnicodeDecodeError, csv.Error) as e:
+            arrStrings.append("ERROR Domain for column " + str(col["name"]) + " could not be loaded: " + str(e))
+            rc = 8
+            continue
+        mode = "disk lookup" if isinstance(domain, DiskDomain) else "in memory"
+        arrStrings.append("Domain for column " + str(col["name"]) + " loaded (" + describe_domain(col) + "): " + str(len(domain)) + " values, " + mode)
+    return rc, arrStrings
@@ -0,0 +1,242 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the export of the data rows as typed columns in a NumPy .npz file, written in the same pass as
+the checks
+
+Each column of the csv Spec becomes an array typed by its type, and a boolean array <name>.valid that is False where
+the value is blank, null or not of the type:
+    integer   : int64 (0 where not valid, e.g. out of the int64 range)
+    float     : float64 (NaN where not valid)
+    date      : datetime64[D] (NaT where not valid)
+    time      : timedelta64[us] since midnight (NaT where not valid)
+    timestamp : datetime64[us], values with a UTC offset are converted to UTC (NaT where not valid)
+    string    : fixed width unicode, as wide as the longest value
+
+Values are parsed with the parse functions of the compiled column plans of the pass, so a date column shares the
+cache of its date parser with the datatype check. Rows are converted in chunks of EXPORT_CHUNK_ROWS and appended to a
+temporary file per column, so memory stays bounded. The .npz file is only assembled when the data file is accepted
+(save()), a rejected data file leaves no export (discard()). The .npy format is written directly (version 1.0), numpy
+is not needed to write it, numpy.load reads it.
+"""
+import array
+import datetime
+import operator
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+EXPORT_CHUNK_ROWS = 65536
+COPY_BUFFER = 1024 * 1024
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_NAT = _INT64_MIN
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# (array typecode, npy descr) of the types stored as 8 byte numbers
+_NUMERIC = {"integer": ("q", "<i8")
+           ,"float"  : ("d", "<f8")
+           ,"date"   : ("q", "<M8[D]")
+           ,"time"   : ("q", "<m8[us]")
+           ,"timestamp": ("q", "<M8[us]")
+           }
+
+
+def _naive_utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _to_integer(value, parsed):
+    # parse_integer accepts e.g. 2.0 and 1e3 as floats, a plain integer is taken from the text so it is exact
+    if parsed is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        number = int(parsed)
+    if number < _INT64_MIN or number > _INT64_MAX:
+        return None
+    return number
+
+
+def _to_float(value, parsed):
+    return parsed
+
+
+def _to_date(value, parsed):
+    return None if parsed is None else parsed.toordinal() - _EPOCH_ORDINAL
+
+
+def _to_time(value, parsed):
+    if parsed is None:
+        return None
+    return ((parsed.hour * 60 + parsed.minute) * 60 + parsed.second) * 1000000 + parsed.microsecond
+
+
+def _to_timestamp(value, parsed):
+    return None if parsed is None else (_naive_utc(parsed) - _EPOCH) // _MICROSECOND
+
+_CONVERT = {"integer": _to_integer, "float": _to_float, "date": _to_date, "time": _to_time, "timestamp": _to_timestamp}
+
+
+def npy_header(descr, rows):
+    """
+      The header of a version 1.0 .npy file of a one dimensional array, padded to a multiple of 64 bytes
+    """
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, rows)
+    length = len(header) + 1
+    padding = (64 - (10 + length) % 64) % 64
+    header = header + " " * padding + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+
+class _ExportColumn:
+    """
+    Temporary files of one column: the values (8 byte numbers, or utf-8 strings with their byte lengths) and the valid flags
+    """
+
+    def __init__(self, workdir, number, col):
+        self.name = str(col["name"])
+        self.type = col["type"] if col["type"] in _NUMERIC else "string"
+        self.position = int(col["colorder"])
+        self.has_null_value = "null_value" in col
+        self.null_value = col.get("null_value")
+        self.parse = None
+        self.width = 1
+        base = os.path.join(workdir, "col%05d" % number)
+        self.values_file = base + ".values"
+        self.valid_file = base + ".valid"
+        self.lengths_file = base + ".lengths"
+        self._values = open(self.values_file, "wb")
+        self._valid = open(self.valid_file, "wb")
+        self._lengths = open(self.lengths_file, "wb") if self.type == "string" else None
+
+    def add_chunk(self, values):
+        if self.has_null_value:
+            values = [None if value == self.null_value else value for value in values]
+        if self.type == "string":
+            valid = bytes([value is not None and value != "" for value in values])
+            texts = ["" if value is None else value for value in values]
+            self.width = max(self.width, max(map(len, texts)))
+            encoded = [text.encode("utf-8", "surrogatepass") for text in texts]
+            array.array("I", map(len, encoded)).tofile(self._lengths)
+            self._values.write(b"".join(encoded))
+        else:
+            parse = self.parse
+            convert = _CONVERT[self.type]
+            converted = [None if value is None or value == "" else convert(value, parse(value)) for value in values]
+            valid = bytes([value is not None for value in converted])
+            typecode = _NUMERIC[self.type][0]
+            missing = float("nan") if typecode == "d" else (0 if self.type == "integer" else _NAT)
+            numbers = array.array(typecode, [missing if value is None else value for value in converted])
+            if sys.byteorder != "little":
+                numbers.byteswap()
+            numbers.tofile(self._values)
+        self._valid.write(valid)
+
+    def close(self):
+        for f in (self._values, self._valid, self._lengths):
+            if f is not None:
+                f.close()
+
+    def write_npz(self, zf, rows):
+        with zf.open(self.name + ".npy", "w", force_zip64=True) as out:
+            if self.type == "string":
+                out.write(npy_header("<U%d" % self.width, rows))
+                self._write_strings(out)
+            else:
+                out.write(npy_header(_NUMERIC[self.type][1], rows))
+                with open(self.values_file, "rb") as f:
+                    shutil.copyfileobj(f, out, COPY_BUFFER)
+        with zf.open(self.name + ".valid.npy", "w", force_zip64=True) as out:
+            out.write(npy_header("|b1", rows))
+            with open(self.valid_file, "rb") as f:
+                shutil.copyfileobj(f, out, COPY_BUFFER)
+
+    def _write_strings(self, out):
+        """
+          Convert the utf-8 strings to fixed width UCS-4, a chunk of lengths at a time
+        """
+        width = self.width * 4
+        with open(self.lengths_file, "rb") as lengths_file, open(self.values_file, "rb") as values_file:
+            while True:
+                lengths = array.array("I")
+                lengths.frombytes(lengths_file.read(EXPORT_CHUNK_ROWS * lengths.itemsize))
+                if len(lengths) == 0:
+                    break
+                data = values_file.read(sum(lengths))
+                chunk = []
+                offset = 0
+                for n in lengths:
+                    chunk.append(data[offset:offset + n].decode("utf-8", "surrogatepass").encode("utf-32-le", "surrogatepass").ljust(width, b"\x00"))
+                    offset = offset + n
+                out.write(b"".join(chunk))
+
+
+class NpzExport:
+    """
+    Typed columns of the data rows for a .npz file, add() is called with each data row
+    compile() takes the parse functions from the compiled column plans
+    Once the data file is checked save() writes the .npz file, or discard() drops the temporary files
+    """
+
+    def __init__(self, csvspec, filename, tempdir=None):
+        self.filename = filename
+        self.rows = 0
+        self.workdir = tempfile.mkdtemp(prefix="csvvalidator_export_", dir=tempdir)
+        self.columns = [_ExportColumn(self.workdir, i, col) for i, col in enumerate(csvspec["columns"])]
+        self.chunk = []
+
+    def compile(self, plans):
+        parsers = {p.index: p.parse for p in plans}
+        for i, column in enumerate(self.columns):
+            column.parse = parsers.get(i)
+
+    def add(self, row):
+        self.chunk.append(row)
+        if len(self.chunk) >= EXPORT_CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        chunk = self.chunk
+        if len(chunk) == 0:
+            return
+        self.chunk = []
+        self.rows = self.rows + len(chunk)
+        for column in self.columns:
+            column.add_chunk(list(map(operator.itemgetter(column.position), chunk)))
+
+    def save(self):
+        """
+          Write the .npz file, the data file was accepted
+          Returns (rc, arrStrings)
+        """
+        self.flush()
+        for column in self.columns:
+            column.close()
+        tmp = self.filename + ".tmp"
+        try:
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+                for column in self.columns:
+                    column.write_npz(zf, self.rows)
+            os.replace(tmp, self.filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        return 0, ["Exported " + str(self.rows) + " rows of " + str(len(self.columns)) + " columns to " + self.filename]
+
+    def discard(self):
+        """
+          Drop the temporary files, the data file was rejected
+        """
+        for column in self.columns:
+            column.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
@@ -1,360 +1,895 @@
-"""
-This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file. 
-
-The module contains the functions to support validateThis.py only
-"""
-import csv
-import datetime
-
-def is_timestamp(timestamp_text, timestamp_format):
-    """
-      determine if passed string is a timestamp or not
-    """
-    try:
-        datetime.datetime.strptime(timestamp_text, timestamp_format)
-        return True
-    except ValueError:
-        return False
-
-def is_time(time_text, time_format):
-    """
-      determine if passed string is a time or not
-    """
-    try:
-        datetime.datetime.strptime(time_text, time_format)
-        return True
-    except ValueError:
-        return False
-
-def is_date(date_text, date_format):
-    """
-      determine if passed string is a date or not
-    """
-    try:
-        datetime.datetime.strptime(date_text, date_format)
-        return True
-    except ValueError:
-        return False
-
-def is_float(n):
-    """
-      determine if passed string is a float or not
-    """
-    try:
-        float(n)
-        return True
-    except ValueError:
-        return False
-
-def is_integer(n):
-    """
-      determine if passed string is an integer or not
-    """
-    try:
-        float(n)
-    except ValueError:
-        return False
-    else:
-        return float(n).is_integer()
-
-
-def column_test(csvspec, filename, col):
-    """
-    Reads the data file and test the columns against the csv Specifciation
-    1. Test datatype
-    2. Maximum tests
-    3. Blanks and Nulls
-    """
-    rc = 0
-    arrStrings = []
-
-    arrStrings.append("checking " + col["name"] + " against " + col["type"])
-    with open(filename, encoding = csvspec["dialect"]["encoding"]) as csvfile:
-        csv_reader = csv.reader(csvfile, dialect='csvspec')
-        rowcounter = 0
-        datarowcounter = 0
-        for row in csv_reader:
-            rowcounter = rowcounter + 1
-            if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
-                arrStrings.append("skipping header")
-                continue
-            datarowcounter = datarowcounter + 1
-
-            if col["type"] == "integer":
-                if is_integer(row[int(col["colorder"])]) != True:
-                    arrStrings.append("ERROR Non-Integer value found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                    rc = 8
-
-            if col["type"] == "float":
-                if is_float(row[int(col["colorder"])]) != True:
-                    arrStrings.append("ERROR Non-float value found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                    rc = 8
-
-            if col["type"] == "date":
-                if is_date(row[int(col["colorder"])], col["format"]) != True:
-                    arrStrings.append("ERROR Non-date value (" + str(col["format"]) + ") found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]) + " (check strptime for formats?)")
-                    rc = 8
-
-            if col["type"] == "time":
-                if is_time(row[int(col["colorder"])], col["format"]) != True:
-                    arrStrings.append("ERROR Non-time value (" + str(col["format"]) + ") found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]) + " (check strptime for formats?)")
-                    rc = 8
-
-            if col["type"] == "timestamp":
-                if is_timestamp(row[int(col["colorder"])], col["format"]) != True:
-                    arrStrings.append("ERROR Non-timestamp value (" + str(col["format"]) + ") found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]) + " (check strptime for formats?)")
-                    rc = 8
-
-            ## Generic tests ###########################################################
-            if col["allow_null"] != True and (row[int(col["colorder"])] is None or row[int(col["colorder"])] == col["null_value"]):
-                arrStrings.append("Null value found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                rc = 8
-            if col["allow_blank"] != True and (row[int(col["colorder"])] == "" or row[int(col["colorder"])] is None):
-                arrStrings.append("ERROR Blank value found at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                rc = 8
-            if col["max_len"] is not None and len(row[int(col["colorder"])]) > col["max_len"]:
-                arrStrings.append("ERROR Value longer than max len " + str(col["max_len"]) + " at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                rc = 8
-            if col["max_value"] is not None and row[int(col["colorder"])] > col["max_value"]:
-                arrStrings.append("ERROR Value greater than max " + str(col["max_value"]) + " at row: " + str(datarowcounter) + ": " + str(row[int(col["colorder"])]))
-                rc = 8
-        arrStrings.append("Rows read: " + str(rowcounter) + ", Rows checked: " + str(datarowcounter))
-    return rc, arrStrings
-
-
-def data_test(csvspec, filename):
-    """
-      Test the column datatypes found in the spec against allowable data types
-    """
-    rc = 0
-    arrStrings = []
-
-    valid_datatypes = ["string", "integer", "float", "date", "time", "timestamp"]
-
-    for col in csvspec["columns"]:
-
-        if col["type"] not in valid_datatypes:
-            arrStrings.append("ERROR Unsupported datatype found in csvspec: " + col["name"] + ": " + str(col["type"]))
-            rc = 8
-        else:
-            column_test_rc, column_test_arrStrings = column_test(csvspec, filename, col)
-            arrStrings = arrStrings + column_test_arrStrings
-            if column_test_rc > 0:
-                return column_test_rc, arrStrings
-
-    return rc, arrStrings
-
-def count_records(csvspec, filename):
-    """
-      Return number of records in the file
-      No determination of header is done, if it exists, it is also included in the count
-    """
-    with open(filename, encoding=csvspec["dialect"]["encoding"]) as csvfile:
-        csv_reader = csv.reader(csvfile, dialect='csvspec')
-        rowcounter = 0
-        for row in csv_reader:
-            rowcounter = rowcounter + 1
-    return rowcounter
-
-
-def domain_test(csvspec, filename):
-    """
-    Compare all values in the the column against those allowed via the Domain speicfic ine the csvspec for said column
-    """
-    rc = 0
-    arrStrings = []
-
-    for col in csvspec["columns"]:
-        if "domain" in col:
-            arrStrings.append("Found column with domain constraints: " + str(col["name"]) + " colorder: " + str(col["colorder"]))
-            arrStrings.append(str(col["domain"]))
-            with open(filename, encoding=csvspec["dialect"]["encoding"]) as csvfile:
-                csv_reader = csv.reader(csvfile, dialect='csvspec')
-                rowcounter = 0
-                for row in csv_reader:
-                    rowcounter = rowcounter + 1
-                    if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
-                        arrStrings.append("skipping header")
-                        continue
-                    if row[int(col["colorder"])] not in col["domain"]:
-                        arrStrings.append("ERROR Value found not in domain: " + str(row[int(col["colorder"])]))
-                        rc = 8
-    return rc, arrStrings
-
-
-def unique_test(csvspec, filename):
-    """
-    Check the column for uniqieness.   If specified in the csv Spec, there should be no duplicates in the column
-
-    Note, this function is dependent on columns in the file being present and in the correct order
-    Previous header checks should already have been performed at least to validate that columns exist and are in the correct order
-    """
-
-    rc = 0
-    arrStrings = []
-    keydata = []
-    keycolnumbers = []
-
-    #get column numbers from csvspec
-    for ucol in csvspec["uniqueness"]:
-        found = False
-        for col in csvspec["columns"]:
-            if col["name"] == ucol:
-                found = True
-                keycolnumbers.append(col["colorder"])
-        if found == False:
-            print("FATAL ERROR, unique column name not found in csvspec column list")
-            sys.exit(8)
-    arrStrings.append("using col positions for unique test: " + str(keycolnumbers))
-
-    with open(filename, encoding=csvspec["dialect"]["encoding"]) as csvfile:
-        csv_reader = csv.reader(csvfile, dialect='csvspec')
-        rowcounter = 0
-        for row in csv_reader:
-            rowcounter = rowcounter + 1
-            if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
-                arrStrings.append("skipping header")
-                continue
-            tempstr = ""
-            for k in keycolnumbers:
-                tempstr = tempstr + str(row[int(k)])
-            keydata.append(tempstr)
-        arrStrings.append("rows read: " + str(rowcounter))
-
-    #check for duplicates here so we can provide some additional data back to main.
-    seen = []
-    rowcounter = 0
-    if csvspec["dialect"]["has_header"] == True:
-        rowcounter = 1
-
-    for d in keydata:
-        rowcounter = rowcounter + 1
-        if d in seen:
-            arrStrings.append("ERROR Duplicate found at row: " + str(rowcounter) + ": " + str(d))
-            rc = 8
-        else:
-            seen.append(d)
-
-    return rc, arrStrings
-
-def compare_headers(csvspec, headers):
-    """
-    Compare the header record (column names) to the csv Spec
-    This should also quikly identify new/missing columns, column names etc...
-    """
-    rc = 0
-    arrStrings = []
-
-    # lists should be the same length
-    if len(csvspec["columns"]) != len(headers):
-        arrStrings.append("ERROR Difference in number of columns detected in header")
-        rc = 8
-
-    maxlength = 0
-    if len(csvspec["columns"]) > len(headers):
-        maxlength = len(csvspec["columns"])
-    else:
-        maxlength = len(headers)
-    if maxlength is None:
-        maxlength = 0
-
-    arrStrings.append("ColumnNo".ljust(10) + "csvspec".ljust(64) + "Sniffed ".ljust(64))
-    i = 0
-    #columns should be in the same order
-    while i < maxlength:
-        tempstr = str(i).ljust(10)
-        if i < len(csvspec["columns"]) and len(csvspec["columns"]) != 0:
-            tempstr = tempstr + csvspec["columns"][i]["name"].ljust(64)
-        if i < len(headers) and len(headers) != 0:
-            tempstr = tempstr + headers[i].ljust(64)
-        arrStrings.append(tempstr)
-        if i < len(csvspec["columns"]) and len(csvspec["columns"]) != 0 and i < len(headers) and len(headers) != 0:
-            if csvspec["columns"][i]["name"] != headers[i]:
-                arrStrings.append("ERROR Difference in column name or column order detected in header: *" + csvspec["columns"][i]["name"] + "* != *" + headers[i] + "*")
-                rc = 8
-        i = i + 1
-
-    return rc, arrStrings
-
-def compare_dialect(csvspec, sniffed):
-    """
-    Compares the sniffed/identified file/table level attributes to the csv Spec 'dialect' attributes
-    This includes and is not limited to:
-       delimiter
-       quotes
-       line terminator
-    """
-    arrStrings = []
-
-    arrStrings.append("Attribute".ljust(17)           +                        "csvspec".ljust(13) +                       "Sniffed ".ljust(13) )
-    arrStrings.append("delimeter".ljust(17)           + str(csvspec["delimeter"       ]).ljust(13) + str(sniffed["delimeter"       ]).ljust(13))
-    arrStrings.append("doublequote".ljust(17)         + str(csvspec["doublequote"     ]).ljust(13) + str(sniffed["doublequote"     ]).ljust(13))
-    arrStrings.append("escapechar".ljust(17)          + str(csvspec["escapechar"      ]).ljust(13) + str(sniffed["escapechar"      ]).ljust(13))
-    arrStrings.append("lineterminator".ljust(17)      + str(csvspec["lineterminator"  ]).ljust(13) + str(sniffed["lineterminator"  ]).ljust(13))
-    arrStrings.append("quotechar".ljust(17)           + str(csvspec["quotechar"       ]).ljust(13) + str(sniffed["quotechar"       ]).ljust(13))
-    arrStrings.append("quoting".ljust(17)             + str(csvspec["quoting"         ]).ljust(13) + str(sniffed["quoting"         ]).ljust(13))
-    arrStrings.append("skipinitialspace".ljust(17)    + str(csvspec["skipinitialspace"]).ljust(13) + str(sniffed["skipinitialspace"]).ljust(13))
-    arrStrings.append("strict".ljust(17)              + str(csvspec["strict"          ]).ljust(13) + str(sniffed["strict"          ]).ljust(13))
-    arrStrings.append("has_header".ljust(17)          + str(csvspec["has_header"      ]).ljust(13) + str(sniffed["has_header"      ]).ljust(13))
-    arrStrings.append("encoding".ljust(17)            + str(csvspec["encoding"        ]).ljust(13) + str(sniffed["encoding"        ]).ljust(13))
-
-    rc = 0
-    if csvspec["delimeter"       ] !=  sniffed["delimeter"       ].strip("'"):
-        arrStrings.append("ERROR Difference in dialect attribute: delimiter")
-        rc = 8
-    if csvspec["doublequote"     ] !=  sniffed["doublequote"     ]:
-        arrStrings.append("ERROR Difference in dialect attribute: doublequote")
-        rc = 8
-    if str(csvspec["escapechar"      ]) !=  str(sniffed["escapechar"      ]):
-        arrStrings.append("ERROR Difference in dialect attribute: escapechar")
-        rc = 8
-    if csvspec["lineterminator"  ] !=  sniffed["lineterminator"  ]:
-        arrStrings.append("ERROR Difference in dialect attribute: lineterminator")
-        rc = 8
-    if csvspec["quotechar"       ] !=  sniffed["quotechar"       ]:
-        arrStrings.append("ERROR Difference in dialect attribute: quotechar")
-        rc = 8
-    if int(csvspec["quoting"         ]) !=  int(sniffed["quoting"         ]):
-        arrStrings.append("ERROR Difference in dialect attribute: quoting")
-        rc = 8
-    if csvspec["skipinitialspace"] !=  sniffed["skipinitialspace"]:
-        arrStrings.append("ERROR Difference in dialect attribute: skipinitialspace")
-        rc = 8
-    if csvspec["strict"          ] !=  sniffed["strict"          ]:
-        arrStrings.append("ERROR Difference in dialect attribute: strict")
-        rc = 8
-    if csvspec["has_header"          ] !=  sniffed["has_header"          ]:
-        arrStrings.append("ERROR Difference in dialect attribute: strict")
-        rc = 8
-    if csvspec["encoding"          ] !=  sniffed["encoding"          ]:
-        arrStrings.append("ERROR Difference in dialect attribute: encoding")
-        rc = 8
-
-    return (rc, arrStrings)
-
-def csvdialect_to_dict(name, dialect: csv.Dialect):
-    """
-    Convert the json formatted csv spec to dict.
-    Used for comparisons
-    """
-
-    strict = None
-    try:
-        strict = dialect.strict
-    except AttributeError:
-        pass
-
-    dictionary = {"name": name
-                  ,"dialect"          :
-                   {"delimeter"       : repr(dialect.delimiter)
-                   ,"doublequote"     : dialect.doublequote
-                   ,"escapechar"      : repr(dialect.escapechar)
-                   ,"lineterminator"  : repr(dialect.lineterminator)
-                   ,"quotechar"       : dialect.quotechar
-                   ,"quoting"         : repr(dialect.quoting)
-                   ,"skipinitialspace": dialect.skipinitialspace
-                   ,"strict"          : strict
-                  }
-                 }
-    #json_object = json.dumps(dictionary, indent = 4)
-    return dictionary
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file. 
+
+The module contains the functions to support validateThis.py only
+"""
+import csv
+import itertools
+import operator
+
+from validate_this_batch import CHECK_BATCH_ROWS
+from validate_this_batch import column_screen
+from validate_this_dates import datetime_parser
+from validate_this_report import Reporter
+from validate_this_report import TooManyErrors
+from validate_this_dates import shared_parser
+from validate_this_domains import compile_domain
+from validate_this_domains import describe_domain
+from validate_this_domains import has_domain
+from validate_this_input import DEFAULT_PIPELINE
+from validate_this_input import open_records
+from validate_this_metrics import TimedDomain
+from validate_this_metrics import merge_timings
+from validate_this_metrics import timed
+from validate_this_profile import Profiler
+from validate_this_records import count_file_records
+from validate_this_unique import UniqueKeys
+from validate_this_unique import format_key
+
+def is_timestamp(timestamp_text, timestamp_format):
+    """
+      determine if passed string is a timestamp or not
+    """
+    return shared_parser(timestamp_format)(timestamp_text) is not None
+
+def is_time(time_text, time_format):
+    """
+      determine if passed string is a time or not
+    """
+    return shared_parser(time_format)(time_text) is not None
+
+def is_date(date_text, date_format):
+    """
+      determine if passed string is a date or not
+    """
+    return shared_parser(date_format)(date_text) is not None
+
+def is_float(n):
+    """
+      determine if passed string is a float or not
+    """
+    try:
+        float(n)
+        return True
+    except ValueError:
+        return False
+
+def is_integer(n):
+    """
+      determine if passed string is an integer or not
+    """
+    return parse_integer(n) is not None
+
+
+def parse_integer(n):
+    """
+      Return the passed string as a number if it is an integer, otherwise None
+    """
+    try:
+        f = float(n)
+    except ValueError:
+        return None
+    if f.is_integer():
+        return f
+    return None
+
+def parse_float(n):
+    """
+      Return the passed string as a float, None if it is not a float
+    """
+    try:
+        return float(n)
+    except ValueError:
+        return None
+
+
+def format_parser(datetime_format, parsers=None):
+    """
+      The parser of a date, time or timestamp format, taken from (or added to) parsers if given
+      Plans sharing the parsers share the cache of the parser of a format, e.g. the plans of several csv Specs
+    """
+    if parsers is None:
+        return datetime_parser(datetime_format)
+    if datetime_format not in parsers:
+        parsers[datetime_format] = datetime_parser(datetime_format)
+    return parsers[datetime_format]
+
+
+class ColumnPlan:
+    """
+    The checks for one column compiled from the csv Specification
+
+    index is the position of the column in the csvspec column list and position its resolved colorder
+    parse converts a value to the column type, returning None if it is not valid (None for strings)
+    dates, times and timestamps use the compiled format parsers in validate_this_dates.py, see format_parser
+    checks holds only the checks that apply to the column, in report order: datatype, null, blank, max len, max value
+    and min value. max_value and min_value are compared as numbers for integer and float columns, see _limit()
+    Each is a (check name, check) pair, check(value, rownumber) returns the error string or None
+    rownumber is the record number in the data file (the header is record 1), as the row of the findings
+    """
+
+    def __init__(self, index, col, parsers=None):
+        self.index = index
+        self.col = col
+        self.name = col["name"]
+        self.type = col["type"]
+        self.position = int(col["colorder"])
+        self.parse = None
+        self.max_value = None
+        self.min_value = None
+        self.checks = []
+
+        if self.type == "integer":
+            self.parse = parse_integer
+            self.checks.append((self.type, self._type_check("ERROR Non-Integer value found at row: ", "")))
+        elif self.type == "float":
+            self.parse = parse_float
+            self.checks.append((self.type, self._type_check("ERROR Non-float value found at row: ", "")))
+        elif self.type in ("date", "time", "timestamp"):
+            self.parse = format_parser(col["format"], parsers)
+            self.checks.append((self.type, self._type_check("ERROR Non-" + self.type + " value (" + str(col["format"]) + ") found at row: ", " (check strptime for formats?)")))
+
+        ## Generic tests ###########################################################
+        if col.get("allow_null", True) != True:
+            null_value = col.get("null_value")
+            def null_check(value, rownumber):
+                if value is None or value == null_value:
+                    return "Null value found at row: " + str(rownumber) + ": " + str(value)
+                return None
+            self.checks.append(("null", null_check))
+        if col.get("allow_blank", True) != True:
+            def blank_check(value, rownumber):
+                if value == "" or value is None:
+                    return "ERROR Blank value found at row: " + str(rownumber) + ": " + str(value)
+                return None
+            self.checks.append(("blank", blank_check))
+        max_len = col.get("max_len")
+        if max_len is not None:
+            max_len_message = "ERROR Value longer than max len " + str(max_len) + " at row: "
+            def max_len_check(value, rownumber):
+                if len(value) > max_len:
+                    return max_len_message + str(rownumber) + ": " + str(value)
+                return None
+            self.checks.append(("max_len", max_len_check))
+        max_value = col.get("max_value")
+        if max_value is not None:
+            self.max_value = self._limit(max_value)
+            self.checks.append(("max_value", self._limit_check(self.max_value, operator.gt, "ERROR Value greater than max " + str(max_value) + " at row: ")))
+        min_value = col.get("min_value")
+        if min_value is not None:
+            self.min_value = self._limit(min_value)
+            self.checks.append(("min_value", self._limit_check(self.min_value, operator.lt, "ERROR Value less than min " + str(min_value) + " at row: ")))
+
+    def _limit(self, value):
+        """
+          max_value or min_value as the column type: a float for integer and float columns, parsed with the format
+          of date, time and timestamp columns. A string for string columns, or if it is not of the column type
+        """
+        if self.type in ("integer", "float") and isinstance(value, (int, float)):
+            return float(value)
+        if self.parse is not None:
+            parsed = self.parse(str(value))
+            if parsed is not None:
+                return parsed
+        return str(value)
+
+    def _limit_check(self, limit, compare, message):
+        if isinstance(limit, str):
+            def limit_check(value, rownumber):
+                if compare(value, limit):
+                    return message + str(rownumber) + ": " + str(value)
+                return None
+            return limit_check
+        parse = self.parse
+        def limit_check(value, rownumber):
+            # a value not of the column type is reported by the datatype check
+            parsed = parse(value)
+            if parsed is not None and compare(parsed, limit):
+                return message + str(rownumber) + ": " + str(value)
+            return None
+        return limit_check
+
+    def _type_check(self, message, suffix):
+        parse = self.parse
+        def type_check(value, rownumber):
+            if parse(value) is None:
+                return message + str(rownumber) + ": " + str(value) + suffix
+            return None
+        return type_check
+
+    def test(self, value, rownumber):
+        """
+        Test a single value, returns the list of errors found, an empty list means the value passed
+        """
+        errors = []
+        for check_name, check in self.checks:
+            error = check(value, rownumber)
+            if error is not None:
+                errors.append(error)
+        return errors
+
+
+VALID_DATATYPES = ["string", "integer", "float", "date", "time", "timestamp"]
+SCAN_BATCH_ROWS = 1024
+
+def compile_plan(csvspec, parsers=None):
+    """
+    Compile the csv Specification into the list of ColumnPlan for the columns with a supported datatype
+    parsers, if given a dict, holds the date, time and timestamp parsers by format, shared with other plans
+    """
+    return [ColumnPlan(i, col, parsers) for i, col in enumerate(csvspec["columns"]) if col["type"] in VALID_DATATYPES]
+
+
+def column_test(csvspec, filename, col):
+    """
+    Reads the data file and test the columns against the csv Specifciation
+    1. Test datatype
+    2. Maximum tests
+    3. Blanks and Nulls
+    """
+    rc = 0
+    arrStrings = []
+
+    arrStrings.append("checking " + col["name"] + " against " + col["type"])
+    plan = ColumnPlan(0, col)
+    with open_records(filename, csvspec["dialect"]["encoding"]) as rows:
+        rowcounter = 0
+        datarowcounter = 0
+        for row in rows:
+            rowcounter = rowcounter + 1
+            if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
+                arrStrings.append("skipping header")
+                continue
+            datarowcounter = datarowcounter + 1
+
+            column_value_errors = plan.test(row[plan.position], rowcounter)
+            if len(column_value_errors) > 0:
+                arrStrings = arrStrings + column_value_errors
+                rc = 8
+        arrStrings.append("Rows read: " + str(rowcounter) + ", Rows checked: " + str(datarowcounter))
+    return rc, arrStrings
+
+
+def data_test(csvspec, filename):
+    """
+      Test the column datatypes found in the spec against allowable data types
+    """
+    rc = 0
+    arrStrings = []
+
+    for col in csvspec["columns"]:
+
+        if col["type"] not in VALID_DATATYPES:
+            arrStrings.append("ERROR Unsupported datatype found in csvspec: " + col["name"] + ": " + str(col["type"]))
+            rc = 8
+        else:
+            column_test_rc, column_test_arrStrings = column_test(csvspec, filename, col)
+            arrStrings = arrStrings + column_test_arrStrings
+            if column_test_rc > 0:
+                return column_test_rc, arrStrings
+
+    return rc, arrStrings
+
+def count_records(csvspec, filename):
+    """
+      Return number of records in the file
+      No determination of header is done, if it exists, it is also included in the count
+      The raw bytes are counted (see count_file_records), csv.reader is used if the dialect does not allow it
+    """
+    try:
+        return count_file_records(filename, csvspec["dialect"])
+    except ValueError:
+        pass
+    with open_records(filename, csvspec["dialect"]["encoding"]) as rows:
+        rowcounter = 0
+        for row in rows:
+            rowcounter = rowcounter + 1
+    return rowcounter
+
+
+def read_header(csvspec, filename):
+    """
+      Return the first record of the file, an empty list if the file has none
+      Only the first record is read, without reading ahead
+    """
+    with open_records(filename, csvspec["dialect"]["encoding"], pipeline=None) as rows:
+        return next(rows, [])
+
+
+def domain_test(csvspec, filename):
+    """
+    Compare all values in the the column against those allowed via the Domain speicfic ine the csvspec for said column
+    """
+    rc = 0
+    arrStrings = []
+
+    for col in csvspec["columns"]:
+        if has_domain(col):
+            arrStrings.append("Found column with domain constraints: " + str(col["name"]) + " colorder: " + str(col["colorder"]))
+            arrStrings.append(describe_domain(col))
+            domain = compile_domain(col)
+            with open_records(filename, csvspec["dialect"]["encoding"]) as rows:
+                rowcounter = 0
+                for row in rows:
+                    rowcounter = rowcounter + 1
+                    if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
+                        arrStrings.append("skipping header")
+                        continue
+                    if row[int(col["colorder"])] not in domain:
+                        arrStrings.append("ERROR Value found not in domain: " + str(row[int(col["colorder"])]))
+                        rc = 8
+    return rc, arrStrings
+
+
+def unique_key_columns(csvspec):
+    """
+    Return the column positions (colorder) of the uniqueness key columns in key order
+    None is returned if a key column is not found in the csvspec column list
+    """
+    keycolnumbers = []
+    for ucol in csvspec["uniqueness"]:
+        found = False
+        for col in csvspec["columns"]:
+            if col["name"] == ucol:
+                found = True
+                keycolnumbers.append(col["colorder"])
+        if found == False:
+            return None
+    return keycolnumbers
+
+
+def unique_report(duplicates):
+    """
+    Report lines for the (rownumber, key) duplicates found by UniqueKeys
+    """
+    arrStrings = []
+    for rownumber, key in duplicates:
+        arrStrings.append("ERROR Duplicate found at row: " + str(rownumber) + ": " + format_key(key))
+    return arrStrings
+
+
+def unique_test(csvspec, filename, memory_budget_mb=None):
+    """
+    Check the column for uniqieness.   If specified in the csv Spec, there should be no duplicates in the column
+    Compound keys are compared as tuples of the key column values.
+    memory_budget_mb limits the memory used for keys, beyond it keys are partitioned to temporary files
+
+    Note, this function is dependent on columns in the file being present and in the correct order
+    Previous header checks should already have been performed at least to validate that columns exist and are in the correct order
+    """
+
+    rc = 0
+    arrStrings = []
+
+    #get column numbers from csvspec
+    keycolnumbers = unique_key_columns(csvspec)
+    if keycolnumbers is None:
+        arrStrings.append("FATAL ERROR, unique column name not found in csvspec column list")
+        return 8, arrStrings
+    arrStrings.append("using col positions for unique test: " + str(keycolnumbers))
+    keypositions = [int(k) for k in keycolnumbers]
+
+    keys = UniqueKeys(memory_budget_mb)
+    duplicates = []
+    with open_records(filename, csvspec["dialect"]["encoding"]) as rows:
+        rowcounter = 0
+        for row in rows:
+            rowcounter = rowcounter + 1
+            if rowcounter == 1 and csvspec["dialect"]["has_header"] == True:
+                arrStrings.append("skipping header")
+                continue
+            key = tuple([row[k] for k in keypositions])
+            if keys.add(key, rowcounter):
+                duplicates.append((rowcounter, key))
+        arrStrings.append("rows read: " + str(rowcounter))
+
+    #check for duplicates here so we can provide some additional data back to main.
+    duplicates = duplicates + keys.finish()
+    if len(duplicates) > 0:
+        arrStrings = arrStrings + unique_report(duplicates)
+        rc = 8
+
+    return rc, arrStrings
+
+def uniqueness_defined(csvspec):
+    """
+    True if the csv Spec requests a uniqueness check
+    """
+    return csvspec["uniqueness"] is not None and str(csvspec["uniqueness"]) != "None" and str(csvspec["uniqueness"]) != "Null" and str(csvspec["uniqueness"]) != ""
+
+
+class SinglePass:
+    """
+    State of the checks performed in a single pass over the data file
+    Rows are fed with add_rows() and the reports are built by results()
+
+    rowcounter is the number of records before the first row fed, so a pass can start part way through the file
+    keys collects the uniqueness keys, by default a UniqueKeys within the memory budget
+    Findings are passed to the reporter as they happen, the reports are built from its ReportCollector
+    Passes over consecutive ranges of the file are combined with merge(), see validate_this_parallel.py
+    check_timings, if given a dict, collects the time spent in each check as {(stage, index, check): [seconds, calls]}
+    A reporter with an ErrorLimit sink stops the pass early, stopped then holds the reason
+    keyindex, if given a KeyIndexRun (see validate_this_keyindex.py), stages the keys of each data row for the key index
+    profile, if True, also profiles the values of each data row, see validate_this_profile.py
+    quarantine, if given a Quarantine that is also a sink of the reporter, is handed each data row once it is checked
+    export, if given an NpzExport (see validate_this_export.py), is handed each data row for the typed columns, with a
+    quarantine only its compile() is called, the accepted rows are added once the quarantine is closed
+    check_batch_rows, if not 0, the data checks screen the values of each batch of this many rows at once, only the
+    rows that may fail are checked value by value, see validate_this_batch.py
+    parsers, if given a dict, the date, time and timestamp parsers shared with other passes, see format_parser
+    """
+    def __init__(self, csvspec, unique_memory_budget_mb=None, rowcounter=0, keys=None, reporter=None, check_timings=None, keyindex=None, profile=False, quarantine=None, export=None, check_batch_rows=CHECK_BATCH_ROWS, parsers=None):
+        self.csvspec = csvspec
+        self.parsers = parsers
+        self.check_batch_rows = check_batch_rows
+        self.keyindex = keyindex
+        self.quarantine = quarantine
+        self.export = export
+        self.profiler = None
+        if profile:
+            self.profiler = Profiler(csvspec)
+        self.check_timings = check_timings
+        self.has_header = csvspec["dialect"]["has_header"] == True
+        self.rowcounter = rowcounter
+        self.datarowcounter = rowcounter
+        if self.has_header and rowcounter > 0:
+            self.datarowcounter = rowcounter - 1
+        self.headers = []
+        if reporter is None:
+            reporter = Reporter()
+        self.reporter = reporter
+        self.stopped = None
+
+        #get key column numbers from csvspec
+        self.check_unique = uniqueness_defined(csvspec)
+        self.unique_rc = 0
+        self.unique_strings = []
+        self.keypositions = []
+        if self.check_unique:
+            keycolnumbers = unique_key_columns(csvspec)
+            if keycolnumbers is None:
+                self.unique_strings.append("FATAL ERROR, unique column name not found in csvspec column list")
+                self.unique_rc = 8
+            else:
+                self.unique_strings.append("using col positions for unique test: " + str(keycolnumbers))
+                self.keypositions = [int(k) for k in keycolnumbers]
+        self.check_unique = self.check_unique and self.unique_rc == 0
+        if keys is None and self.check_unique:
+            keys = UniqueKeys(unique_memory_budget_mb)
+        self.keys = keys
+
+        self.domaincols = [(i, col) for i, col in enumerate(csvspec["columns"]) if has_domain(col) or (keyindex is not None and "foreign_key" in col)]
+        self._compile()
+
+    def _compile(self):
+        # only columns with checks that apply are visited for each row
+        plans = compile_plan(self.csvspec, self.parsers)
+        self.plan = [(p.index, p.position, p.name, p.checks) for p in plans if len(p.checks) > 0]
+        self.screens = None
+        if self.check_batch_rows > 0:
+            screens = [column_screen(p) for p in plans if len(p.checks) > 0]
+            if any(screen is not None for screen in screens):
+                self.screens = screens
+        if self.profiler is not None:
+            self.profiler.compile(plans)
+        if self.export is not None:
+            self.export.compile(plans)
+        self.domainplan = [(i, int(col["colorder"]), col["name"], compile_domain(col)) for i, col in self.domaincols if has_domain(col)]
+        if self.check_timings is not None:
+            timings = self.check_timings
+            self.plan = [(i, position, name, [(check_name, timed(check, timings, ("data", i, check_name))) for check_name, check in checks])
+                         for i, position, name, checks in self.plan]
+            self.domainplan = [(i, position, name, TimedDomain(domain, timings, ("domain", i, "domain"))) for i, position, name, domain in self.domainplan]
+            if self.screens is not None:
+                self.screens = [None if screen is None else timed(screen, timings, ("data", i, "batch"))
+                                for (i, position, name, checks), screen in zip(self.plan, self.screens)]
+
+    def __getstate__(self):
+        # the compiled plan holds closures, it is rebuilt when unpickled (e.g. returned by a worker process)
+        state = dict(self.__dict__)
+        del state["plan"]
+        del state["domainplan"]
+        del state["screens"]
+        # the parsers hold caches, they are not shared once pickled
+        state["parsers"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def _report_duplicate(self, rownumber, key):
+        self.reporter.add("unique", "unique", None, list(self.csvspec["uniqueness"]), rownumber, format_key(key), unique_report([(rownumber, key)])[0])
+
+    def _batch_plan(self, batch, first):
+        """
+        Screen the values of a batch of rows from offset first (the rows before it are not data rows)
+        Returns the plan for the rows without values that may fail, and a dict of the plan for each row with one
+        """
+        plan = []
+        suspects = {}
+        for entry, screen in zip(self.plan, self.screens):
+            if screen is None:
+                plan.append(entry)
+                continue
+            try:
+                values = [row[entry[1]] for row in batch[first:]]
+            except IndexError:
+                # a short row, the checks value by value report it as before
+                plan.append(entry)
+                continue
+            for j in screen(values):
+                suspects.setdefault(j + first, set()).add(entry[0])
+        unscreened = set(entry[0] for entry in plan)
+        rowplans = {}
+        for j, indexes in suspects.items():
+            rowplans[j] = [entry for entry in self.plan if entry[0] in unscreened or entry[0] in indexes]
+        return plan, rowplans
+
+    def _batches(self, rows):
+        """
+        The rows in batches of check_batch_rows, each with its plan, see _batch_plan()
+        """
+        if self.screens is None:
+            yield rows, self.plan, {}
+            return
+        rows = iter(rows)
+        # the header, if the rows start with it, is not screened
+        first = 1 if self.rowcounter == 0 and self.has_header else 0
+        while True:
+            batch = list(itertools.islice(rows, self.check_batch_rows))
+            if len(batch) == 0:
+                return
+            plan, rowplans = self._batch_plan(batch, first)
+            first = 0
+            yield batch, plan, rowplans
+
+    def add_rows(self, rows):
+        """
+        Perform the checks on each row
+        """
+        domainplan = self.domainplan
+        report = self.reporter.add
+        keys_add = None
+        if self.check_unique:
+            keys_add = self.keys.add
+            if self.check_timings is not None:
+                keys_add = timed(keys_add, self.check_timings, ("unique", None, "unique"))
+        keypositions = self.keypositions
+        index_add = None
+        if self.keyindex is not None:
+            index_add = self.keyindex.add
+        profile_add = None
+        if self.profiler is not None:
+            profile_add = self.profiler.add
+        quarantine_write = None
+        if self.quarantine is not None:
+            quarantine_write = self.quarantine.write
+        export_add = None
+        if self.export is not None and self.quarantine is None:
+            # with the quarantine the export is given the accepted file once it is closed
+            export_add = self.export.add
+        rowcounter = self.rowcounter
+        datarowcounter = self.datarowcounter
+        try:
+            for batch, batchplan, rowplans in self._batches(rows):
+                for j, row in enumerate(batch):
+                    rowcounter = rowcounter + 1
+                    if rowcounter == 1:
+                        self.headers = row
+                        if self.has_header:
+                            continue
+                    datarowcounter = datarowcounter + 1
+
+                    if keys_add is not None:
+                        key = tuple([row[k] for k in keypositions])
+                        if keys_add(key, rowcounter):
+                            self._report_duplicate(rowcounter, key)
+
+                    if index_add is not None:
+                        index_add(row, rowcounter)
+
+                    if profile_add is not None:
+                        profile_add(row)
+
+                    if export_add is not None:
+                        export_add(row)
+
+                    for i, position, name, domain in domainplan:
+                        value = row[position]
+                        if value not in domain:
+                            report("domain", "domain", i, name, rowcounter, value, "ERROR Value found not in domain: " + str(value))
+
+                    for i, position, name, checks in rowplans.get(j, batchplan):
+                        value = row[position]
+                        for check_name, check in checks:
+                            error = check(value, rowcounter)
+                            if error is not None:
+                                report("data", check_name, i, name, rowcounter, value, error)
+
+                    if quarantine_write is not None:
+                        quarantine_write(row, rowcounter)
+        except TooManyErrors as e:
+            self.stopped = str(e)
+        finally:
+            self.rowcounter = rowcounter
+            self.datarowcounter = datarowcounter
+            if self.profiler is not None:
+                self.profiler.flush()
+
+    def merge(self, other):
+        """
+        Add the results of a pass over the range of the data file that follows this one
+        Uniqueness across the ranges is resolved by the caller, see results()
+        Once a range is stopped the record counts stay at the record it stopped on, the later ranges only add findings
+        """
+        if self.rowcounter == 0:
+            self.headers = other.headers
+        if self.stopped is None:
+            self.rowcounter = other.rowcounter
+            self.datarowcounter = other.datarowcounter
+            self.stopped = other.stopped
+        self.reporter.collector().merge(other.reporter.collector())
+        if self.profiler is not None and other.profiler is not None:
+            self.profiler.merge(other.profiler)
+        if self.check_timings is not None and other.check_timings is not None:
+            merge_timings(self.check_timings, other.check_timings)
+
+    def close(self):
+        """
+        Remove the temporary files of the uniqueness keys, e.g. when the pass raised before results()
+        """
+        if self.keys is not None:
+            self.keys.close()
+
+    def results(self, duplicates=None):
+        """
+        Returns a dict with the results of each check in the same form as the individual functions:
+           recordcount : as count_records
+           headers     : the first record in the file
+           unique      : (rc, arrStrings) as unique_test, (0, []) if no uniqueness is specified
+           domain      : (rc, arrStrings) as domain_test
+           data        : (rc, arrStrings) as data_test
+           stopped     : None, or why the pass stopped early (the other results then cover the records read)
+           profile     : the column profile of the data rows read (see Profiler.summary), None if not profiled
+        duplicates not yet reported are taken from keys (those spilled to disk), or passed in when found elsewhere
+        """
+        rowcounter = self.rowcounter
+        datarowcounter = self.datarowcounter
+        header_skipped = self.has_header and rowcounter > 0
+        collector = self.reporter.collector()
+        if self.keyindex is not None:
+            stopped = self.keyindex.probe(self.reporter)
+            if self.stopped is None:
+                self.stopped = stopped
+
+        # assemble the reports as the individual checks would have
+        unique_rc = self.unique_rc
+        unique_strings = list(self.unique_strings)
+        if self.check_unique:
+            if header_skipped:
+                unique_strings.append("skipping header")
+            unique_strings.append("rows read: " + str(rowcounter))
+            if self.keyindex is not None and self.keyindex.unique_across_history:
+                unique_strings.append("checking uniqueness across history in the key index: " + self.keyindex.name)
+            if duplicates is None:
+                duplicates = self.keys.finish()
+            for rownumber, key in duplicates:
+                try:
+                    self._report_duplicate(rownumber, key)
+                except TooManyErrors as e:
+                    self.stopped = str(e)
+            if collector.count("unique") > 0:
+                unique_strings = unique_strings + collector.report("unique", None)
+                unique_rc = 8
+
+        domain_rc = 0
+        domain_strings = []
+        for i, col in self.domaincols:
+            if has_domain(col):
+                domain_strings.append("Found column with domain constraints: " + str(col["name"]) + " colorder: " + str(col["colorder"]))
+                domain_strings.append(describe_domain(col))
+            if "foreign_key" in col and self.keyindex is not None:
+                domain_strings.append("Found column with foreign key: " + str(col["name"]) + " colorder: " + str(col["colorder"]))
+                domain_strings.append("foreign_key: " + str(col["foreign_key"]))
+            if header_skipped:
+                domain_strings.append("skipping header")
+            if collector.count("domain", i) > 0:
+                domain_strings = domain_strings + collector.report("domain", i, col["name"])
+                domain_rc = 8
+
+        data_rc = 0
+        data_strings = []
+        for i, col in enumerate(self.csvspec["columns"]):
+            if col["type"] not in VALID_DATATYPES:
+                data_strings.append("ERROR Unsupported datatype found in csvspec: " + col["name"] + ": " + str(col["type"]))
+                data_rc = 8
+                continue
+            data_strings.append("checking " + col["name"] + " against " + col["type"])
+            if header_skipped:
+                data_strings.append("skipping header")
+            data_strings = data_strings + collector.report("data", i, col["name"])
+            data_strings.append("Rows read: " + str(rowcounter) + ", Rows checked: " + str(datarowcounter))
+            if collector.count("data", i) > 0:
+                data_rc = 8
+                break
+
+        return {"recordcount": rowcounter
+               ,"headers"    : self.headers
+               ,"unique"     : (unique_rc, unique_strings)
+               ,"domain"     : (domain_rc, domain_strings)
+               ,"data"       : (data_rc, data_strings)
+               ,"stopped"    : self.stopped
+               ,"profile"    : None if self.profiler is None else self.profiler.summary()
+               }
+
+
+def single_pass_test(csvspec, filename, unique_memory_budget_mb=None, reporter=None, check_timings=None, pipeline=DEFAULT_PIPELINE, keyindex=None, profile=False, quarantine=None, export=None, check_batch_rows=CHECK_BATCH_ROWS):
+    """
+    Reads the data file once and performs the record count, header, uniqueness, domain and data checks in the same pass
+    Reading and parsing are overlapped with the checks as set by the pipeline, see validate_this_input.py
+    Returns the dict of results described in SinglePass.results()
+    The caller is expected to evaluate the results in the same order the individual checks were run
+    """
+    singlepass = SinglePass(csvspec, unique_memory_budget_mb, reporter=reporter, check_timings=check_timings, keyindex=keyindex, profile=profile, quarantine=quarantine, export=export, check_batch_rows=check_batch_rows)
+    scan_passes([singlepass], filename, pipeline)
+    return singlepass.results()
+
+
+def scan_passes(singlepasses, filename, pipeline=DEFAULT_PIPELINE):
+    """
+    Read the data file once and feed its rows to each SinglePass, e.g. the passes of several csv Specs with the same dialect
+    The rows are handed to the passes in batches of SCAN_BATCH_ROWS, a pass that stopped early is not fed any more
+    The dialect of the passes must be registered as 'csvspec'
+    """
+    with open_records(filename, singlepasses[0].csvspec["dialect"]["encoding"], pipeline) as rows:
+        if len(singlepasses) == 1:
+            singlepasses[0].add_rows(rows)
+            return
+        rows = iter(rows)
+        while True:
+            active = [singlepass for singlepass in singlepasses if singlepass.stopped is None]
+            batch = list(itertools.islice(rows, SCAN_BATCH_ROWS))
+            if len(active) == 0 or len(batch) == 0:
+                return
+            for singlepass in active:
+                singlepass.add_rows(batch)
+
+
+def register_dialect(csvspec):
+    """
+    Register the csv Spec dialect as 'csvspec' for use by csv.reader
+    """
+    class csvspec_dialect(csv.Dialect):
+        delimiter        = csvspec["dialect"]["delimeter"]
+        doublequote      = csvspec["dialect"]["doublequote"]
+        escapechar       = csvspec["dialect"]["escapechar"]
+        lineterminator   = csvspec["dialect"]["lineterminator"]
+        quotechar        = csvspec["dialect"]["quotechar"]
+        quoting          = csvspec["dialect"]["quoting"]
+        skipinitialspace = csvspec["dialect"]["skipinitialspace"]
+        strict           = csvspec["dialect"]["strict"]
+    csv.register_dialect('csvspec', csvspec_dialect)
+
+
+def compare_headers(csvspec, headers):
+    """
+    Compare the header record (column names) to the csv Spec
+    This should also quikly identify new/missing columns, column names etc...
+    """
+    rc = 0
+    arrStrings = []
+
+    # lists should be the same length
+    if len(csvspec["columns"]) != len(headers):
+        arrStrings.append("ERROR Difference in number of columns detected in header")
+        rc = 8
+
+    maxlength = 0
+    if len(csvspec["columns"]) > len(headers):
+        maxlength = len(csvspec["columns"])
+    else:
+        maxlength = len(headers)
+    if maxlength is None:
+        maxlength = 0
+
+    arrStrings.append("ColumnNo".ljust(10) + "csvspec".ljust(64) + "Sniffed ".ljust(64))
+    i = 0
+    #columns should be in the same order
+    while i < maxlength:
+        tempstr = str(i).ljust(10)
+        if i < len(csvspec["columns"]) and len(csvspec["columns"]) != 0:
+            tempstr = tempstr + csvspec["columns"][i]["name"].ljust(64)
+        if i < len(headers) and len(headers) != 0:
+            tempstr = tempstr + headers[i].ljust(64)
+        arrStrings.append(tempstr)
+        if i < len(csvspec["columns"]) and len(csvspec["columns"]) != 0 and i < len(headers) and len(headers) != 0:
+            if csvspec["columns"][i]["name"] != headers[i]:
+                arrStrings.append("ERROR Difference in column name or column order detected in header: *" + csvspec["columns"][i]["name"] + "* != *" + headers[i] + "*")
+                rc = 8
+        i = i + 1
+
+    return rc, arrStrings
+
+def compare_dialect(csvspec, sniffed):
+    """
+    Compares the sniffed/identified file/table level attributes to the csv Spec 'dialect' attributes
+    This includes and is not limited to:
+       delimiter
+       quotes
+       line terminator
+    """
+    arrStrings = []
+
+    arrStrings.append("Attribute".ljust(17)           +                        "csvspec".ljust(13) +                       "Sniffed ".ljust(13) )
+    arrStrings.append("delimeter".ljust(17)           + str(csvspec["delimeter"       ]).ljust(13) + str(sniffed["delimeter"       ]).ljust(13))
+    arrStrings.append("doublequote".ljust(17)         + str(csvspec["doublequote"     ]).ljust(13) + str(sniffed["doublequote"     ]).ljust(13))
+    arrStrings.append("escapechar".ljust(17)          + str(csvspec["escapechar"      ]).ljust(13) + str(sniffed["escapechar"      ]).ljust(13))
+    arrStrings.append("lineterminator".ljust(17)      + str(csvspec["lineterminator"  ]).ljust(13) + str(sniffed["lineterminator"  ]).ljust(13))
+    arrStrings.append("quotechar".ljust(17)           + str(csvspec["quotechar"       ]).ljust(13) + str(sniffed["quotechar"       ]).ljust(13))
+    arrStrings.append("quoting".ljust(17)             + str(csvspec["quoting"         ]).ljust(13) + str(sniffed["quoting"         ]).ljust(13))
+    arrStrings.append("skipinitialspace".ljust(17)    + str(csvspec["skipinitialspace"]).ljust(13) + str(sniffed["skipinitialspace"]).ljust(13))
+    arrStrings.append("strict".ljust(17)              + str(csvspec["strict"          ]).ljust(13) + str(sniffed["strict"          ]).ljust(13))
+    arrStrings.append("has_header".ljust(17)          + str(csvspec["has_header"      ]).ljust(13) + str(sniffed["has_header"      ]).ljust(13))
+    arrStrings.append("encoding".ljust(17)            + str(csvspec["encoding"        ]).ljust(13) + str(sniffed["encoding"        ]).ljust(13))
+
+    rc = 0
+    if csvspec["delimeter"       ] !=  sniffed["delimeter"       ].strip("'"):
+        arrStrings.append("ERROR Difference in dialect attribute: delimiter")
+        rc = 8
+    if csvspec["doublequote"     ] !=  sniffed["doublequote"     ]:
+        arrStrings.append("ERROR Difference in dialect attribute: doublequote")
+        rc = 8
+    if str(csvspec["escapechar"      ]) !=  str(sniffed["escapechar"      ]):
+        arrStrings.append("ERROR Difference in dialect attribute: escapechar")
+        rc = 8
+    if csvspec["lineterminator"  ] !=  sniffed["lineterminator"  ]:
+        arrStrings.append("ERROR Difference in dialect attribute: lineterminator")
+        rc = 8
+    if csvspec["quotechar"       ] !=  sniffed["quotechar"       ]:
+        arrStrings.append("ERROR Difference in dialect attribute: quotechar")
+        rc = 8
+    if int(csvspec["quoting"         ]) !=  int(sniffed["quoting"         ]):
+        arrStrings.append("ERROR Difference in dialect attribute: quoting")
+        rc = 8
+    if csvspec["skipinitialspace"] !=  sniffed["skipinitialspace"]:
+        arrStrings.append("ERROR Difference in dialect attribute: skipinitialspace")
+        rc = 8
+    if csvspec["strict"          ] !=  sniffed["strict"          ]:
+        arrStrings.append("ERROR Difference in dialect attribute: strict")
+        rc = 8
+    if csvspec["has_header"          ] !=  sniffed["has_header"          ]:
+        arrStrings.append("ERROR Difference in dialect attribute: strict")
+        rc = 8
+    if csvspec["encoding"          ] !=  sniffed["encoding"          ]:
+        arrStrings.append("ERROR Difference in dialect attribute: encoding")
+        rc = 8
+
+    return (rc, arrStrings)
+
+def csvdialect_to_dict(name, dialect: csv.Dialect):
+    """
+    Convert the json formatted csv spec to dict.
+    Used for comparisons
+    """
+
+    strict = None
+    try:
+        strict = dialect.strict
+    except AttributeError:
+        pass
+
+    dictionary = {"name": name
+                  ,"dialect"          :
+                   {"delimeter"       : repr(dialect.delimiter)
+                   ,"doublequote"     : dialect.doublequote
+                   ,"escapechar"      : repr(dialect.escapechar)
+                   ,"lineterminator"  : repr(dialect.lineterminator)
+                   ,"quotechar"       : dialect.quotechar
+                   ,"quoting"         : repr(dialect.quoting)
+                   ,"skipinitialspace": dialect.skipinitialspace
+                   ,"strict"          : strict
+                  }
+                 }
+    #json_object = json.dumps(dictionary, indent = 4)
+    return dictionary
@@ -0,0 +1,313 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the opening of data files, which may be compressed
+
+Compression is detected from the magic bytes at the start of the file: gzip, bz2, xz, or zip (an archive holding
+a single data file). Compressed data files are decompressed as they are read, nothing is written to disk.
+
+Reading is pipelined (see Pipeline): a reader thread reads (and decompresses) raw blocks a few blocks ahead of the
+checks. File reads, zlib, bz2 and lzma release the GIL, so I/O and decompression overlap with parsing and checking,
+e.g. on network storage. Optionally the records are also parsed by csv.reader on a thread and handed over in
+batches through a bounded queue. csv.reader holds the GIL, so this only pays where the checks wait on something
+else; it is off by default.
+
+Reads at random offsets of an uncompressed data file (the sample blocks, the checkpoint fingerprint) use a MappedFile:
+the file is memory-mapped and the bytes are handed out as views of the map without copying. The fingerprint is hashed
+from the views and a sample block decodes only the whole lines it keeps. The records of the pass are not read from
+the map and not decoded lazily: they are read through the buffered reader above and every record is decoded, as
+csv.reader needs decoded text and a memory map is no faster than read() for reading a file in order.
+"""
+import bz2
+import collections
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import lzma
+import mmap
+import os
+import queue
+import threading
+import zipfile
+import zlib
+
+READ_AHEAD_BLOCK_SIZE = 1024 * 1024
+READ_AHEAD_BLOCKS = 4
+PARSE_AHEAD_BATCHES = 4
+
+# block_size and read_ahead_blocks of the reader thread (0 blocks: read on the calling thread),
+# parse_batch_rows and parse_ahead_batches of the parsing thread (0 rows: parse on the calling thread)
+Pipeline = collections.namedtuple("Pipeline", "block_size read_ahead_blocks parse_batch_rows parse_ahead_batches")
+DEFAULT_PIPELINE = Pipeline(READ_AHEAD_BLOCK_SIZE, READ_AHEAD_BLOCKS, 0, PARSE_AHEAD_BATCHES)
+
+_MAGIC = [(b"\x1f\x8b", "gzip")
+         ,(b"BZh", "bz2")
+         ,(b"\xfd7zXZ\x00", "xz")
+         ,(b"PK\x03\x04", "zip")
+         ]
+
+# raised while reading a damaged compressed data file
+DECOMPRESS_ERRORS = (OSError, EOFError, ValueError, zlib.error, lzma.LZMAError, zipfile.BadZipFile)
+
+
+def compression(filename):
+    """
+      The compression of the data file from its magic bytes, None if it is not compressed
+    """
+    with open(filename, "rb") as f:
+        start = f.read(8)
+    for magic, kind in _MAGIC:
+        if start.startswith(magic):
+            return kind
+    return None
+
+
+def _open_decompressed(filename, kind):
+    if kind == "gzip":
+        return gzip.open(filename, "rb")
+    if kind == "bz2":
+        return bz2.open(filename, "rb")
+    if kind == "xz":
+        return lzma.open(filename, "rb")
+    with zipfile.ZipFile(filename) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) != 1:
+            raise ValueError("zip archive must hold a single data file, found " + str(len(members)) + ": " + filename)
+        # the archive file stays open until the member is closed
+        return archive.open(members[0])
+
+
+class ReadAhead(io.RawIOBase):
+    """
+    Raw reader returning the blocks read from source by a background thread, at most depth blocks ahead
+    """
+
+    def __init__(self, source, block_size=READ_AHEAD_BLOCK_SIZE, depth=READ_AHEAD_BLOCKS):
+        self._source = source
+        self._block_size = block_size
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._block = b""
+        self._position = 0
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                block = self._source.read(self._block_size)
+                self._put(block)
+                if len(block) == 0:
+                    break
+        except Exception as e:
+            # handed to readinto(), which raises it to its caller
+            self._put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._position >= len(self._block):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            if len(item) == 0:
+                self._eof = True
+                return 0
+            self._block = item
+            self._position = 0
+        n = min(len(buffer), len(self._block) - self._position)
+        buffer[:n] = self._block[self._position:self._position + n]
+        self._position = self._position + n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+def buffered(source, pipeline=DEFAULT_PIPELINE):
+    """
+      Buffered reader over the raw reader source, read by a reader thread if the pipeline reads ahead
+    """
+    if pipeline is None or pipeline.read_ahead_blocks <= 0:
+        return io.BufferedReader(source, READ_AHEAD_BLOCK_SIZE if pipeline is None else pipeline.block_size)
+    return io.BufferedReader(ReadAhead(source, pipeline.block_size, pipeline.read_ahead_blocks), pipeline.block_size)
+
+
+def open_input(filename, read_ahead=True, pipeline=DEFAULT_PIPELINE):
+    """
+      Open the data file for reading bytes, compressed data files are decompressed as they are read
+      With read_ahead reading and decompression run on a reader thread as set by the pipeline
+    """
+    kind = compression(filename)
+    if not read_ahead or pipeline is None or pipeline.read_ahead_blocks <= 0:
+        if kind is None:
+            return open(filename, "rb")
+        return _open_decompressed(filename, kind)
+    if kind is None:
+        return buffered(open(filename, "rb", buffering=0), pipeline)
+    return buffered(_open_decompressed(filename, kind), pipeline)
+
+
+def open_text(filename, encoding, newline='', pipeline=DEFAULT_PIPELINE):
+    """
+      Open the data file as text, e.g. for csv.reader
+    """
+    if compression(filename) is None and (pipeline is None or pipeline.read_ahead_blocks <= 0):
+        return open(filename, encoding=encoding, newline=newline)
+    return io.TextIOWrapper(open_input(filename, pipeline=pipeline), encoding=encoding, newline=newline)
+
+
+class MappedFile:
+    """
+    Read only memory map of an uncompressed data file, for reads at random offsets without copying
+    view() returns a memoryview of a byte range, find() and rfind() search the map. The pages are shared with the
+    other readers of the file through the page cache. The size is fixed when it is opened, bytes appended later are
+    not seen. An empty file cannot be mapped, it reads as empty.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, "rb", buffering=0)
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = None
+        if self.size > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        else:
+            self._view = memoryview(b"")
+
+    def view(self, start, end):
+        """
+          The bytes [start, end) of the file, within its size, as a memoryview of the map
+        """
+        return self._view[max(0, start):max(0, min(end, self.size))]
+
+    def find(self, sub, start, end):
+        return -1 if self._map is None else self._map.find(sub, start, end)
+
+    def rfind(self, sub, start, end):
+        return -1 if self._map is None else self._map.rfind(sub, start, end)
+
+    def close(self):
+        # views handed out must be released first
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ParseAhead:
+    """
+    Iterate rows parsed on a thread, handed over in batches through a bounded queue
+    close() stops the thread, it must be called before the source file is closed, e.g. when the checks stop early
+    (see parsed_rows)
+    """
+
+    def __init__(self, rows, batch_rows, depth):
+        self._rows = rows
+        self._batch_rows = batch_rows
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                batch = list(itertools.islice(self._rows, self._batch_rows))
+                self._put(batch)
+                if len(batch) == 0:
+                    break
+        except Exception as e:
+            # raised to the consumer in the place of the rows that follow
+            self._put(e)
+
+    def __iter__(self):
+        while True:
+            batch = self._queue.get()
+            if isinstance(batch, Exception):
+                raise batch
+            if len(batch) == 0:
+                return
+            yield from batch
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def read_rows(csvfile, pipeline=DEFAULT_PIPELINE):
+    """
+      The records of the open data file as parsed by csv.reader with the registered 'csvspec' dialect
+      With parse_batch_rows set in the pipeline they are parsed on a thread, a _ParseAhead whose close() stops it
+    """
+    rows = csv.reader(csvfile, dialect='csvspec')
+    if pipeline is None or pipeline.parse_batch_rows <= 0:
+        return rows
+    return _ParseAhead(rows, pipeline.parse_batch_rows, pipeline.parse_ahead_batches)
+
+
+@contextlib.contextmanager
+def parsed_rows(csvfile, pipeline=DEFAULT_PIPELINE):
+    """
+      The records of the open data file, see read_rows, the parser thread is stopped on leaving the context
+      Used inside the with block that opens the file, so the thread never reads a closed file
+    """
+    rows = read_rows(csvfile, pipeline)
+    try:
+        yield rows
+    finally:
+        if isinstance(rows, _ParseAhead):
+            rows.close()
+
+
+@contextlib.contextmanager
+def open_records(filename, encoding, pipeline=DEFAULT_PIPELINE):
+    """
+      The records of the data file, see read_rows, read ahead as set by the pipeline (None: no reader thread)
+      The reader and parser threads are stopped and the file closed on leaving the context
+    """
+    with open_text(filename, encoding, pipeline=pipeline) as csvfile, parsed_rows(csvfile, pipeline) as rows:
+        yield rows
+
+
+def is_empty(filename):
+    """
+      True if the data file holds no data, for compressed data files once decompressed
+    """
+    if compression(filename) is None:
+        return os.stat(filename).st_size == 0
+    with open_input(filename, read_ahead=False) as f:
+        return len(f.read(1)) == 0
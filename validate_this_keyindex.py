@@ -0,0 +1,206 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the persistent key index, used to check keys across data files
+
+The key index is a SQLite database of the keys of the accepted data files, by spec name and key name (the comma
+separated key column names). csv Spec entries:
+    "name"                  : name of the spec in the key index, by default the config file name without .json
+    "unique_across_history" : true, the uniqueness key must not be in the key index for this spec already
+    "indexed_columns"       : ["Country Code"], columns whose values are recorded for the foreign keys of other specs
+                              (a single column uniqueness key recorded for unique_across_history can be referenced too)
+    column "foreign_key"    : "countries/2-alpha code", a (non blank) value must be recorded in the key index under
+                              spec countries, key 2-alpha code
+
+Keys are stored as digests (see key_digest in validate_this_unique.py). The keys of a data file are staged in
+temporary tables as it is read, in batches, and probed with one query each once it is read. They are only added to
+the key index when the data file is accepted (save()), a rejected data file leaves the key index as it was
+(discard()). Keys added by another data file since the probe are found again when saving, the data file is
+then rejected.
+"""
+import os
+import sqlite3
+import time
+
+from validate_this_functions import uniqueness_defined
+from validate_this_functions import unique_key_columns
+from validate_this_report import TooManyErrors
+from validate_this_unique import format_key
+from validate_this_unique import key_digest
+
+STAGE_BATCH_ROWS = 10000
+BUSY_TIMEOUT_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS keys (
+    spec      TEXT NOT NULL,
+    keyname   TEXT NOT NULL,
+    digest    BLOB NOT NULL,
+    file      TEXT,
+    added     REAL,
+    PRIMARY KEY (spec, keyname, digest)
+) WITHOUT ROWID
+"""
+
+
+def spec_name(csvspec, config_file=None):
+    """
+      The name of the csv Spec in the key index, None if it has none
+    """
+    if csvspec.get("name"):
+        return str(csvspec["name"])
+    if config_file is None:
+        return None
+    return os.path.splitext(os.path.basename(config_file))[0]
+
+
+def uses_key_index(csvspec):
+    """
+      True if the csv Spec has checks or keys for the key index
+    """
+    return (csvspec.get("unique_across_history") == True
+            or len(csvspec.get("indexed_columns") or []) > 0
+            or any("foreign_key" in col for col in csvspec["columns"]))
+
+
+class KeyIndexRun:
+    """
+    The keys of one data file for the key index, add() is called with each data row
+    """
+
+    def __init__(self, filename, csvspec, name, data_file):
+        self.name = name
+        self.data_file = data_file
+        self.connection = sqlite3.connect(filename, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(_SCHEMA)
+        self.connection.execute("CREATE TEMP TABLE staged_keys (keyname TEXT, digest BLOB, row INTEGER, value TEXT, is_unique INTEGER)")
+        self.connection.execute("CREATE TEMP TABLE staged_refs (spec TEXT, keyname TEXT, digest BLOB, row INTEGER, col INTEGER, value TEXT)")
+
+        # (key name, column positions, checked against history) of the keys recorded
+        self.recorded = []
+        self.unique_across_history = csvspec.get("unique_across_history") == True and uniqueness_defined(csvspec)
+        keynames = set()
+        if self.unique_across_history:
+            self.uniqueness = list(csvspec["uniqueness"])
+            keycolnumbers = unique_key_columns(csvspec)
+            if keycolnumbers is None:
+                raise ValueError("unique column name not found in csvspec column list")
+            keyname = ",".join(str(k) for k in self.uniqueness)
+            self.recorded.append((keyname, [int(k) for k in keycolnumbers], True))
+            keynames.add(keyname)
+        positions = {col["name"]: int(col["colorder"]) for col in csvspec["columns"]}
+        for name in csvspec.get("indexed_columns") or []:
+            if name not in positions:
+                raise ValueError("indexed column not found in csvspec column list: " + str(name))
+            if name not in keynames:
+                self.recorded.append((name, [positions[name]], False))
+                keynames.add(name)
+
+        # (column index, column name, referenced spec, referenced key name, position, reference) of the foreign keys
+        self.references = []
+        for i, col in enumerate(csvspec["columns"]):
+            if "foreign_key" in col:
+                if "/" not in str(col["foreign_key"]):
+                    raise ValueError("foreign_key of column " + str(col["name"]) + " is not <spec>/<column>: " + str(col["foreign_key"]))
+                spec, keyname = str(col["foreign_key"]).split("/", 1)
+                self.references.append((i, col["name"], spec, keyname, int(col["colorder"]), col["foreign_key"]))
+        self._keys = []
+        self._refs = []
+
+    def add(self, row, rownumber):
+        for keyname, positions, is_unique in self.recorded:
+            key = tuple([row[p] for p in positions])
+            self._keys.append((keyname, key_digest(key), rownumber, format_key(key), is_unique))
+        for i, name, spec, keyname, position, reference in self.references:
+            value = row[position]
+            if value != "":
+                self._refs.append((spec, keyname, key_digest((value,)), rownumber, i, value))
+        if len(self._keys) + len(self._refs) >= STAGE_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if len(self._keys) > 0:
+            self.connection.executemany("INSERT INTO staged_keys VALUES (?, ?, ?, ?, ?)", self._keys)
+            self._keys = []
+        if len(self._refs) > 0:
+            self.connection.executemany("INSERT INTO staged_refs VALUES (?, ?, ?, ?, ?, ?)", self._refs)
+            self._refs = []
+
+    def _history_duplicates(self):
+        return self.connection.execute("SELECT s.row, s.value FROM staged_keys s WHERE s.is_unique = 1 AND EXISTS"
+                                       " (SELECT 1 FROM keys k WHERE k.spec = ? AND k.keyname = s.keyname AND k.digest = s.digest)"
+                                       " ORDER BY s.row", (self.name,))
+
+    def probe(self, reporter):
+        """
+          Report the keys already in the key index and the foreign keys not in it
+          Returns the reason if an ErrorLimit stopped the checks, else None
+        """
+        self.flush()
+        stopped = None
+        if self.unique_across_history:
+            for rownumber, value in self._history_duplicates():
+                try:
+                    reporter.add("unique", "unique_history", None, self.uniqueness, rownumber, value, "ERROR Key found in an earlier data file at row: " + str(rownumber) + ": " + value)
+                except TooManyErrors as e:
+                    stopped = str(e)
+        missing = self.connection.execute("SELECT s.row, s.col, s.value FROM staged_refs s WHERE NOT EXISTS"
+                                          " (SELECT 1 FROM keys k WHERE k.spec = s.spec AND k.keyname = s.keyname AND k.digest = s.digest)"
+                                          " ORDER BY s.row, s.col")
+        references = {i: (name, reference) for i, name, spec, keyname, position, reference in self.references}
+        for rownumber, i, value in missing:
+            name, reference = references[i]
+            try:
+                reporter.add("domain", "foreign_key", i, name, rownumber, value, "ERROR Value not found in foreign key " + str(reference) + " at row: " + str(rownumber) + ": " + value)
+            except TooManyErrors as e:
+                stopped = str(e)
+        return stopped
+
+    def exclude(self, rownumbers):
+        """
+          Drop the staged keys of these rows, e.g. rows rejected to the quarantine, they are not added by save()
+        """
+        self.flush()
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS excluded_rows (row INTEGER PRIMARY KEY)")
+        self.connection.executemany("INSERT OR IGNORE INTO excluded_rows VALUES (?)", [(r,) for r in rownumbers])
+        self.connection.execute("DELETE FROM staged_keys WHERE row IN (SELECT row FROM excluded_rows)")
+
+    def save(self):
+        """
+          Add the staged keys to the key index, the data file was accepted
+          Returns (rc, arrStrings), rc 8 if another data file added one of the keys since the probe
+        """
+        rc = 0
+        arrStrings = []
+        self.flush()
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            duplicates = list(self._history_duplicates())
+            if len(duplicates) > 0:
+                connection.execute("ROLLBACK")
+                for rownumber, value in duplicates:
+                    arrStrings.append("ERROR Key added to the key index by another data file at row: " + str(rownumber) + ": " + value)
+                return 8, arrStrings
+            cursor = connection.execute("INSERT OR IGNORE INTO keys SELECT ?, keyname, digest, ?, ? FROM staged_keys", (self.name, self.data_file, time.time()))
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            self.close()
+        arrStrings.append("Key index: " + str(cursor.rowcount) + " keys added for " + self.name)
+        return rc, arrStrings
+
+    def discard(self):
+        """
+          Drop the staged keys, the data file was rejected
+        """
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
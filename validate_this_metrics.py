@@ -0,0 +1,231 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the run metrics of validateThis.py
+
+Each stage of a validation (empty check, sniff, the pass over the data file, and the evaluation of the header,
+uniqueness, domain and data results) records its wall time, CPU time, rows, bytes and the peak memory of the
+process so far. The number of findings per column and check is taken from the ReportCollector. Optionally the
+time spent in each check of each column is measured too (see timed and TimedDomain, used by SinglePass).
+
+Metrics are written as a json summary and in the Prometheus text exposition format, e.g. for the node exporter
+textfile collector. Files are written to a temporary name and renamed so a collector never reads a partial file.
+"""
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+
+METRIC_PREFIX = "csvvalidator"
+
+
+def peak_rss_bytes():
+    """
+      Peak resident memory of this process so far (ru_maxrss is in KB on Linux, bytes on macOS)
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+def timed(func, timings, key):
+    """
+      Wrap func so the time spent in it is added to timings[key] as [seconds, calls]
+    """
+    clock = time.perf_counter
+    timing = timings.setdefault(key, [0.0, 0])
+
+    def timed_func(*args):
+        start = clock()
+        try:
+            return func(*args)
+        finally:
+            timing[0] = timing[0] + clock() - start
+            timing[1] = timing[1] + 1
+    return timed_func
+
+
+class TimedDomain:
+    """
+    A domain (list of allowed values) whose membership tests are timed, see timed
+    """
+
+    def __init__(self, domain, timings, key):
+        self.domain = domain
+        self.timing = timings.setdefault(key, [0.0, 0])
+
+    def __contains__(self, value):
+        start = time.perf_counter()
+        found = value in self.domain
+        self.timing[0] = self.timing[0] + time.perf_counter() - start
+        self.timing[1] = self.timing[1] + 1
+        return found
+
+
+def merge_timings(timings, other):
+    """
+      Add the check timings of another pass, e.g. of a worker process
+    """
+    for key, (seconds, calls) in other.items():
+        timing = timings.setdefault(key, [0.0, 0])
+        timing[0] = timing[0] + seconds
+        timing[1] = timing[1] + calls
+
+
+def _column_name(csvspec, index):
+    if index is None:
+        return ",".join(str(name) for name in (csvspec.get("uniqueness") or []))
+    return str(csvspec["columns"][index]["name"])
+
+
+class Metrics:
+    """
+    The metrics of the validation of one data file, spec is the label of the csv Spec when several are validated
+    """
+
+    def __init__(self, input_file=None, spec=None):
+        self.input_file = input_file
+        self.spec = spec
+        self.started = time.time()
+        self.stages = []
+        self.findings = []
+        self.checks = []
+        self.returncode = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+          Measure the enclosed stage, rows and bytes may be set on the yielded dict
+        """
+        record = {"stage": name, "rows": None, "bytes": None}
+        start = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            if record["rows"] is not None and record["seconds"] > 0:
+                record["rows_per_second"] = record["rows"] / record["seconds"]
+            self.stages.append(record)
+
+    def add_findings(self, collector, csvspec):
+        """
+          The number of findings per stage, column and check from a ReportCollector
+        """
+        for (stage, index, check), count in sorted(collector.counts.items(), key=lambda item: str(item[0])):
+            self.findings.append({"stage": stage, "column": _column_name(csvspec, index), "check": check, "count": count})
+
+    def add_check_timings(self, timings, csvspec):
+        for (stage, index, check), (seconds, calls) in sorted(timings.items(), key=lambda item: str(item[0])):
+            self.checks.append({"stage": stage, "column": _column_name(csvspec, index), "check": check, "seconds": seconds, "calls": calls})
+
+    def summary(self):
+        summary = {"input": self.input_file
+                  ,"started": self.started
+                  ,"returncode": self.returncode
+                  ,"seconds": sum(s["seconds"] for s in self.stages)
+                  ,"peak_rss_bytes": peak_rss_bytes()
+                  ,"stages": self.stages
+                  ,"findings": self.findings
+                  ,"checks": self.checks
+                  }
+        if self.spec is not None:
+            summary["spec"] = self.spec
+        return summary
+
+
+def _write_atomic(filename, text):
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, filename)
+
+
+def write_json(filename, summaries):
+    """
+      Write the metric summaries of the data files validated as json
+    """
+    _write_atomic(filename, json.dumps({"files": summaries}, indent=1) + "\n")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join('%s="%s"' % (name, _label(value)) for name, value in labels.items()) + "}"
+
+
+def prometheus_text(summaries):
+    """
+      The metric summaries in the Prometheus text exposition format
+    """
+    metrics = {}
+
+    def sample(name, kind, help_text, labels, value):
+        if value is None:
+            return
+        metric = metrics.setdefault(name, (kind, help_text, []))
+        metric[2].append(METRIC_PREFIX + "_" + name + labels + " " + repr(float(value)))
+
+    for summary in summaries:
+        # the spec label is only given when several csv Specs are validated
+        source = {"input": summary["input"]}
+        if summary.get("spec") is not None:
+            source["spec"] = summary["spec"]
+        sample("returncode", "gauge", "Return code of the last validation, 0 if the data file is valid", _labels(**source), summary["returncode"])
+        sample("last_run_timestamp_seconds", "gauge", "Start time of the last validation", _labels(**source), summary["started"])
+        sample("peak_rss_bytes", "gauge", "Peak resident memory of the validating process", _labels(**source), summary["peak_rss_bytes"])
+        for stage in summary["stages"]:
+            labels = _labels(**source, stage=stage["stage"])
+            sample("stage_seconds", "gauge", "Wall time of the validation stage", labels, stage["seconds"])
+            sample("stage_cpu_seconds", "gauge", "CPU time of the validation stage", labels, stage["cpu_seconds"])
+            sample("stage_rows", "gauge", "Records read by the validation stage", labels, stage["rows"])
+            sample("stage_bytes", "gauge", "Bytes read by the validation stage", labels, stage["bytes"])
+        for finding in summary["findings"]:
+            sample("findings", "gauge", "Findings (failed values) per column and check", _labels(**source, stage=finding["stage"], column=finding["column"], check=finding["check"]), finding["count"])
+        for check in summary["checks"]:
+            labels = _labels(**source, stage=check["stage"], column=check["column"], check=check["check"])
+            sample("check_seconds", "gauge", "Time spent in the check", labels, check["seconds"])
+            sample("check_calls", "gauge", "Values tested by the check", labels, check["calls"])
+
+    lines = []
+    for name, (kind, help_text, samples) in metrics.items():
+        lines.append("# HELP " + METRIC_PREFIX + "_" + name + " " + help_text)
+        lines.append("# TYPE " + METRIC_PREFIX + "_" + name + " " + kind)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(filename, summaries):
+    """
+      Write the metric summaries as a Prometheus textfile (name it *.prom for the node exporter)
+    """
+    _write_atomic(filename, prometheus_text(summaries))
+
+
+@contextlib.contextmanager
+def profiled(filename, top=25):
+    """
+      Profile the enclosed code with cProfile, the stats are dumped to filename (see pstats) and the
+      top functions by own time are returned as text lines in the yielded list once the block ends
+    """
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    lines = []
+    profiler.enable()
+    try:
+        yield lines
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("tottime").print_stats(top)
+        lines.extend(line for line in text.getvalue().splitlines() if line.strip() != "")
@@ -0,0 +1,137 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the parallel version of single_pass_test
+
+The data file is split into byte ranges on record boundaries (see validate_this_records.py) and each range is
+checked by a worker process. The record count before each range is known from the split so row numbers in the
+reports are the same as a single pass. Uniqueness keys are exchanged as digests through partition files, all
+occurrences of a key land in the same partition so the partitions are searched for duplicates independently.
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from validate_this_batch import CHECK_BATCH_ROWS
+from validate_this_functions import SinglePass
+from validate_this_functions import register_dialect
+from validate_this_functions import single_pass_test
+from validate_this_input import DEFAULT_PIPELINE
+from validate_this_input import compression
+from validate_this_input import parsed_rows
+from validate_this_records import open_range
+from validate_this_records import split_ranges
+from validate_this_report import ErrorLimit
+from validate_this_report import JsonLinesSink
+from validate_this_report import LogSink
+from validate_this_report import ReportCollector
+from validate_this_report import Reporter
+from validate_this_unique import DEFAULT_PARTITIONS
+from validate_this_unique import KeyPartitions
+from validate_this_unique import partition_duplicates
+
+
+def _range_test(csvspec, filename, chunk, start, end, rowcounter, spilldir, partitions, caps, findings_file, time_checks, limits, pipeline, profile, check_batch_rows):
+    """
+      Worker: perform the single pass checks on the byte range [start, end) of the data file
+      Findings are collected within the caps and, if findings_file is given, streamed to it
+      limits, if given, are the (max_errors, max_per_check) of an ErrorLimit for the range
+      profile, if True, the range is profiled too and the profile merged by the parent
+    """
+    register_dialect(csvspec)
+    keys = None
+    if spilldir is not None:
+        keys = KeyPartitions(spilldir, "chunk%05d" % chunk, partitions)
+    collector = ReportCollector(caps[0], caps[1])
+    sinks = [collector]
+    if findings_file is not None:
+        sinks.append(JsonLinesSink(findings_file))
+    if limits is not None:
+        sinks.append(ErrorLimit(limits[0], limits[1]))
+    singlepass = SinglePass(csvspec, rowcounter=rowcounter, keys=keys, reporter=Reporter(sinks), check_timings={} if time_checks else None, profile=profile, check_batch_rows=check_batch_rows)
+    with open_range(filename, start, end, csvspec["dialect"]["encoding"], pipeline) as csvfile, parsed_rows(csvfile, pipeline) as rows:
+        singlepass.add_rows(rows)
+    if singlepass.keys is not None:
+        singlepass.keys.close()
+        singlepass.keys = None
+    # only the collector goes back to the parent, the findings file is appended by the parent
+    singlepass.reporter.close()
+    singlepass.reporter = Reporter([collector])
+    return singlepass
+
+
+def split_file(csvspec, filename, workers):
+    """
+      Returns the byte ranges of the data file for the workers, see split_ranges
+      An empty list if the file is not split: compressed, or the dialect characters are not single bytes
+    """
+    if compression(filename) is not None:
+        return []
+    try:
+        return split_ranges(filename, csvspec["dialect"], workers)
+    except ValueError:
+        # dialect characters are not single bytes in the file encoding, the file cannot be split safely
+        return []
+
+
+def parallel_pass_test(csvspec, filename, workers=None, unique_memory_budget_mb=None, reporter=None, partitions=DEFAULT_PARTITIONS, check_timings=None, pipeline=DEFAULT_PIPELINE, profile=False, check_batch_rows=CHECK_BATCH_ROWS, ranges=None):
+    """
+    Perform the single_pass_test checks with a pool of worker processes
+    Returns the same dict of results as single_pass_test
+
+    Workers stream their findings to their own file, these are appended to the reporter's JsonLinesSink
+    in range order once each worker is done, and the messages they keep are passed to its LogSink
+    Falls back to single_pass_test when the file is not split into more than one range
+    Compressed data files are not split, the decompressed offsets are only known by decompressing
+    An ErrorLimit of the reporter applies to each range, a worker stops when its range reaches the limit
+    ranges, if given, are the ranges of split_file, the split is a serial scan of the file before the workers start
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if ranges is None:
+        ranges = split_file(csvspec, filename, workers)
+    if len(ranges) < 2:
+        return single_pass_test(csvspec, filename, unique_memory_budget_mb, reporter, check_timings, pipeline, profile=profile, check_batch_rows=check_batch_rows)
+
+    merged = SinglePass(csvspec, reporter=reporter, check_timings=check_timings, profile=profile)
+    collector = merged.reporter.collector()
+    caps = (collector.max_per_column, collector.max_per_check)
+    jsonsinks = [sink for sink in merged.reporter.sinks if isinstance(sink, JsonLinesSink)]
+    logsinks = [sink for sink in merged.reporter.sinks if isinstance(sink, LogSink)]
+    limits = None
+    for sink in merged.reporter.sinks:
+        if isinstance(sink, ErrorLimit):
+            limits = (sink.max_errors, sink.max_per_check)
+    workdir = tempfile.mkdtemp(prefix="csvvalidator_parallel_")
+    spilldir = None
+    if merged.check_unique:
+        spilldir = workdir
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for chunk, (start, end, rowcounter) in enumerate(ranges):
+                findings_file = None
+                if len(jsonsinks) > 0:
+                    findings_file = os.path.join(workdir, "findings%05d.jsonl" % chunk)
+                futures.append((findings_file, pool.submit(_range_test, csvspec, filename, chunk, start, end, rowcounter, spilldir, partitions, caps, findings_file, check_timings is not None, limits, pipeline, profile, check_batch_rows)))
+            for findings_file, future in futures:
+                result = future.result()
+                for sink in logsinks:
+                    sink.merge(result.reporter.collector())
+                merged.merge(result)
+                for sink in jsonsinks:
+                    sink.append_file(findings_file)
+
+            duplicates = []
+            if spilldir is not None:
+                partition_files = []
+                for p in range(partitions):
+                    partition_files.append([os.path.join(spilldir, "chunk%05d_part%04d" % (chunk, p)) for chunk in range(len(ranges))])
+                for found in pool.map(partition_duplicates, partition_files):
+                    duplicates.extend(found)
+                duplicates.sort(key=lambda d: d[0])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return merged.results(duplicates)
@@ -0,0 +1,264 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the column profiles computed in the same pass as the checks
+
+For each column: the values, nulls (the column null_value) and blanks, values not of the column type, min and max
+of the typed values (integer, float, date, time, timestamp), min and max length, a histogram of the lengths in
+powers of two, an approximate distinct count and the most frequent values.
+
+The memory of a profile is fixed whatever the size of the data file:
+    distinct count : HyperLogLog with 2^HLL_PRECISION registers (about 1.6% standard error), exact while the
+                     column has no more than TOP_COUNTERS distinct values
+    frequent values: Misra-Gries summary of TOP_COUNTERS counters, a count is short by at most the reported
+                     top_values_max_undercount (0 while the summary has never been full)
+Typed values are parsed with the parse functions of the compiled column plans of the pass, so a date column shares
+the cache of its date parser with the datatype check. Profiles of consecutive ranges of a data file are combined
+with merge(), see validate_this_parallel.py.
+"""
+import collections
+import hashlib
+import heapq
+import json
+import math
+import operator
+import os
+
+HLL_PRECISION = 12
+TOP_K = 10
+TOP_COUNTERS = 100
+LENGTH_BUCKETS = 40
+PROFILE_BATCH_ROWS = 1000
+TYPED = ("integer", "float", "date", "time", "timestamp")
+
+
+class HyperLogLog:
+    """
+    Approximate distinct count of the values added, 64 bit blake2b hashes of the utf-8 values
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def update(self, values):
+        blake2b = hashlib.blake2b
+        from_bytes = int.from_bytes
+        registers = self.registers
+        bits = 64 - self.precision
+        mask = (1 << bits) - 1
+        for value in values:
+            h = from_bytes(blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big")
+            rank = bits - (h & mask).bit_length() + 1
+            if rank > registers[h >> bits]:
+                registers[h >> bits] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros > 0:
+            # small range correction, linear counting
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+_parsed = operator.itemgetter(0)
+
+
+def _length_bucket(bucket):
+    if bucket == 0:
+        return "0"
+    if bucket == 1:
+        return "1"
+    return str(1 << (bucket - 1)) + "-" + str((1 << bucket) - 1)
+
+
+class ColumnProfile:
+    """
+    Profile of the values of one column, add_values() is called with the values of each batch of rows
+    """
+
+    def __init__(self, index, col):
+        self.index = index
+        self.name = col["name"]
+        self.type = col["type"]
+        self.position = int(col["colorder"])
+        self.has_null_value = "null_value" in col
+        self.null_value = col.get("null_value")
+        self.parse = None
+        self.nulls = 0
+        self.blanks = 0
+        self.values = 0
+        self.invalid = 0
+        self.minimum = None
+        self.maximum = None
+        self.min_len = None
+        self.max_len = None
+        self.lengths = [0] * LENGTH_BUCKETS
+        self.counters = {}
+        self.undercount = 0
+        self.distinct = HyperLogLog()
+
+    def __getstate__(self):
+        # the parse function may hold a cache, it is set again by Profiler.compile()
+        state = dict(self.__dict__)
+        state["parse"] = None
+        return state
+
+    def add_values(self, values):
+        """
+          Add the values of a batch of rows, the values are counted first so a repeated value is handled once
+        """
+        counts = collections.Counter(values)
+        lengths = collections.Counter(map(len, values))
+        if self.has_null_value and self.null_value in counts:
+            count = counts.pop(self.null_value)
+            self.nulls = self.nulls + count
+            lengths[len(self.null_value)] -= count
+        if "" in counts:
+            count = counts.pop("")
+            self.blanks = self.blanks + count
+            lengths[0] -= count
+        for n, count in lengths.items():
+            if count > 0:
+                self.values = self.values + count
+                self.lengths[min(n.bit_length(), LENGTH_BUCKETS - 1)] += count
+                if self.min_len is None or n < self.min_len:
+                    self.min_len = n
+                if self.max_len is None or n > self.max_len:
+                    self.max_len = n
+
+        # a value in the counters has been added to the distinct count already
+        counters = self.counters
+        self.distinct.update([value for value in counts if value not in counters])
+        for value, count in counts.items():
+            counters[value] = counters.get(value, 0) + count
+        self._trim()
+
+        if self.parse is not None:
+            parsed = list(zip(map(self.parse, counts), counts))
+            self.invalid = self.invalid + sum(counts[value] for p, value in parsed if p is None)
+            valid = [item for item in parsed if item[0] is not None]
+            if len(valid) > 0:
+                low = min(valid, key=_parsed)
+                high = max(valid, key=_parsed)
+                if self.minimum is None or low[0] < self.minimum[0]:
+                    self.minimum = low
+                if self.maximum is None or high[0] > self.maximum[0]:
+                    self.maximum = high
+
+    def _trim(self):
+        if len(self.counters) > TOP_COUNTERS:
+            # keep the TOP_COUNTERS largest, the counts are reduced by the next largest (Misra-Gries merge)
+            by = heapq.nlargest(TOP_COUNTERS + 1, self.counters.values())[-1]
+            self.undercount = self.undercount + by
+            self.counters = {value: count - by for value, count in self.counters.items() if count > by}
+
+    def merge(self, other):
+        self.nulls = self.nulls + other.nulls
+        self.blanks = self.blanks + other.blanks
+        self.values = self.values + other.values
+        self.invalid = self.invalid + other.invalid
+        if other.minimum is not None and (self.minimum is None or other.minimum[0] < self.minimum[0]):
+            self.minimum = other.minimum
+        if other.maximum is not None and (self.maximum is None or other.maximum[0] > self.maximum[0]):
+            self.maximum = other.maximum
+        if other.min_len is not None and (self.min_len is None or other.min_len < self.min_len):
+            self.min_len = other.min_len
+        if other.max_len is not None and (self.max_len is None or other.max_len > self.max_len):
+            self.max_len = other.max_len
+        self.lengths = [a + b for a, b in zip(self.lengths, other.lengths)]
+        self.distinct.merge(other.distinct)
+        self.undercount = self.undercount + other.undercount
+        for value, count in other.counters.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        self._trim()
+
+    def summary(self, rows):
+        def rate(n):
+            return round(n / rows, 6) if rows > 0 else None
+        exact = self.undercount == 0
+        # a count may be short by the undercount, only values counted more often than that are surely frequent
+        top = sorted([item for item in self.counters.items() if item[1] > self.undercount], key=lambda item: (-item[1], item[0]))[:TOP_K]
+        summary = {"name": self.name
+                  ,"type": self.type
+                  ,"values": self.values
+                  ,"nulls": self.nulls
+                  ,"null_rate": rate(self.nulls)
+                  ,"blanks": self.blanks
+                  ,"blank_rate": rate(self.blanks)
+                  ,"min_len": self.min_len
+                  ,"max_len": self.max_len
+                  ,"length_histogram": {_length_bucket(b): n for b, n in enumerate(self.lengths) if n > 0}
+                  ,"distinct": len(self.counters) if exact else min(self.distinct.estimate(), self.values)
+                  ,"distinct_exact": exact
+                  ,"top_values": [{"value": value, "count": count} for value, count in top]
+                  ,"top_values_max_undercount": self.undercount
+                  }
+        if self.type in TYPED:
+            summary["invalid"] = self.invalid
+            summary["min"] = None if self.minimum is None else self.minimum[1]
+            summary["max"] = None if self.maximum is None else self.maximum[1]
+        return summary
+
+
+class Profiler:
+    """
+    Profiles of every column of the csv Spec, add() is called with each data row
+    Rows are profiled in batches: the values of each column of a batch are counted first, so the work for a value
+    repeated in the batch is done once. flush() profiles the rows of a partial batch.
+    compile() takes the parse functions from the compiled column plans, they are not pickled
+    """
+
+    def __init__(self, csvspec):
+        self.rows = 0
+        self.columns = [ColumnProfile(i, col) for i, col in enumerate(csvspec["columns"])]
+        self.batch = []
+
+    def compile(self, plans):
+        parsers = {p.index: p.parse for p in plans}
+        for column in self.columns:
+            column.parse = parsers.get(column.index)
+
+    def add(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= PROFILE_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        batch = self.batch
+        if len(batch) == 0:
+            return
+        self.batch = []
+        self.rows = self.rows + len(batch)
+        for column in self.columns:
+            column.add_values(list(map(operator.itemgetter(column.position), batch)))
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.rows = self.rows + other.rows
+        for column, other_column in zip(self.columns, other.columns):
+            column.merge(other_column)
+
+    def summary(self):
+        """
+          The profile as a dict for json: the data rows profiled and a dict per column
+        """
+        self.flush()
+        return {"rows": self.rows, "columns": [column.summary(self.rows) for column in self.columns]}
+
+
+def write_profile(filename, profile):
+    """
+      Write the column profile as json, to a temporary name that is then renamed
+    """
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(profile, indent=1, default=str) + "\n")
+    os.replace(tmp, filename)
@@ -0,0 +1,158 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the quarantine of rows: the data rows are split into an accepted and a rejected csv file as they
+are checked
+
+Quarantine is a sink of the Reporter (see validate_this_report.py), so it is told of each finding and its row, and
+SinglePass hands it each data row once the row is checked. A row without findings is written to the accepted file,
+a row with findings to the rejected file with two more columns: its row number in the data file (the header is
+record 1) and the failed checks as stage:check:column separated by ;. Both files are written in the csvspec dialect
+with the csvspec header, if the spec has one. A dialect without doublequote and without an escape character cannot
+write a quote character inside a value, its quotes are doubled in the quarantine files.
+
+Some findings are only known once every row has been read: duplicates of uniqueness keys spilled to disk and the
+key index checks. Their rows have been written to the accepted file already, so when the sink is closed the accepted
+file is read back and they are moved to the end of the rejected file.
+"""
+import ast
+import csv
+import os
+
+QUARANTINE_BUFFER = 1024 * 1024
+REJECT_COLUMNS = ["row_number", "failed_checks"]
+
+
+def _lineterminator(dialect):
+    """
+      The csvspec lineterminator is written as a quoted python literal, e.g. "'\\r\\n'"
+    """
+    try:
+        value = ast.literal_eval(str(dialect.get("lineterminator")))
+    except (ValueError, SyntaxError):
+        value = None
+    if not isinstance(value, str) or value == "":
+        return "\r\n"
+    return value
+
+
+def _check_name(finding):
+    column = finding["column"]
+    if isinstance(column, list):
+        column = ",".join(str(c) for c in column)
+    return finding["stage"] + ":" + finding["check"] + ":" + str(column)
+
+
+class Quarantine:
+    """
+    Sink of findings that splits the data rows into accepted_file and rejected_file, write() is called with each data row
+    The csvspec dialect must be registered (see register_dialect)
+    """
+
+    def __init__(self, csvspec, accepted_file, rejected_file):
+        self.encoding = csvspec["dialect"]["encoding"]
+        self.options = {"lineterminator": _lineterminator(csvspec["dialect"])}
+        if csvspec["dialect"]["doublequote"] != True and csvspec["dialect"]["escapechar"] in (None, "", "None"):
+            self.options["doublequote"] = True
+        self.accepted_file = accepted_file
+        self.rejected_file = rejected_file
+        self.header = None
+        if csvspec["dialect"]["has_header"] == True:
+            self.header = [col["name"] for col in sorted(csvspec["columns"], key=lambda col: int(col["colorder"]))]
+        self._accepted = self._open(accepted_file, self.header)
+        self._rejected = self._open(rejected_file, None if self.header is None else self.header + REJECT_COLUMNS)
+        self.accepted_rows = 0
+        self.rejected_rows = set()
+        self.first_row = None
+        self.last_row = None
+        # failed checks of rows not yet written, and of rows written to the accepted file before the finding
+        self.pending = {}
+        self.late = {}
+
+    def _open(self, filename, header):
+        f = open(filename, "w", encoding=self.encoding, newline='', buffering=QUARANTINE_BUFFER)
+        writer = csv.writer(f, dialect='csvspec', **self.options)
+        if header is not None:
+            writer.writerow(header)
+        return f, writer
+
+    def add(self, finding, index):
+        row = finding["row"]
+        if row is None:
+            return
+        if self.last_row is None or row > self.last_row:
+            self.pending.setdefault(row, []).append(_check_name(finding))
+        elif row not in self.rejected_rows:
+            self.late.setdefault(row, []).append(_check_name(finding))
+
+    def write(self, row, rownumber):
+        """
+          Write a checked data row to the accepted or the rejected file
+        """
+        if self.first_row is None:
+            self.first_row = rownumber
+        self.last_row = rownumber
+        checks = self.pending.pop(rownumber, None)
+        if checks is None:
+            self._accepted[1].writerow(row)
+            self.accepted_rows = self.accepted_rows + 1
+        else:
+            self._rejected[1].writerow(row + [rownumber, ";".join(checks)])
+            self.rejected_rows.add(rownumber)
+
+    def read_accepted(self):
+        """
+          The data rows of the accepted file, once the sink is closed
+        """
+        with open(self.accepted_file, "r", encoding=self.encoding, newline='') as f:
+            reader = csv.reader(f, dialect='csvspec', **self.options)
+            if self.header is not None:
+                next(reader, None)
+            for row in reader:
+                yield row
+
+    def reject_rate(self):
+        """
+          The fraction of the data rows written that were rejected, 0 if none were written
+        """
+        rows = self.accepted_rows + len(self.rejected_rows)
+        return len(self.rejected_rows) / rows if rows > 0 else 0.0
+
+    def _move_late(self):
+        """
+          Move the rows of late findings from the accepted file to the end of the rejected file
+        """
+        accepted_file = self.accepted_file
+        tmp = accepted_file + ".tmp"
+        os.replace(accepted_file, tmp)
+        self._accepted = self._open(accepted_file, self.header)
+        rownumber = self.first_row
+        with open(tmp, "r", encoding=self.encoding, newline='') as f:
+            reader = csv.reader(f, dialect='csvspec', **self.options)
+            if self.header is not None:
+                next(reader, None)
+            for row in reader:
+                # the accepted rows are the data rows in order without those rejected during the pass
+                while rownumber in self.rejected_rows:
+                    rownumber = rownumber + 1
+                checks = self.late.get(rownumber)
+                if checks is None:
+                    self._accepted[1].writerow(row)
+                else:
+                    self._rejected[1].writerow(row + [rownumber, ";".join(checks)])
+                    self.rejected_rows.add(rownumber)
+                    self.accepted_rows = self.accepted_rows - 1
+                rownumber = rownumber + 1
+        os.remove(tmp)
+        self.late = {}
+
+    def close(self):
+        if self._accepted is None:
+            return
+        if len(self.late) > 0:
+            self._accepted[0].close()
+            self._move_late()
+        self._accepted[0].close()
+        self._rejected[0].close()
+        self._accepted = None
+        self._rejected = None
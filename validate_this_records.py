@@ -0,0 +1,307 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the scanning of the raw bytes of the data file for record boundaries
+
+Records end at a newline outside of a quoted field, so \\r\\n and \\n line terminators are supported.
+The quote character only opens a quoted field at the start of a field, as csv.reader does, and the
+escape character and doubled quotes are honoured. Bytes between quote and escape characters are
+handled with bytes.count/find so the cost is per quote character rather than per byte.
+The delimiter, quote and escape characters must encode to a single byte (e.g. ASCII compatible encodings).
+"""
+import codecs
+import csv
+import io
+import os
+
+from validate_this_input import DEFAULT_PIPELINE
+from validate_this_input import buffered
+from validate_this_input import open_input
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+_OUT = 0          # outside a quoted field
+_IN = 1           # inside a quoted field
+_ESC_OUT = 2      # escape character was the last byte of the previous block, outside quotes
+_ESC_IN = 3       # as _ESC_OUT inside quotes
+_QUOTE_PENDING = 4  # quote inside a quoted field was the last byte of the previous block
+
+
+def _single_byte(char, encoding):
+    """
+      Encode a dialect character, None if the dialect does not use it
+    """
+    if char is None or str(char) == "None" or char == "":
+        return None
+    if codecs.lookup(encoding).name == "utf-8-sig":
+        encoding = "utf-8"
+    encoded = char.encode(encoding)
+    if len(encoded) != 1:
+        raise ValueError("Dialect character " + repr(char) + " is not a single byte in " + encoding)
+    return encoded[0]
+
+
+class RecordScanner:
+    """
+    Quote aware scanner over the raw bytes of the data file
+    Blocks are fed in order with feed(), finish() returns the number of records
+
+    split_targets are byte offsets at which the caller wants to split the file, for each the first
+    record boundary at or after it is recorded in boundaries as (offset, records before offset)
+    stop_after is a number of records, the offset after that record is recorded in stop_offset
+    """
+
+    def __init__(self, dialect, split_targets=None, stop_after=None):
+        encoding = dialect["encoding"]
+        self.delimiter = _single_byte(dialect["delimeter"], encoding)
+        self.quote = None
+        if int(dialect["quoting"]) != csv.QUOTE_NONE:
+            self.quote = _single_byte(dialect["quotechar"], encoding)
+        self.escape = _single_byte(dialect["escapechar"], encoding)
+        self.doublequote = dialect["doublequote"] == True
+        self.skipinitialspace = dialect["skipinitialspace"] == True
+        self.quote_bytes = None if self.quote is None else bytes([self.quote])
+        self.escape_bytes = None if self.escape is None else bytes([self.escape])
+
+        self.records = 0
+        self.state = _OUT
+        self.offset = 0
+        self.last_byte = None
+        self.escaped_at = -1
+        self.bom_length = 0
+        self.targets = sorted(split_targets or [])
+        self.boundaries = []
+        self.stop_after = stop_after
+        self.stop_offset = None
+
+    def _newlines(self, block, start, end):
+        """
+          Count the record ends in block[start:end], which is known to be outside quotes
+        """
+        while len(self.targets) > 0 and self.offset + end > self.targets[0]:
+            position = max(self.targets[0] - self.offset, start)
+            k = block.find(b"\n", position, end)
+            if k == -1:
+                break
+            self.boundaries.append((self.offset + k + 1, self.records + block.count(b"\n", start, k + 1)))
+            while len(self.targets) > 0 and self.targets[0] <= self.offset + k:
+                self.targets.pop(0)
+        count = block.count(b"\n", start, end)
+        if self.stop_offset is None and self.stop_after is not None and 0 < self.stop_after - self.records <= count:
+            k = start - 1
+            for i in range(self.stop_after - self.records):
+                k = block.find(b"\n", k + 1, end)
+            self.stop_offset = self.offset + k + 1
+        self.records = self.records + count
+
+    def _field_start(self, block, j):
+        """
+          True if the quote at block[j] is at the start of a field and so opens a quoted field
+        """
+        k = j - 1
+        if self.skipinitialspace:
+            while k >= 0 and block[k] == 0x20:
+                k = k - 1
+        if self.offset + k < self.bom_length:
+            return True
+        if self.offset + k == self.escaped_at:
+            return False
+        previous = block[k] if k >= 0 else self.last_byte
+        return previous in (self.delimiter, 0x0a, 0x0d)
+
+    def _next(self, block, char, start, cached):
+        if char is None:
+            return len(block)
+        if cached >= start:
+            return cached
+        found = block.find(char, start)
+        return len(block) if found == -1 else found
+
+    def feed(self, block):
+        """
+          Scan the next block of the data file
+        """
+        n = len(block)
+        if self.offset == 0 and block.startswith(codecs.BOM_UTF8):
+            self.bom_length = len(codecs.BOM_UTF8)
+        next_quote = -1
+        next_escape = -1
+        i = 0
+        while i < n:
+            if self.state == _OUT:
+                next_quote = self._next(block, self.quote_bytes, i, next_quote)
+                next_escape = self._next(block, self.escape_bytes, i, next_escape)
+                j = min(next_quote, next_escape)
+                self._newlines(block, i, j)
+                if j == n:
+                    break
+                if j == next_escape:
+                    if j + 1 < n:
+                        # the escaped byte is taken literally, including a newline
+                        self.escaped_at = self.offset + j + 1
+                        i = j + 2
+                    else:
+                        self.state = _ESC_OUT
+                        i = n
+                else:
+                    if self._field_start(block, j):
+                        self.state = _IN
+                    i = j + 1
+            elif self.state == _IN:
+                next_quote = self._next(block, self.quote_bytes, i, next_quote)
+                next_escape = self._next(block, self.escape_bytes, i, next_escape)
+                j = min(next_quote, next_escape)
+                if j == n:
+                    break
+                if j + 1 >= n:
+                    if j == next_escape:
+                        self.state = _ESC_IN
+                    else:
+                        self.state = _QUOTE_PENDING if self.doublequote else _OUT
+                    i = n
+                elif j == next_escape:
+                    i = j + 2
+                elif self.doublequote and block[j + 1] == self.quote:
+                    i = j + 2
+                else:
+                    # with doublequote csv.reader takes an escape character straight after the closing quote literally
+                    self.state = _OUT
+                    i = j + 1
+                    if self.doublequote and block[i] == self.escape:
+                        i = i + 1
+            elif self.state == _ESC_OUT:
+                self.escaped_at = self.offset + i
+                self.state = _OUT
+                i = i + 1
+            elif self.state == _ESC_IN:
+                self.state = _IN
+                i = i + 1
+            else:
+                if self.doublequote and block[i] == self.quote:
+                    self.state = _IN
+                    i = i + 1
+                elif block[i] == self.escape:
+                    self.state = _OUT
+                    i = i + 1
+                else:
+                    self.state = _OUT
+        if n > 0:
+            self.last_byte = block[-1]
+        self.offset = self.offset + n
+
+    def finish(self):
+        """
+          Returns the number of records, a last record without a line terminator or with an unclosed quote is included
+        """
+        if self.last_byte is not None and (self.last_byte != 0x0a or self.state != _OUT or self.escaped_at == self.offset - 1):
+            self.records = self.records + 1
+            self.last_byte = 0x0a
+        return self.records
+
+
+def scan_file(filename, dialect, split_targets=None, block_size=BLOCK_SIZE):
+    """
+      Scan the whole data file, returns the finished RecordScanner
+    """
+    scanner = RecordScanner(dialect, split_targets)
+    with open(filename, "rb", buffering=0) as rawdata:
+        while True:
+            block = rawdata.read(block_size)
+            if len(block) == 0:
+                break
+            scanner.feed(block)
+    scanner.finish()
+    return scanner
+
+
+def record_offset(filename, dialect, records, block_size=BLOCK_SIZE):
+    """
+      The byte offset after the first records records of the data file, None if it ends before that offset is known
+      Raises ValueError if the dialect characters are not single bytes
+    """
+    scanner = RecordScanner(dialect, stop_after=records)
+    with open(filename, "rb", buffering=0) as rawdata:
+        while scanner.stop_offset is None:
+            block = rawdata.read(block_size)
+            if len(block) == 0:
+                break
+            scanner.feed(block)
+    return scanner.stop_offset
+
+
+def count_file_records(filename, dialect, block_size=BLOCK_SIZE):
+    """
+      Count the records of the data file from its raw bytes, decompressed if it is compressed
+      Blocks without the quote or escape character are counted with bytes.count alone, see RecordScanner
+      Raises ValueError if the records cannot be counted this way: the dialect characters are not single bytes,
+      or the file ends its lines with \\r alone
+    """
+    scanner = RecordScanner(dialect)
+    with open_input(filename, read_ahead=False) as rawdata:
+        while True:
+            block = rawdata.read(block_size)
+            if len(block) == 0:
+                break
+            if scanner.offset == 0 and b"\n" not in block and b"\r" in block:
+                raise ValueError("Records end with \\r alone")
+            scanner.feed(block)
+    return scanner.finish()
+
+
+def split_ranges(filename, dialect, count):
+    """
+      Split the data file into at most count byte ranges that start and end on record boundaries
+      Returns a list of (start, end, records before start)
+
+      The boundaries are found by one serial scan of the whole file in the calling process, the quote state at
+      an arbitrary offset is only known from the start of the file. Unquoted data is scanned at the speed of
+      bytes.find (about 0.03s for 10MB), quoted data costs a python step per quote character (about 5s for
+      11MB with every field quoted), see the "split" stage of --metrics-json
+    """
+    size = os.stat(filename).st_size
+    targets = [size * i // count for i in range(1, count)]
+    scanner = scan_file(filename, dialect, targets)
+    ranges = []
+    start = 0
+    records = 0
+    for offset, records_before in scanner.boundaries:
+        if offset > start and offset < size:
+            ranges.append((start, offset, records))
+            start = offset
+            records = records_before
+    if start < size:
+        ranges.append((start, size, records))
+    return ranges
+
+
+class _RangeIO(io.RawIOBase):
+    """
+    Raw reader limited to the byte range [start, end) of a file
+    """
+
+    def __init__(self, filename, start, end):
+        self._file = open(filename, "rb", buffering=0)
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        n = self._file.readinto(view)
+        self._remaining = self._remaining - n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_range(filename, start, end, encoding, pipeline=DEFAULT_PIPELINE):
+    """
+      Open the byte range [start, end) of the data file as text for csv.reader, read ahead as set by the pipeline
+    """
+    return io.TextIOWrapper(buffered(_RangeIO(filename, start, end), pipeline), encoding=encoding, newline='')
@@ -0,0 +1,237 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the reporting of findings (failed values) by the checks in validate_this_functions.py
+
+Checks pass each finding to a Reporter as it happens, the Reporter hands it to each of its sinks:
+    ReportCollector : keeps a capped number of messages per check and per column for the report that is logged,
+                      plus the count of all findings
+    LogSink         : logs the messages as they happen, within the same caps as the ReportCollector
+    JsonLinesSink   : streams every finding as a json line with buffered bulk writes
+    ErrorLimit      : stops the checks (raises TooManyErrors) once a number of findings is reached, the fail fast policy
+
+A finding is a dict with the keys stage, check, column, row, value and message.
+row is the record number in the data file (the header is record 1), the "at row:" of the messages is the same number.
+Findings of sampled blocks have no row, the message gives the block and the record in it.
+"""
+import collections
+import json
+import shutil
+
+DEFAULT_MAX_MESSAGES_PER_COLUMN = 1000
+JSON_LINES_BUFFER = 1000
+
+
+class Reporter:
+    """
+    Pass findings from the checks to the sinks
+    """
+
+    def __init__(self, sinks=None):
+        if sinks is None:
+            sinks = [ReportCollector()]
+        self.sinks = sinks
+
+    def add(self, stage, check, index, column, row, value, message):
+        """
+          Report a finding, index is the position of the column in the csvspec column list (None if not a single column)
+        """
+        finding = {"stage": stage, "check": check, "column": column, "row": row, "value": value, "message": message}
+        for sink in self.sinks:
+            sink.add(finding, index)
+
+    def collector(self):
+        """
+          The ReportCollector sink, None if there is none
+        """
+        for sink in self.sinks:
+            if isinstance(sink, ReportCollector):
+                return sink
+        return None
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class ReportCollector:
+    """
+    Keeps the messages for the report that is logged
+    At most max_per_column messages are kept for each column of a stage and at most max_per_check for each check
+    of a stage, None means no limit. All findings are counted.
+    """
+
+    def __init__(self, max_per_column=DEFAULT_MAX_MESSAGES_PER_COLUMN, max_per_check=None):
+        self.max_per_column = max_per_column
+        self.max_per_check = max_per_check
+        self.messages = {}
+        self.kept_per_check = {}
+        self.counts = {}
+
+    def _keep(self, stage, check, index, message):
+        kept = self.messages.setdefault((stage, index), [])
+        if self.max_per_column is not None and len(kept) >= self.max_per_column:
+            return
+        if self.max_per_check is not None and self.kept_per_check.get((stage, check), 0) >= self.max_per_check:
+            return
+        kept.append((check, message))
+        self.kept_per_check[(stage, check)] = self.kept_per_check.get((stage, check), 0) + 1
+
+    def add(self, finding, index):
+        key = (finding["stage"], index, finding["check"])
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self._keep(finding["stage"], finding["check"], index, finding["message"])
+
+    def merge(self, other):
+        """
+          Add the findings of a collector for a later range of the data file
+        """
+        for (stage, index), kept in other.messages.items():
+            for check, message in kept:
+                self._keep(stage, check, index, message)
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def count(self, stage, index=None):
+        """
+          Number of findings for the stage, for one column if index is given
+        """
+        return sum(count for (s, i, c), count in self.counts.items() if s == stage and (index is None or i == index))
+
+    def report(self, stage, index, name=None):
+        """
+          The kept messages for a column of the stage, followed by a summary line if any were not kept
+        """
+        arrStrings = [message for check, message in self.messages.get((stage, index), [])]
+        total = self.count(stage, index)
+        if total > len(arrStrings):
+            checks = sorted((c, count) for (s, i, c), count in self.counts.items() if s == stage and i == index)
+            summary = ", ".join(c + ": " + str(count) for c, count in checks)
+            label = stage if name is None else "column " + str(name)
+            arrStrings.append("ERROR " + str(total) + " errors found in " + label + ", " + str(len(arrStrings)) + " shown (" + summary + ")")
+        return arrStrings
+
+    def close(self):
+        pass
+
+
+class LogSink:
+    """
+    Log the messages of the findings as they happen, log is called with each message
+    The caps are those of the ReportCollector of the report, so the messages logged are the messages it keeps.
+    The report built after the checks leaves out the messages already logged, see logged()
+    """
+
+    def __init__(self, log, max_per_column=DEFAULT_MAX_MESSAGES_PER_COLUMN, max_per_check=None):
+        self.log = log
+        self.max_per_column = max_per_column
+        self.max_per_check = max_per_check
+        self.kept_per_column = {}
+        self.kept_per_check = {}
+        self.pending = collections.Counter()
+
+    def _keep(self, stage, check, index, message):
+        if self.max_per_column is not None and self.kept_per_column.get((stage, index), 0) >= self.max_per_column:
+            return
+        if self.max_per_check is not None and self.kept_per_check.get((stage, check), 0) >= self.max_per_check:
+            return
+        self.kept_per_column[(stage, index)] = self.kept_per_column.get((stage, index), 0) + 1
+        self.kept_per_check[(stage, check)] = self.kept_per_check.get((stage, check), 0) + 1
+        self.pending[message] += 1
+        self.log(message)
+
+    def add(self, finding, index):
+        self._keep(finding["stage"], finding["check"], index, finding["message"])
+
+    def merge(self, collector):
+        """
+          Log the messages kept by the ReportCollector of a later range of the data file, e.g. by a worker process
+        """
+        for (stage, index), kept in collector.messages.items():
+            for check, message in kept:
+                self._keep(stage, check, index, message)
+
+    def logged(self, message):
+        """
+          True if the message of a report line was logged as it happened, each logged message is matched once
+        """
+        if self.pending[message] == 0:
+            return False
+        self.pending[message] -= 1
+        return True
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """
+    Write each finding as a line of json, lines are buffered and written in bulk
+    """
+
+    def __init__(self, filename, mode="w"):
+        self.filename = filename
+        self._file = open(filename, mode, encoding="utf-8", buffering=1024 * 1024)
+        self._lines = []
+
+    def add(self, finding, index):
+        self._lines.append(json.dumps(finding))
+        if len(self._lines) >= JSON_LINES_BUFFER:
+            self.flush()
+
+    def flush(self):
+        if len(self._lines) > 0:
+            self._file.write("\n".join(self._lines) + "\n")
+            self._lines = []
+        self._file.flush()
+
+    def append_file(self, filename):
+        """
+          Copy the findings written by another JsonLinesSink, e.g. by a worker process
+        """
+        self.flush()
+        with open(filename, "r", encoding="utf-8") as f:
+            shutil.copyfileobj(f, self._file, 1024 * 1024)
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class TooManyErrors(Exception):
+    """
+    Raised by ErrorLimit when a limit on the number of findings is reached
+    """
+
+
+class ErrorLimit:
+    """
+    Stop the checks once max_errors findings in all, or max_per_check findings of one check of a stage, are reported
+    TooManyErrors is raised once, after the other sinks have the finding (keep this sink last), further findings
+    (e.g. duplicate keys found once the data file is read) are counted only
+    """
+
+    def __init__(self, max_errors=None, max_per_check=None):
+        self.max_errors = max_errors
+        self.max_per_check = max_per_check
+        self.count = 0
+        self.per_check = {}
+        self.stopped = None
+
+    def add(self, finding, index):
+        self.count = self.count + 1
+        key = (finding["stage"], finding["check"])
+        self.per_check[key] = self.per_check.get(key, 0) + 1
+        if self.stopped is not None:
+            return
+        if self.max_errors is not None and self.count >= self.max_errors:
+            self.stopped = str(self.count) + " errors found, limit " + str(self.max_errors)
+        elif self.max_per_check is not None and self.per_check[key] >= self.max_per_check:
+            self.stopped = str(self.per_check[key]) + " errors found by " + key[0] + " check " + key[1] + ", limit " + str(self.max_per_check)
+        if self.stopped is not None:
+            raise TooManyErrors(self.stopped)
+
+    def close(self):
+        pass
@@ -0,0 +1,142 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the sample check of a data file, run ahead of the full pass to reject broken files quickly
+
+The first records of the data file are checked, then blocks of records read from random byte offsets.
+A block starts after the first newline following its offset. The newline may be inside a quoted field, so a
+block is only used when every record in it has the number of columns of the csv Spec, otherwise it is skipped.
+Records of a block are numbered from the start of the block, the messages give its byte offset.
+Uniqueness is only checked in the first records. Compressed data files are sampled from their first records only.
+"""
+import csv
+import io
+import itertools
+import os
+import random
+
+from validate_this_functions import SinglePass
+from validate_this_input import MappedFile
+from validate_this_input import compression
+from validate_this_input import open_text
+from validate_this_records import record_offset
+from validate_this_report import Reporter
+from validate_this_report import TooManyErrors
+
+SAMPLE_BLOCK_ROWS = 100
+SAMPLE_BLOCK_BYTES = 256 * 1024
+
+
+class _BlockReporter(Reporter):
+    """
+    Reporter for the records of a sampled block: the row of a finding is not known, the message gives the block
+    """
+
+    def __init__(self, sinks, offset):
+        super().__init__(sinks)
+        self.offset = offset
+
+    def add(self, stage, check, index, column, row, value, message):
+        super().add(stage, check, index, column, None, value, message + " (sample block at byte " + str(self.offset) + ", record " + str(row) + " of the block)")
+
+
+def _read_block(data, offset, encoding, rows):
+    """
+      The text of at most rows whole lines starting after the first newline at or after offset, None if there are none
+      data is the MappedFile of the data file, only the lines are decoded
+    """
+    limit = min(offset + SAMPLE_BLOCK_BYTES, data.size)
+    start = data.find(b"\n", offset, limit)
+    if start == -1:
+        return None
+    end = start
+    for i in range(rows):
+        newline = data.find(b"\n", end + 1, limit)
+        if newline == -1:
+            break
+        end = newline
+    if end == start:
+        return None
+    lines = data.view(start + 1, end + 1)
+    try:
+        return str(lines, encoding)
+    finally:
+        lines.release()
+
+
+def sample_test(csvspec, filename, rows, reporter=None, seed=None):
+    """
+    Check the first rows records of the data file and about as many again in blocks from random byte offsets
+    Returns (rc, arrStrings), the findings are also passed to the reporter
+    """
+    if reporter is None:
+        reporter = Reporter()
+    arrStrings = []
+
+    # the first records, with the row numbers and uniqueness of a full pass
+    head = SinglePass(csvspec, reporter=reporter)
+    limit = rows + 1 if csvspec["dialect"]["has_header"] == True else rows
+    # without a reader thread, only the first records are read
+    with open_text(filename, csvspec["dialect"]["encoding"], pipeline=None) as csvfile:
+        reader = csv.reader(csvfile, dialect='csvspec')
+        head.add_rows(itertools.islice(reader, limit))
+    arrStrings.append("Sampled the first " + str(head.rowcounter) + " records")
+
+    blockspec = dict(csvspec)
+    blockspec["uniqueness"] = None
+    blockspec["dialect"] = dict(csvspec["dialect"], has_header=False)
+    size = os.stat(filename).st_size
+    blocks = 0
+    sampled = 0
+    skipped = 0
+    offset = None
+    if compression(filename) is None and head.stopped is None:
+        try:
+            # the blocks start after the records read above, the text reader reads ahead so the offset is found in the raw bytes
+            # as for splitting the data file, the dialect characters must be single bytes for a newline to be a record boundary
+            offset = record_offset(filename, csvspec["dialect"], head.rowcounter, SAMPLE_BLOCK_BYTES)
+        except ValueError:
+            offset = None
+    if offset is not None and size > offset:
+        r = random.Random(seed)
+        columns = len(csvspec["columns"])
+        with MappedFile(filename) as data:
+            for start in sorted(r.randrange(offset, size) for i in range(max(1, rows // SAMPLE_BLOCK_ROWS))):
+                try:
+                    text = _read_block(data, start, csvspec["dialect"]["encoding"], SAMPLE_BLOCK_ROWS)
+                    records = [] if text is None else list(csv.reader(io.StringIO(text, newline=''), dialect='csvspec'))
+                except (UnicodeDecodeError, csv.Error):
+                    records = []
+                if len(records) == 0 or any(len(record) != columns for record in records):
+                    skipped = skipped + 1
+                    continue
+                block = SinglePass(blockspec, reporter=_BlockReporter(reporter.sinks, start))
+                block.add_rows(records)
+                blocks = blocks + 1
+                sampled = sampled + block.rowcounter
+                if block.stopped is not None:
+                    head.stopped = block.stopped
+                    break
+        arrStrings.append("Sampled " + str(sampled) + " records in " + str(blocks) + " blocks at random offsets, " + str(skipped) + " blocks skipped (not on a record boundary)")
+
+    rc = 0
+    collector = reporter.collector()
+    if head.stopped is not None:
+        arrStrings.append("ERROR Sample stopped early: " + head.stopped)
+        rc = 8
+    if head.check_unique:
+        duplicates = head.keys.finish()
+        try:
+            for rownumber, key in duplicates:
+                head._report_duplicate(rownumber, key)
+        except TooManyErrors:
+            pass
+        if collector.count("unique") > 0:
+            arrStrings = arrStrings + collector.report("unique", None)
+            rc = 8
+    for stage in ("domain", "data"):
+        for i, col in enumerate(csvspec["columns"]):
+            if collector.count(stage, i) > 0:
+                arrStrings = arrStrings + collector.report(stage, i, col["name"])
+                rc = 8
+    return rc, arrStrings
@@ -0,0 +1,151 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the encoding and dialect sniffing used by validateThis.py
+
+Sniffing works on a bounded sample of the data file. Small files are read whole, larger files are sampled
+from the head, middle and tail so the cost of sniffing does not grow with the size of the file.
+Compressed data files cannot be read from the middle without decompressing what comes before, the sample is
+the head of the decompressed data.
+"""
+import codecs
+import csv
+import os
+
+from chardet.universaldetector import UniversalDetector
+
+from validate_this_functions import csvdialect_to_dict
+from validate_this_input import compression
+from validate_this_input import open_input
+
+DEFAULT_SNIFF_BYTES = 256 * 1024
+DETECT_CHUNK_BYTES = 64 * 1024
+VERIFY_CHUNK_BYTES = 1024 * 1024
+# csv.Sniffer's quote detection grows faster than linearly with the sample when fields are quoted
+SNIFF_DIALECT_CHARS = 16 * 1024
+
+
+def _read_segment(rawdata, offset, amount, align_start):
+    """
+      Read amount bytes from offset, trimmed to whole lines
+      The partial line at the start is dropped when align_start is set, the partial line at the end is always dropped
+    """
+    rawdata.seek(offset)
+    segment = rawdata.read(amount)
+    if align_start:
+        start = segment.find(b"\n")
+        segment = b"" if start == -1 else segment[start + 1:]
+    end = segment.rfind(b"\n")
+    if end != -1:
+        segment = segment[:end + 1]
+    return segment
+
+
+def read_sample(filename, max_bytes=DEFAULT_SNIFF_BYTES):
+    """
+      Return a sample of at most max_bytes from the data file as a list of segments, join them for the whole sample
+      Files smaller than max_bytes are returned whole, otherwise half the sample is taken from the head of the file
+      and a quarter each from the middle and the tail, each segment trimmed to whole lines
+    """
+    if compression(filename) is not None:
+        with open_input(filename, read_ahead=False) as rawdata:
+            sample = rawdata.read(max_bytes + 1)
+        if len(sample) <= max_bytes:
+            return [sample]
+        end = sample.rfind(b"\n", 0, max_bytes)
+        return [sample[:end + 1] if end >= 0 else sample[:max_bytes]]
+
+    size = os.stat(filename).st_size
+    with open(filename, "rb") as rawdata:
+        if size <= max_bytes:
+            return [rawdata.read()]
+        head = max_bytes // 2
+        middle = max_bytes // 4
+        tail = max_bytes - head - middle
+        return [_read_segment(rawdata, 0, head, False)
+               ,_read_segment(rawdata, (size - middle) // 2, middle, True)
+               ,_read_segment(rawdata, size - tail, tail, True)
+               ]
+
+
+def detect_encoding(segments, chunk_size=DETECT_CHUNK_BYTES):
+    """
+      Detect the encoding of the sample segments, feeding chardet chunk by chunk and stopping as soon as it is confident
+      Chunks are taken from each segment in turn so the middle and tail are seen even if chardet stops early
+      Returns the chardet result dict plus the number of bytes that were needed
+    """
+    detector = UniversalDetector()
+    fed = 0
+    position = 0
+    while not detector.done and any(position < len(segment) for segment in segments):
+        for segment in segments:
+            chunk = segment[position:position + chunk_size]
+            if len(chunk) > 0 and not detector.done:
+                detector.feed(chunk)
+                fed = fed + len(chunk)
+        position = position + chunk_size
+    detector.close()
+    result = dict(detector.result)
+    result["bytes_examined"] = fed
+    return result
+
+
+def _whole_lines(text, max_chars):
+    """
+      The text cut to the whole lines within max_chars
+    """
+    if len(text) <= max_chars:
+        return text
+    end = text.rfind("\n", 0, max_chars)
+    return text[:end + 1] if end > 0 else text[:max_chars]
+
+
+def sniff_dialect(sample_texts, max_chars=SNIFF_DIALECT_CHARS):
+    """
+      Sniff the csv dialect and header from the decoded sample segments (see read_sample), a str is one segment
+      Each segment gives an equal share of max_chars, cut to whole lines, so the head, middle and tail are all sniffed
+      Both Sniffer calls share the one sample, the head comes first for the header
+      Returns the dialect as a dict, see csvdialect_to_dict
+    """
+    if isinstance(sample_texts, str):
+        sample_texts = [sample_texts]
+    share = max_chars // max(1, len(sample_texts))
+    sample_text = "".join(_whole_lines(text, share) for text in sample_texts)
+    sniffer = csv.Sniffer()
+    dialect = sniffer.sniff(sample_text)
+    sniffeddialect = csvdialect_to_dict("sniffed", dialect)
+    sniffeddialect["dialect"]["has_header"] = sniffer.has_header(sample_text)
+    return sniffeddialect
+
+
+def verify_encoding(filename, encoding, chunk_size=VERIFY_CHUNK_BYTES):
+    """
+      Stream the data file through an incremental decoder for the declared encoding
+      Used in place of sniffing when the csv Spec is trusted. This is a full scan: the whole data file is read and
+      decoded, its cost grows with the size of the file (memory use is bounded by chunk_size). Every byte is checked
+      because the pass stops with an exception on the first byte that does not decode
+    """
+    rc = 0
+    arrStrings = []
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+    except LookupError:
+        arrStrings.append("ERROR Unknown encoding in csvspec: " + str(encoding))
+        return 8, arrStrings
+
+    offset = 0
+    with open_input(filename) as rawdata:
+        while True:
+            chunk = rawdata.read(chunk_size)
+            try:
+                decoder.decode(chunk, final=(len(chunk) == 0))
+            except UnicodeDecodeError as e:
+                arrStrings.append("ERROR Data file does not decode as " + str(encoding) + " near byte " + str(offset + e.start) + ": " + str(e.reason))
+                rc = 8
+                break
+            if len(chunk) == 0:
+                break
+            offset = offset + len(chunk)
+    if rc == 0:
+        arrStrings.append("Data file decodes as " + str(encoding) + ", bytes read: " + str(offset))
+    return rc, arrStrings
@@ -0,0 +1,269 @@
+"""
+This project is a prototype tool to validate the format of a csv file based on a specification provided by a json file.
+
+The module contains the uniqueness key tracking used by the unique checks in validate_this_functions.py
+
+Keys are tuples of column values. Each key is hashed to a fixed size digest and the digests are held in a set.
+If the set grows beyond the memory budget the digests are partitioned to temporary files and duplicates are
+found with a second pass over each partition.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+# Approximate bytes held per key in memory, digest bytes object plus its slot in the set
+KEY_COST = 100
+DEFAULT_MEMORY_BUDGET_MB = 512
+DEFAULT_PARTITIONS = 64
+DIGEST_SIZE = 16
+
+# partition record: digest, row number, length of the json encoded key that follows
+_RECORD = struct.Struct("<%dsQI" % DIGEST_SIZE)
+
+
+def key_digest(key):
+    """
+      Return the digest for a key tuple
+      The repr of the tuple is used so ("ab", "c") and ("a", "bc") hash differently
+    """
+    return hashlib.blake2b(repr(key).encode("utf-8", "surrogatepass"), digest_size=DIGEST_SIZE).digest()
+
+
+def format_key(key):
+    """
+      Key as shown in report lines, single column keys are shown as the plain value
+    """
+    if len(key) == 1:
+        return str(key[0])
+    return str(key)
+
+
+class UniqueKeys:
+    """
+    Collect key values from the data file and identify the row numbers of duplicates
+
+    add() reports duplicates immediately while all digests fit in memory.
+    Once the memory budget is exceeded the keys are spilled to partition files and the remaining
+    duplicates are only known after finish() has processed the partitions.
+    """
+
+    def __init__(self, memory_budget_mb=None, partitions=DEFAULT_PARTITIONS, tempdir=None):
+        if memory_budget_mb is None:
+            memory_budget_mb = DEFAULT_MEMORY_BUDGET_MB
+        self.max_keys = max(1, int(memory_budget_mb * 1024 * 1024 / KEY_COST))
+        self.partitions = partitions
+        self.tempdir = tempdir
+        self.seen = set()
+        self.duplicates = []
+        self.spilled = False
+        self._spilldir = None
+        self._partitions = None
+
+    def add(self, key, rownumber):
+        """
+          Add the key found at rownumber
+          Returns True if the key is known to be a duplicate, it is then not returned again by finish()
+        """
+        digest = key_digest(key)
+        if self.spilled:
+            self._partitions.write(digest, rownumber, key)
+            return False
+        if digest in self.seen:
+            return True
+        self.seen.add(digest)
+        if len(self.seen) > self.max_keys:
+            self._spill()
+        return False
+
+    def seed(self, digests):
+        """
+          Add the digests of keys already validated (e.g. by an earlier run), later occurrences of them are duplicates
+          A digest given more than once is seeded once, a repeat is not a duplicate (see partition_duplicates)
+        """
+        for digest in digests:
+            if self.spilled:
+                self._partitions.write(digest, 0, None)
+            else:
+                self.seen.add(digest)
+                if len(self.seen) > self.max_keys:
+                    self._spill()
+
+    def save(self, filename):
+        """
+          Write the digest of each key added so far to filename, once, returns the number of digests written
+          Must be called before finish(), which removes the partition files
+        """
+        count = 0
+        with open(filename, "wb", buffering=1024 * 1024) as f:
+            if not self.spilled:
+                f.write(b"".join(self.seen))
+                return len(self.seen)
+            self._partitions.flush()
+            for partition_file in self._partitions.filenames:
+                # all occurrences of a digest are in the same partition, duplicates are dropped per partition
+                digests = set(partition_digests(partition_file))
+                f.write(b"".join(digests))
+                count = count + len(digests)
+        return count
+
+    def _spill(self):
+        """
+          Move the in memory digests to the partition files, further keys are written straight to the partitions
+        """
+        self._spilldir = tempfile.mkdtemp(prefix="csvvalidator_unique_", dir=self.tempdir)
+        self._partitions = KeyPartitions(self._spilldir, "spill", self.partitions)
+        for digest in self.seen:
+            # first occurrences are never reported, so the row number and key are not needed
+            self._partitions.write(digest, 0, None)
+        self.seen = set()
+        self.spilled = True
+
+    def finish(self):
+        """
+          Complete the duplicate search and return the (rownumber, key) duplicates not already reported by add(), in row order
+        """
+        if self.spilled:
+            self._partitions.close()
+            for filename in self._partitions.filenames:
+                self.duplicates.extend(partition_duplicates([filename]))
+            shutil.rmtree(self._spilldir, ignore_errors=True)
+            self._partitions = None
+            self._spilldir = None
+            self.duplicates.sort(key=lambda d: d[0])
+        return self.duplicates
+
+    def close(self):
+        """
+          Remove the partition files when finish() is not reached, e.g. the pass raised
+        """
+        if self._spilldir is not None:
+            self._partitions.close()
+            shutil.rmtree(self._spilldir, ignore_errors=True)
+            self._partitions = None
+            self._spilldir = None
+
+    def __len__(self):
+        return len(self.seen)
+
+
+class SharedKeys:
+    """
+    UniqueKeys shared by the passes of several csv Specs with the same key columns, fed the same rows
+    The first pass to reach a row adds its key, the others are told if it was a duplicate
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.last_row = 0
+        self.duplicates = set()
+        self.found = None
+
+    def add(self, key, rownumber):
+        if rownumber <= self.last_row:
+            return rownumber in self.duplicates
+        self.last_row = rownumber
+        if self.keys.add(key, rownumber):
+            self.duplicates.add(rownumber)
+            return True
+        return False
+
+    def finish(self):
+        if self.found is None:
+            self.found = self.keys.finish()
+        return self.found
+
+    def close(self):
+        self.keys.close()
+
+
+class KeyPartitions:
+    """
+    Write keys to a set of partition files in directory, the partition is chosen by the key digest
+    so all occurrences of a key land in the same partition number whatever the file prefix
+    """
+
+    def __init__(self, directory, prefix, partitions=DEFAULT_PARTITIONS):
+        self.filenames = [os.path.join(directory, "%s_part%04d" % (prefix, i)) for i in range(partitions)]
+        self._files = [open(filename, "wb", buffering=1024 * 1024) for filename in self.filenames]
+
+    def add(self, key, rownumber):
+        """
+          Same signature as UniqueKeys.add, duplicates are only known once the partitions are processed
+        """
+        self.write(key_digest(key), rownumber, key)
+        return False
+
+    def write(self, digest, rownumber, key):
+        if key is None:
+            payload = b""
+        else:
+            payload = json.dumps(list(key)).encode("utf-8", "surrogatepass")
+        f = self._files[digest[0] % len(self._files)]
+        f.write(_RECORD.pack(digest, rownumber, len(payload)))
+        f.write(payload)
+
+    def finish(self):
+        self.close()
+        return []
+
+    def flush(self):
+        for f in self._files:
+            f.flush()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+def partition_records(partition_file):
+    """
+      The (digest, rownumber, payload) records of a partition file, in the order they were written
+    """
+    with open(partition_file, "rb", buffering=1024 * 1024) as f:
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            digest, rownumber, length = _RECORD.unpack(header)
+            yield digest, rownumber, f.read(length)
+
+
+def partition_digests(partition_file):
+    for digest, rownumber, payload in partition_records(partition_file):
+        yield digest
+
+
+def load_digests(filename, chunk_size=1024 * 1024):
+    """
+      The digests in a file written by UniqueKeys.save()
+    """
+    chunk_size = chunk_size - chunk_size % DIGEST_SIZE
+    with open(filename, "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if len(chunk) == 0:
+                break
+            for i in range(0, len(chunk) - DIGEST_SIZE + 1, DIGEST_SIZE):
+                yield chunk[i:i + DIGEST_SIZE]
+
+
+def partition_duplicates(partition_files):
+    """
+      Find the duplicates within one partition, given as a list of files to be read in order
+      Records are in the order they were found, so any digest already seen is a later duplicate
+      Records of row 0 are keys seeded or spilled from memory, never a later duplicate (their key is not written)
+    """
+    duplicates = []
+    seen = set()
+    for partition_file in partition_files:
+        for digest, rownumber, payload in partition_records(partition_file):
+            if rownumber == 0:
+                seen.add(digest)
+            elif digest in seen:
+                duplicates.append((rownumber, tuple(json.loads(payload.decode("utf-8", "surrogatepass")))))
+            else:
+                seen.add(digest)
+    return duplicates